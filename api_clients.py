@@ -0,0 +1,294 @@
+"""
+Shared OpenAI / Pinecone client layer.
+
+Every module that talks to OpenAI or Pinecone goes through one process-wide
+`ApiClients` (see `get_clients`) instead of building its own clients:
+
+- one OpenAI client and one Pinecone index per process, so HTTP connections
+  are pooled and kept alive across calls,
+- a token bucket per endpoint (embeddings, chat, Pinecone query/upsert/...)
+  caps the request rate of all threads together,
+- rate-limit (429), server (5xx) and connection errors are retried with
+  jittered exponential backoff, honouring Retry-After when the API sends it,
+- request, retry, error and latency counters per endpoint (`stats`).
+
+The SDK clients are created on first use. Tests and offline runs can pass
+fake `openai_client` / `pinecone_index` objects with the same methods, or
+install a whole replacement with `set_clients`.
+"""
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+CHAT_MODEL = "gpt-4"
+# Requests per second and burst size per endpoint
+DEFAULT_RATES = {
+    "openai.embeddings": (50.0, 50),
+    "openai.chat": (5.0, 5),
+    "pinecone.query": (20.0, 20),
+    "pinecone.upsert": (10.0, 10),
+    "pinecone.fetch": (20.0, 20),
+    "pinecone.delete": (10.0, 10),
+    "pinecone.admin": (2.0, 2),
+}
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE = 0.5    # seconds
+BACKOFF_MAX = 30.0    # seconds
+REQUEST_TIMEOUT = 60.0
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+RETRY_ERROR_NAMES = {
+    "APIConnectionError", "APITimeoutError", "ConnectionError", "TimeoutError",
+    "Timeout", "ProtocolError", "MaxRetryError", "ReadTimeoutError", "ServiceException",
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `capacity` stored."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        """Block until `tokens` are available; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def penalize(self, seconds):
+        """Drain the bucket so no caller sends for `seconds` (after a 429 with Retry-After)."""
+        with self._lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+def _status(error):
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(error):
+    """Seconds from a Retry-After header on an API error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    if _status(error) in RETRY_STATUSES:
+        return True
+    return any(cls.__name__ in RETRY_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class EndpointStats:
+    """Counters of one endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.throttled_seconds = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record(self, latency=None, error=False, retried=False, throttled=0.0):
+        with self.lock:
+            self.requests += 1
+            self.throttled_seconds += throttled
+            if error:
+                self.errors += 1
+                self.retries += int(retried)
+            else:
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+
+    def as_dict(self):
+        done = self.requests - self.errors
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "throttled_s": round(self.throttled_seconds, 3),
+            "avg_latency_ms": round(1000 * self.latency_total / done, 1) if done else 0.0,
+            "max_latency_ms": round(1000 * self.latency_max, 1),
+        }
+
+
+class ApiClients:
+    """Pooled, rate-limited and retried access to OpenAI and the Pinecone index."""
+
+    def __init__(self, openai_client=None, pinecone_index=None, pinecone_client=None, rates=None,
+                 max_retries=DEFAULT_MAX_RETRIES, index_name=None):
+        self._openai = openai_client
+        self._index = pinecone_index
+        self._pinecone = pinecone_client
+        self.index_name = index_name or os.getenv("PINECONE_INDEX_NAME")
+        self.max_retries = max_retries
+        self.limiters = {name: TokenBucket(*rate) for name, rate in {**DEFAULT_RATES, **(rates or {})}.items()}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    # --- lazily created SDK clients ---
+
+    @property
+    def openai(self):
+        with self._lock:
+            if self._openai is None:
+                from openai import OpenAI
+                # Retries are ours (shared limiter + jitter); the client keeps a pooled keep-alive connection
+                self._openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=REQUEST_TIMEOUT)
+            return self._openai
+
+    @property
+    def pinecone(self):
+        with self._lock:
+            if self._pinecone is None:
+                from pinecone import Pinecone
+                self._pinecone = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+            return self._pinecone
+
+    @property
+    def index(self):
+        if self._index is None:
+            pinecone_client = self.pinecone
+            with self._lock:
+                if self._index is None:
+                    self._index = pinecone_client.Index(self.index_name)
+        return self._index
+
+    # --- rate limiting, retries and counters ---
+
+    def _endpoint_stats(self, endpoint):
+        with self._lock:
+            return self._stats.setdefault(endpoint, EndpointStats())
+
+    def call(self, endpoint, func, *args, **kwargs):
+        """Run one API request through the endpoint's limiter, retry policy and counters."""
+        limiter = self.limiters.get(endpoint)
+        stats = self._endpoint_stats(endpoint)
+        attempt = 0
+        while True:
+            throttled = limiter.acquire() if limiter is not None else 0.0
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                retry = attempt < self.max_retries and is_retryable(e)
+                stats.record(error=True, retried=retry, throttled=throttled)
+                if not retry:
+                    raise
+                retry_after = _retry_after(e)
+                if retry_after and limiter is not None:
+                    # Everyone sharing this endpoint backs off, not only this thread;
+                    # the drained limiter also holds this retry back, so no extra sleep
+                    limiter.penalize(retry_after)
+                else:
+                    time.sleep(max(retry_after or 0.0, backoff_delay(attempt)))
+                attempt += 1
+                continue
+            stats.record(latency=time.perf_counter() - started, throttled=throttled)
+            return result
+
+    def stats(self):
+        """{endpoint: counters} of the requests made so far."""
+        with self._lock:
+            endpoints = dict(self._stats)
+        return {endpoint: stats.as_dict() for endpoint, stats in endpoints.items()}
+
+    def summary(self):
+        """One line per endpoint used, for CLI output and the app."""
+        return [
+            f"{endpoint}: {c['requests']} requests, {c['retries']} retries, {c['errors']} errors, "
+            f"avg {c['avg_latency_ms']} ms, throttled {c['throttled_s']} s"
+            for endpoint, c in sorted(self.stats().items())
+        ]
+
+    # --- OpenAI ---
+
+    def embed(self, texts, model=EMBEDDING_MODEL):
+        """Embeddings of `texts`, in order, from one request."""
+        response = self.call("openai.embeddings", self.openai.embeddings.create, input=list(texts), model=model)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    def chat(self, messages, model=CHAT_MODEL, temperature=0):
+        """Content of the first chat completion choice."""
+        response = self.call(
+            "openai.chat", self.openai.chat.completions.create,
+            model=model, messages=messages, temperature=temperature,
+        )
+        return response.choices[0].message.content
+
+    # --- Pinecone ---
+
+    def query(self, vector, top_k, **kwargs):
+        return self.call("pinecone.query", self.index.query, vector=vector, top_k=top_k, **kwargs)
+
+    def upsert(self, vectors, **kwargs):
+        return self.call("pinecone.upsert", self.index.upsert, vectors=vectors, **kwargs)
+
+    def fetch(self, ids, **kwargs):
+        return self.call("pinecone.fetch", self.index.fetch, ids=ids, **kwargs)
+
+    def delete(self, **kwargs):
+        return self.call("pinecone.delete", self.index.delete, **kwargs)
+
+    def list_ids(self, prefix):
+        """Vector ids with a prefix (serverless indexes), all pages."""
+        return self.call("pinecone.admin", lambda: [vid for page in self.index.list(prefix=prefix) for vid in page])
+
+    def describe_index_stats(self):
+        return self.call("pinecone.admin", self.index.describe_index_stats)
+
+    def list_indexes(self):
+        return self.call("pinecone.admin", lambda: self.pinecone.list_indexes().names())
+
+
+_clients = None
+_clients_lock = threading.Lock()
+
+
+def get_clients():
+    """The process-wide ApiClients."""
+    global _clients
+    with _clients_lock:
+        if _clients is None:
+            _clients = ApiClients()
+        return _clients
+
+
+def set_clients(clients):
+    """Replace the process-wide ApiClients (e.g. with fakes in tests); returns the previous one."""
+    global _clients
+    with _clients_lock:
+        previous, _clients = _clients, clients
+        return previous
@@ -0,0 +1,112 @@
+"""
+Append-only audit journal.
+
+Every mapping decision is one JSON event appended to `output/audit_log.jsonl`
+instead of rewriting the whole audit CSV on each interaction. Writes are
+buffered, flushed in batches and fsync'ed periodically; the journal rotates
+to numbered backups once it grows past a size limit. `compact_audit_log`
+replays the events to produce the current per-field CSV view on demand.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+DEFAULT_JOURNAL_PATH = os.path.join("output", "audit_log.jsonl")
+FLUSH_EVERY = 50              # buffered events written at a time
+FSYNC_INTERVAL = 5.0          # seconds between fsyncs
+MAX_BYTES = 50 * 1024 * 1024  # rotate once the journal grows past this size
+BACKUP_COUNT = 5
+
+AUDIT_COLUMNS = ["timestamp", "Target Field", "Source Field", "Mapping Method", "AI Score", "Value Overlap", "Status", "User Decision"]
+
+
+class AuditJournal:
+    """Buffered, rotating JSON Lines journal of audit events (thread-safe)."""
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, flush_every=FLUSH_EVERY, fsync_interval=FSYNC_INTERVAL,
+                 max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        self.path = path
+        self.flush_every = flush_every
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_fsync = time.monotonic()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, event):
+        """Record one event; a timestamp is added when the event has none."""
+        event = {"timestamp": datetime.now().isoformat(), **event}
+        with self._lock:
+            self._buffer.append(json.dumps(event, default=str))
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self, fsync=False):
+        with self._lock:
+            self._flush_locked(fsync)
+
+    def _flush_locked(self, fsync=False):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+            self._file.flush()
+        if fsync or time.monotonic() - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = time.monotonic()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        self.flush(fsync=True)
+        self._file.close()
+
+
+def read_events(path=DEFAULT_JOURNAL_PATH, backup_count=BACKUP_COUNT):
+    """Yield journal events oldest first, including rotated backups."""
+    paths = [f"{path}.{i}" for i in range(backup_count, 0, -1)] + [path]
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def compact_audit_log(path=DEFAULT_JOURNAL_PATH, csv_path=None, session=None):
+    """
+    Replay the journal into the current audit view: one row per suggested
+    mapping, with the latest user decision applied. Optionally restrict to one
+    session id and write the view to `csv_path`.
+    """
+    rows = {}
+    for event in read_events(path):
+        if session is not None and event.get("session") != session:
+            continue
+        key = (event.get("session"), event.get("Target Field"))
+        if event.get("event") == "suggestion":
+            rows[key] = {column: event.get(column) for column in AUDIT_COLUMNS}
+        elif event.get("event") == "decision" and key in rows:
+            rows[key]["User Decision"] = event.get("User Decision")
+            rows[key]["Decision Time"] = event.get("timestamp")
+    df = pd.DataFrame(list(rows.values()), columns=AUDIT_COLUMNS + ["Decision Time"])
+    if csv_path:
+        df.to_csv(csv_path, index=False)
+    return df
@@ -0,0 +1,221 @@
+"""
+Batch field matching: many source exports against a catalog of target schemas in one job.
+
+    python batch_match.py --sources exports/ --schemas schemas/
+
+Each target schema gets a memory-mapped vector store (built or refreshed once
+per run, see embedding_store.py), and the vector search for all of its target
+fields runs once, batched, before any source is touched. Sources are then
+profiled and matched in parallel worker processes with those precomputed
+candidates, the reference value index and the mapping memory, so no embedding
+or Pinecone call is made per source. Outputs, in --output-dir:
+
+- `<source>_mappings.csv`: the mapping report of a source against every schema,
+  best-fitting schema first,
+- `best_target_schemas.csv`: per source, the schemas ranked by fit.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import data_profiling
+import embedding_store
+import embeddings
+import ingest_metadata_to_pinecone as ingest
+import jsonl_io
+import mapping_memory
+import migration_engine
+from transform_pool import TransformWorkerPool
+
+DEFAULT_OUTPUT_DIR = os.path.join("output", "batch_matching")
+DEFAULT_STORE_DIR = os.path.join("output", "schema_catalog")
+SOURCE_PATTERNS = ("*.json", "*.jsonl", "*.ndjson", "*.jsonl.gz", "*.jsonl.xz", "*.ndjson.gz", "*.ndjson.xz")
+DEFAULT_TIMEOUT = 600.0           # seconds to profile and match one source
+REQUIRED_COVERAGE_WEIGHT = 0.3    # share of the fit given to matched required fields
+MATCHED_STATUSES = ("✅", "🟡")
+SUMMARY_COLUMNS = [
+    "Source", "Rank", "Target Schema", "Fit", "Matched Fields", "Target Fields",
+    "Required Matched", "Required Fields", "Error",
+]
+
+
+def load_catalog(paths):
+    """Target schemas from JSON files and/or directories of them, as [(name, schema)]."""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.json"))) if os.path.isdir(path) else [path])
+    catalog = []
+    for path in files:
+        with open(path) as f:
+            schema = json.load(f)
+        if isinstance(schema, dict) and "fields" in schema:
+            catalog.append((os.path.splitext(os.path.basename(path))[0], schema))
+    return catalog
+
+
+def schema_candidates(name, schema, provider, store_dir=DEFAULT_STORE_DIR, top_k=migration_engine.TOP_K):
+    """
+    Vector-search candidates ({target field: matches}) of every field of a schema,
+    from the schema's local store (created or refreshed first).
+    """
+    path = os.path.join(store_dir, name)
+    store, _ = ingest.write_schema_store(path, schema, [], embedding_store.open_store(path), provider)
+    fields = [field["name"] for field in schema["fields"]]
+    if not fields:
+        return {}
+    vectors = provider.embed([migration_engine.target_query(field) for field in fields])
+    return dict(zip(fields, store.search(vectors, top_k=top_k)))
+
+
+# --- worker side: runs in TransformWorkerPool processes ---
+
+_value_index = None
+_memory = None
+
+
+def _worker_state():
+    """Reference value index and mapping memory, loaded once per worker process."""
+    global _value_index, _memory
+    if _value_index is None:
+        _value_index = migration_engine.load_reference_value_index()
+        _memory = mapping_memory.MappingMemory()
+    return _value_index, _memory
+
+
+def schema_fit(schema, matches, audit_log):
+    """How well a source covers a target schema: counts and a 0-1 fit score."""
+    required = {field["name"] for field in schema["fields"] if field.get("required")}
+    scores = {}
+    for match, audit in zip(matches, audit_log):
+        if match["Status"].startswith(MATCHED_STATUSES):
+            score = audit["AI Score"]
+            scores[match["Target Field"]] = min(float(score), 1.0) if isinstance(score, (int, float)) else 1.0
+    target_count = len(schema["fields"])
+    score_mean = sum(scores.values()) / target_count if target_count else 0.0
+    required_matched = len(required & set(scores))
+    coverage = required_matched / len(required) if required else 1.0
+    return {
+        "Fit": round((1 - REQUIRED_COVERAGE_WEIGHT) * score_mean + REQUIRED_COVERAGE_WEIGHT * coverage, 4),
+        "Matched Fields": len(scores),
+        "Target Fields": target_count,
+        "Required Matched": required_matched,
+        "Required Fields": len(required),
+    }
+
+
+def match_source(source_path, targets):
+    """
+    Profile one source and match it against every target ([(name, schema, candidates)]).
+    Returns (mapping rows, [(schema name, fit)]).
+    """
+    value_index, memory = _worker_state()
+    profile = data_profiling.load_or_build_profile(source_path, signatures=bool(value_index.signatures))
+    rows, fits = [], []
+    for name, schema, candidates in targets:
+        target_fields = [field["name"] for field in schema["fields"]]
+        matches, audit_log, _ = migration_engine.match_fields(
+            None, target_fields, profile=profile, value_index=value_index, memory=memory, candidates=candidates,
+        )
+        fits.append((name, schema_fit(schema, matches, audit_log)))
+        for match, audit in zip(matches, audit_log):
+            rows.append({
+                "Target Schema": name,
+                **match,
+                "Mapping Method": audit["Mapping Method"],
+                "AI Score": audit["AI Score"],
+            })
+    return rows, fits
+
+
+# --- driver ---
+
+def source_name(path):
+    name = os.path.basename(path)
+    if jsonl_io.is_compressed(name):
+        name = os.path.splitext(name)[0]
+    return os.path.splitext(name)[0]
+
+
+def write_source_report(output_dir, path, rows, fits):
+    """Write a source's mapping report (best schema first); returns its ranked summary rows."""
+    ranked = sorted(fits, key=lambda item: item[1]["Fit"], reverse=True)
+    rank = {name: position for position, (name, _) in enumerate(ranked, start=1)}
+    report = pd.DataFrame(rows)
+    if not report.empty:
+        report.insert(1, "Schema Rank", report["Target Schema"].map(rank))
+        report = report.sort_values("Schema Rank", kind="stable")
+    report.to_csv(os.path.join(output_dir, f"{source_name(path)}_mappings.csv"), index=False)
+    return [
+        {"Source": source_name(path), "Rank": rank[name], "Target Schema": name, **fit, "Error": ""}
+        for name, fit in ranked
+    ]
+
+
+def run_batch(source_paths, catalog, provider, output_dir=DEFAULT_OUTPUT_DIR, store_dir=DEFAULT_STORE_DIR,
+              workers=None, timeout=DEFAULT_TIMEOUT):
+    """Match every source against every schema of `catalog`; returns the summary DataFrame."""
+    os.makedirs(output_dir, exist_ok=True)
+    targets = [(name, schema, schema_candidates(name, schema, provider, store_dir)) for name, schema in catalog]
+    summary = []
+    with TransformWorkerPool(workers=workers, timeout=timeout, cpu_seconds=timeout) as pool:
+        def job(path):
+            return path, pool.call("batch_match:match_source", path, targets)
+
+        # One thread per worker keeps every worker busy with a source
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            for done, (path, (ok, result)) in enumerate(executor.map(job, source_paths), start=1):
+                if ok:
+                    ranked = write_source_report(output_dir, path, *result)
+                    summary.extend(ranked)
+                    label = f"best: {ranked[0]['Target Schema']} (fit {ranked[0]['Fit']})" if ranked else "no schemas"
+                    print(f"✅ [{done}/{len(source_paths)}] {source_name(path)}: {label}")
+                else:
+                    summary.append({"Source": source_name(path), "Rank": "-", "Target Schema": "-", "Error": result})
+                    print(f"❌ [{done}/{len(source_paths)}] {source_name(path)}: {result}")
+    summary_df = pd.DataFrame(summary, columns=SUMMARY_COLUMNS).astype(
+        {column: "Int64" for column in ["Matched Fields", "Target Fields", "Required Matched", "Required Fields"]}
+    )
+    summary_df.to_csv(os.path.join(output_dir, "best_target_schemas.csv"), index=False)
+    return summary_df
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Match many source exports against a catalog of target schemas.")
+    parser.add_argument("--sources", nargs="+", required=True,
+                        help="Source JSON / JSON Lines files and/or directories of them")
+    parser.add_argument("--schemas", nargs="+", default=["schemas"], help="Target schema JSON files and/or directories")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Directory for the mapping reports")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help="Directory of the per-schema vector stores")
+    parser.add_argument("--embedding-provider", choices=["openai", "local"], default=None,
+                        help="Embedding backend (default: EMBEDDING_PROVIDER from .env, else openai)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count, at most 4)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Seconds allowed per source")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.time()
+    source_paths = []
+    for path in args.sources:
+        if os.path.isdir(path):
+            source_paths.extend(sorted(p for pattern in SOURCE_PATTERNS for p in glob.glob(os.path.join(path, pattern))))
+        else:
+            source_paths.append(path)
+    catalog = load_catalog(args.schemas)
+    print(f"✅ {len(source_paths)} sources, {len(catalog)} target schemas")
+    provider = embeddings.get_provider(args.embedding_provider)
+    print(f"🔁 Searching schema vectors ({provider.name})...")
+    summary = run_batch(source_paths, catalog, provider, args.output_dir, args.store_dir,
+                        workers=args.workers, timeout=args.timeout)
+    failed = int((summary["Rank"] == "-").sum())
+    print(f"📄 Reports written to {args.output_dir} ({failed} sources failed) in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
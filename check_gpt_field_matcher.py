@@ -1,14 +1,11 @@
-import openai
-import os
 import json
 import pandas as pd
 from tqdm import tqdm
-from dotenv import load_dotenv
-from tenacity import retry, wait_random_exponential, stop_after_attempt
 
-# Load API key
-load_dotenv()
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import api_clients
+
+# Shared, rate-limited OpenAI client (API key from .env)
+clients = api_clients.get_clients()
 
 # Load JSON files
 with open("system_a_data.json") as f:
@@ -47,18 +44,16 @@ Respond strictly in JSON with this format:
 }}
 """
 
-# GPT wrapper with retry
-@retry(wait=wait_random_exponential(min=1, max=5), stop=stop_after_attempt(3))
+# GPT wrapper (rate limiting and retries with jittered backoff live in the client layer)
 def ask_gpt(prompt):
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
+    return clients.chat(
+        [
             {"role": "system", "content": "You are an expert at identifying equivalent fields in different systems."},
             {"role": "user", "content": prompt}
         ],
+        model="gpt-4",
         temperature=0
-    )
-    return response.choices[0].message.content.strip()
+    ).strip()
 
 # Compare all fields
 results = []
@@ -1,19 +1,14 @@
-import os
-from dotenv import load_dotenv
-from pinecone import Pinecone
+import api_clients
 
-load_dotenv()
-
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index(os.getenv("PINECONE_INDEX_NAME"))
+clients = api_clients.get_clients()
 
 # View index stats
-stats = index.describe_index_stats()
+stats = clients.describe_index_stats()
 print("📊 Index Stats:")
 print(stats)
 
 # Fetch 2 sample records
 sample_ids = ["A_customer_id", "B_cust_id"]
-result = index.fetch(ids=sample_ids)
+result = clients.fetch(sample_ids)
 print("🔍 Sample fetched vectors:")
 print(result)
@@ -1,13 +1,8 @@
-import os
-from dotenv import load_dotenv
-from pinecone import Pinecone
+import api_clients
 
-# Load env vars
-load_dotenv()
-
-# Initialize Pinecone client
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+# Shared Pinecone client (API key from .env)
+clients = api_clients.get_clients()
 
 # List indexes
-indexes = pc.list_indexes().names()
+indexes = clients.list_indexes()
 print("✅ Available indexes:", indexes)
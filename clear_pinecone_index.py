@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
-from pinecone import Pinecone
+
+import api_clients
 
 def clear_pinecone_index():
     load_dotenv()
@@ -11,18 +12,16 @@ def clear_pinecone_index():
         print("❌ Please set PINECONE_API_KEY and PINECONE_INDEX_NAME in your .env file.")
         return
 
-    pc = Pinecone(api_key=api_key)
-    indexes = pc.list_indexes().names()
+    clients = api_clients.get_clients()
+    indexes = clients.list_indexes()
 
     if index_name not in indexes:
         print(f"❌ Index '{index_name}' not found.")
         return
 
-    index = pc.Index(index_name)
-
     # Try listing namespaces to check if index has any data
     try:
-        stats = index.describe_index_stats()
+        stats = clients.describe_index_stats()
         namespaces = stats.get("namespaces", {})
         if not namespaces:
             print("ℹ️ Index is already empty. No vectors to delete.")
@@ -36,7 +35,7 @@ def clear_pinecone_index():
 
         for ns in namespaces:
             print(f"🧹 Clearing namespace: {ns}")
-            index.delete(delete_all=True, namespace=ns)
+            clients.delete(delete_all=True, namespace=ns)
         print("✅ All vectors deleted.")
 
     except Exception as e:
@@ -0,0 +1,241 @@
+"""
+Chunked source connectors (CSV files, SQLite tables) and a bulk-insert SQLite sink.
+
+Sources are named like files everywhere a source path is accepted:
+
+    customers.csv                                  CSV file with a header row
+    sqlite:///legacy.db?table=customers            a table of a SQLite database
+    sqlite:///legacy.db?query=SELECT * FROM crm    the rows of a query
+
+("sqlite:////abs/path.db" for an absolute path.) Both sources are read in
+bounded chunks: the CSV reader streams rows, and SQLite rows are stepped
+through a cursor with fetchmany, so memory stays at one chunk.
+
+`SQLiteSink` writes merged batches into a table whose DDL is generated from
+the target schema, with one prepared INSERT run through executemany and
+commits only every `commit_rows` rows. In "replace" mode the rows go into a
+staging table that replaces the target table only when the sink is closed,
+so a run that fails part-way leaves the previous contents in place.
+"""
+import csv
+import json
+import os
+import sqlite3
+import time
+from urllib.parse import parse_qs
+
+SQLITE_PREFIX = "sqlite:///"
+DEFAULT_CHUNK_ROWS = 5000
+DEFAULT_COMMIT_ROWS = 100_000
+STAGING_SUFFIX = "__staging"
+CSV_EXTENSIONS = (".csv", ".tsv")
+BOOLEAN_STRINGS = {"true": 1, "false": 0, "yes": 1, "no": 0, "1": 1, "0": 0, "y": 1, "n": 0}
+# SQLite column type per target schema data_type (arrays and objects are stored as JSON text)
+SQLITE_TYPES = {
+    "string": "TEXT",
+    "date": "TEXT",
+    "number": "NUMERIC",
+    "boolean": "INTEGER",
+    "array": "TEXT",
+    "object": "TEXT",
+}
+
+
+def is_sqlite(spec):
+    return isinstance(spec, str) and spec.startswith(SQLITE_PREFIX)
+
+
+def is_csv(spec):
+    return isinstance(spec, str) and not is_sqlite(spec) and spec.lower().endswith(CSV_EXTENSIONS)
+
+
+def is_connector(spec):
+    """Whether a source is read through a connector (rather than as a JSON / JSON Lines file)."""
+    return is_sqlite(spec) or is_csv(spec)
+
+
+def parse_sqlite(spec):
+    """(database path, table, query) of a sqlite:/// spec."""
+    path, _, query_string = spec[len(SQLITE_PREFIX):].partition("?")
+    params = {key: values[-1] for key, values in parse_qs(query_string).items()}
+    return path, params.get("table"), params.get("query")
+
+
+def source_file(spec):
+    """File behind a source (for hashing and change detection)."""
+    return parse_sqlite(spec)[0] if is_sqlite(spec) else spec
+
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class CSVSource:
+    """Rows of a CSV file as dicts of strings; empty cells are None."""
+
+    def __init__(self, path, delimiter=None):
+        self.path = path
+        self.delimiter = delimiter or ("\t" if path.lower().endswith(".tsv") else ",")
+
+    def iter_records(self):
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f, delimiter=self.delimiter):
+                yield {key: (value if value != "" else None) for key, value in row.items() if key is not None}
+
+    def iter_chunks(self, chunk_rows=DEFAULT_CHUNK_ROWS):
+        chunk = []
+        for record in self.iter_records():
+            chunk.append(record)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class SQLiteSource:
+    """Rows of a SQLite table or query, fetched `chunk_rows` at a time from one cursor."""
+
+    def __init__(self, path, table=None, query=None):
+        if not (table or query):
+            raise ValueError("A SQLite source needs ?table=<name> or ?query=<SELECT ...>")
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self.sql = query or f"SELECT * FROM {quote_identifier(table)}"
+
+    def iter_chunks(self, chunk_rows=DEFAULT_CHUNK_ROWS):
+        # Read-only connection; the cursor steps through the result instead of materializing it
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            cursor = conn.execute(self.sql)
+            columns = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield [dict(zip(columns, row)) for row in rows]
+        finally:
+            conn.close()
+
+    def iter_records(self):
+        for chunk in self.iter_chunks():
+            yield from chunk
+
+
+def open_source(spec):
+    """The connector of a CSV file or sqlite:/// spec."""
+    if is_sqlite(spec):
+        return SQLiteSource(*parse_sqlite(spec))
+    if is_csv(spec):
+        return CSVSource(spec)
+    raise ValueError(f"No connector for source '{spec}'")
+
+
+def sql_value(value):
+    """A merged value as a SQLite parameter: JSON text for arrays/objects, 0/1 for booleans."""
+    if isinstance(value, bool):
+        return int(value)
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def sql_boolean(value):
+    """Boolean-like strings ("true", "no", "1", ...) as 0/1; anything else as sql_value."""
+    if isinstance(value, str):
+        flag = BOOLEAN_STRINGS.get(value.strip().lower())
+        return value if flag is None else flag
+    return sql_value(value)
+
+
+def encode_rows(records, fields, field_schemas=None):
+    """Parameter tuples of merged records for the sink's INSERT (built in the transform workers)."""
+    field_schemas = field_schemas or {}
+    converters = [
+        sql_boolean if field_schemas.get(field, {}).get("data_type") == "boolean" else sql_value for field in fields
+    ]
+    return [
+        tuple(convert(record.get(field)) for convert, field in zip(converters, fields)) for record in records
+    ]
+
+
+def create_table_sql(table, fields, field_schemas):
+    """
+    CREATE TABLE statement for the target schema. No NOT NULL constraints: values
+    that break the schema are reported by post-migration validation, not rejected.
+    """
+    columns = ",\n    ".join(
+        f"{quote_identifier(field)} {SQLITE_TYPES.get(field_schemas.get(field, {}).get('data_type'), 'TEXT')}"
+        for field in fields
+    )
+    return f"CREATE TABLE IF NOT EXISTS {quote_identifier(table)} (\n    {columns}\n)"
+
+
+class SQLiteSink:
+    """Bulk inserts merged rows into a SQLite table created from the target schema."""
+
+    def __init__(self, spec, fields, field_schemas, mode="replace", commit_rows=DEFAULT_COMMIT_ROWS):
+        path, table, _ = parse_sqlite(spec) if is_sqlite(spec) else (spec, None, None)
+        self.path = path
+        self.table = table or "normalized_output"
+        self.mode = mode
+        # Replacing loads a staging table that is renamed over the target on close()
+        self.load_table = self.table + STAGING_SUFFIX if mode == "replace" else self.table
+        self.fields = list(fields)
+        self.field_schemas = field_schemas
+        self.commit_rows = commit_rows
+        self.rows = 0
+        self.seconds = 0.0
+        self._uncommitted = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Transactions are managed here (isolation_level=None): one BEGIN ... COMMIT per commit_rows rows
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("BEGIN")
+        if mode == "replace":
+            # Left over from an earlier run that failed
+            self.conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(self.load_table)}")
+        self.conn.execute(create_table_sql(self.load_table, self.fields, field_schemas))
+        self.insert_sql = (
+            f"INSERT INTO {quote_identifier(self.load_table)} ({', '.join(quote_identifier(f) for f in self.fields)}) "
+            f"VALUES ({', '.join('?' for _ in self.fields)})"
+        )
+
+    def write_rows(self, rows):
+        """Insert parameter tuples (see encode_rows) with one executemany call."""
+        if not rows:
+            return
+        started = time.perf_counter()
+        self.conn.executemany(self.insert_sql, rows)
+        self.rows += len(rows)
+        self._uncommitted += len(rows)
+        if self._uncommitted >= self.commit_rows:
+            self.conn.execute("COMMIT")
+            self.conn.execute("BEGIN")
+            self._uncommitted = 0
+        self.seconds += time.perf_counter() - started
+
+    def write(self, records):
+        self.write_rows(encode_rows(records, self.fields, self.field_schemas))
+
+    def close(self):
+        """Commit the remaining rows and, in replace mode, swap the staging table in atomically."""
+        started = time.perf_counter()
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        if self.load_table != self.table:
+            self.conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(self.table)}")
+            self.conn.execute(
+                f"ALTER TABLE {quote_identifier(self.load_table)} RENAME TO {quote_identifier(self.table)}"
+            )
+        self.conn.execute("COMMIT")
+        self.conn.close()
+        self.seconds += time.perf_counter() - started
+
+    def summary(self):
+        rate = self.rows / self.seconds if self.seconds else 0.0
+        return f"{self.rows} rows into {self.path}:{self.table} in {self.seconds:.1f}s ({rate:,.0f} rows/s)"
@@ -0,0 +1,348 @@
+"""
+Whole-column data profiling.
+
+A profile is computed in one streaming pass over the source records (or over a
+reservoir sample of rows for huge inputs) and holds, per column: the type
+distribution, null ratio, an approximate distinct count (HyperLogLog),
+min/max value length, approximate top values, a small sample of values and
+a MinHash signature of the distinct values (see value_matching), which is
+skipped when no value matching is planned. Rows are profiled column by column
+in chunks, and the type detection and hashing run once per distinct value.
+Profiles are cached on disk keyed by the source file's content hash, so
+validation, matching and transform suggestion can read them instead of
+rescanning the data.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+from collections import Counter, OrderedDict
+from itertools import chain, islice
+
+import numpy as np
+
+import connectors
+import jsonl_io
+import value_matching
+
+PROFILE_CACHE_DIR = os.path.join("output", "profiles")
+HLL_PRECISION = 12        # 4096 registers, ~1.6% standard error
+TOP_VALUES = 10           # top values reported per column
+SAMPLE_VALUES = 20        # reservoir of example values kept per column
+DEFAULT_MAX_ROWS = 200_000  # inputs with more rows (or streamed ones) are profiled over a reservoir sample
+PROFILE_VERSION = 3       # bump when the profile layout changes to invalidate cached profiles
+CHUNK_ROWS = 10_000       # rows profiled column by column at a time
+KNOWN_VALUES = 50_000     # distinct values per column remembered so repeats skip type and hash work
+MEMORY_CACHE_SIZE = 16    # profiles kept in memory
+
+common_patterns = {
+    'email': r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$',
+    'phone': r'^\+?1?\d{9,15}$',
+    'date': r'^\d{1,2}[/-]\d{1,2}[/-]\d{2,4}$',
+    'id': r'^[A-Z0-9]{3,}$',
+    'amount': r'^\$?\d+(\.\d{2})?$'
+}
+# One alternation tried in the order above: the first pattern that matches names the type
+_type_pattern = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in common_patterns.items()))
+
+def get_data_type(value):
+    text = str(value)
+    match = _type_pattern.match(text)
+    if match:
+        return match.lastgroup
+    return 'number' if text.isdigit() else 'text'
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+class HyperLogLog:
+    """Approximate distinct counter using 2**precision one-byte registers."""
+
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+    def add(self, value):
+        h = _hash64(str(value))
+        idx = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def add_many(self, values):
+        """Add many values at once: hashes per value, register updates vectorized."""
+        hashes = np.fromiter((_hash64(str(value)) for value in values), dtype=np.uint64, count=len(values))
+        bits = 64 - self.precision
+        idx = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = (hashes & np.uint64((1 << bits) - 1)).astype(np.float64)   # < 2**52, exact as float
+        # rest.bit_length() is frexp's exponent (0 for 0)
+        ranks = (bits - np.frexp(rest)[1] + 1).astype(np.uint8)
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        np.maximum.at(registers, idx, ranks)
+
+    def merge(self, other):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_hex(self):
+        return self.registers.hex()
+
+    @classmethod
+    def from_hex(cls, data, precision=HLL_PRECISION):
+        return cls(precision, bytes.fromhex(data))
+
+class Reservoir:
+    """
+    Uniform sample of `size` items from a stream of any length (Algorithm L):
+    random skips to the next replaced item instead of a random draw per item.
+    """
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.items = []
+        self.seen = 0
+        self._weight = 1.0
+        self._next = None   # 1-based position of the next item to take, once the sample is full
+
+    def _random(self):
+        return self.rng.random() or 1e-300
+
+    def _skip(self):
+        self._weight *= math.exp(math.log(self._random()) / self.size)
+        self._next += int(math.log(self._random()) / math.log1p(-self._weight)) + 1
+
+    def extend(self, items):
+        """Offer a sequence of items."""
+        i = 0
+        while i < len(items) and len(self.items) < self.size:
+            self.items.append(items[i])
+            i += 1
+            self.seen += 1
+            if len(self.items) == self.size:
+                self._next = self.seen
+                self._skip()
+        end = self.seen + len(items) - i
+        while self._next is not None and self._next <= end:
+            self.items[self.rng.randrange(self.size)] = items[i + self._next - self.seen - 1]
+            self._skip()
+        self.seen = end
+
+class ColumnProfiler:
+    """
+    Streaming accumulator for one column's statistics, fed a chunk of values at a
+    time. The type, HyperLogLog and MinHash work runs once per distinct value: values
+    already seen (up to KNOWN_VALUES of them) only update the counters.
+    """
+
+    def __init__(self, rng, signatures=True):
+        self.count = 0
+        self.null_count = 0
+        self.type_counts = Counter()
+        self.hll = HyperLogLog()
+        self.minhash = value_matching.MinHash() if signatures else None
+        self.min_length = None
+        self.max_length = None
+        self.heavy = Counter()
+        self.samples = Reservoir(SAMPLE_VALUES, rng)
+        self.known = {}      # text -> detected type of values already counted
+
+    def add_many(self, values):
+        self.count += len(values)
+        present = [value for value in values if value is not None and value != '']
+        self.null_count += len(values) - len(present)
+        if not present:
+            return
+        texts = [value if isinstance(value, str) else json.dumps(value, sort_keys=True, default=str) for value in present]
+        counts = Counter(texts)
+        known = self.known
+        new = [text for text in counts if text not in known]
+        if new:
+            originals = dict(zip(texts, present))
+            kinds = {text: get_data_type(originals[text]) for text in new}
+            self.hll.add_many(new)
+            if self.minhash is not None:
+                self.minhash.update(new)
+            lengths = [len(text) for text in new]
+            self.min_length = min(lengths) if self.min_length is None else min(self.min_length, min(lengths))
+            self.max_length = max(lengths) if self.max_length is None else max(self.max_length, max(lengths))
+            for text in new[:max(0, KNOWN_VALUES - len(known))]:
+                known[text] = kinds[text]
+            kinds.update(known)
+        else:
+            kinds = known
+        type_counts = self.type_counts
+        for text, n in counts.items():
+            type_counts[kinds[text]] += n
+        # Approximate heavy hitters: keep counts bounded by pruning to the most frequent
+        self.heavy.update(counts)
+        if len(self.heavy) > TOP_VALUES * 50:
+            self.heavy = Counter(dict(self.heavy.most_common(TOP_VALUES * 10)))
+        # Reservoir of example values
+        self.samples.extend(present)
+
+    def result(self):
+        non_null = self.count - self.null_count
+        return {
+            "count": self.count,
+            "null_count": self.null_count,
+            "null_ratio": round(self.null_count / self.count, 4) if self.count else 0.0,
+            "type_counts": dict(self.type_counts),
+            "dominant_type": self.type_counts.most_common(1)[0][0] if self.type_counts else 'text',
+            "distinct_estimate": min(self.hll.count(), non_null),
+            "min_length": self.min_length,
+            "max_length": self.max_length,
+            "top_values": self.heavy.most_common(TOP_VALUES),
+            "samples": self.samples.items,
+            "minhash": self.minhash.to_list() if non_null and self.minhash is not None else None,
+        }
+
+def _chunks(records, size=CHUNK_ROWS):
+    if isinstance(records, list):
+        for start in range(0, len(records), size):
+            yield records[start:start + size]
+        return
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def reservoir_sample(records, size, seed=0):
+    """Uniform sample of `size` rows from an iterable of any length, and the number of rows read."""
+    reservoir = Reservoir(size, random.Random(seed))
+    for chunk in _chunks(records):
+        reservoir.extend(chunk)
+    return reservoir.items, reservoir.seen
+
+def profile_records(records, max_rows=DEFAULT_MAX_ROWS, seed=0, signatures=True):
+    """
+    Profile an iterable of dict records in one pass. Inputs with more than
+    `max_rows` rows, including streams of unknown length, are profiled over a
+    reservoir sample of `max_rows` rows. Columns are the union of keys over all
+    rows, in first-seen order. MinHash signatures for value matching are only
+    computed with `signatures`.
+    """
+    rng = random.Random(seed)
+    if max_rows and (not hasattr(records, "__len__") or len(records) > max_rows):
+        rows, total = reservoir_sample(records, max_rows, seed)
+        sampled = total > max_rows
+    else:
+        rows, total, sampled = records, None, False
+    columns = {}
+    row_count = 0
+    for chunk in _chunks(rows):
+        for key in dict.fromkeys(chain.from_iterable(chunk)):
+            if key not in columns:
+                columns[key] = ColumnProfiler(rng, signatures)
+                # Rows seen before this column appeared count as nulls
+                columns[key].count = columns[key].null_count = row_count
+        for key, column in columns.items():
+            column.add_many([row.get(key) for row in chunk])
+        row_count += len(chunk)
+    return {
+        "row_count": total if sampled else row_count,
+        "profiled_rows": row_count,
+        "sampled": sampled,
+        "fields": list(columns),
+        "columns": {key: column.result() for key, column in columns.items()},
+    }
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_memory_cache = OrderedDict()   # most recently used profiles, at most MEMORY_CACHE_SIZE
+
+def _read_cached(cache_path):
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        # A cache file left truncated by an older writer: profile again
+        return None
+
+def load_or_build_profile(path, records=None, cache_dir=PROFILE_CACHE_DIR, max_rows=DEFAULT_MAX_ROWS,
+                          signatures=True):
+    """
+    Return the profile of the source file at `path`, reading it from the on-disk
+    cache (keyed by the file's content hash) when present. `records` may be passed
+    when the data is already loaded, to avoid parsing the file again. Without
+    `signatures` (no value matching planned), MinHash signatures are not computed;
+    a cached profile that has them is used all the same.
+    """
+    # A SQLite table/query is identified by its database file plus the spec
+    stored_file = connectors.source_file(path)
+    stat = os.stat(stored_file)
+    memo_key = (os.path.abspath(stored_file), path, stat.st_mtime_ns, stat.st_size)
+    for key in ((*memo_key, True), (*memo_key, False))[:1 if signatures else 2]:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+    source_hash = file_hash(stored_file)
+    if stored_file != path:
+        source_hash = hashlib.sha256(f"{source_hash}:{path}".encode("utf-8")).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{source_hash}.v{PROFILE_VERSION}.json")
+    unsigned_path = os.path.join(cache_dir, f"{source_hash}.v{PROFILE_VERSION}.unsigned.json")
+    profile = _read_cached(cache_path)
+    has_signatures = profile is not None
+    if profile is None and not signatures:
+        profile = _read_cached(unsigned_path)
+    if profile is None:
+        if records is None:
+            if connectors.is_connector(path):
+                records = connectors.open_source(path).iter_records()
+            elif jsonl_io.is_jsonl(path):
+                records = jsonl_io.iter_jsonl(path)
+            else:
+                with jsonl_io.open_text(path) as f:
+                    records = json.load(f)
+        profile = profile_records(records, max_rows=max_rows, signatures=signatures)
+        profile["source_path"] = path
+        profile["source_hash"] = source_hash
+        has_signatures = signatures
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written under a per-process name and renamed, so concurrent profilers of the
+        # same source (batch_match workers) never leave or read a partial file
+        target = cache_path if signatures else unsigned_path
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(profile, f, indent=2, default=str)
+        os.replace(tmp_path, target)
+    _memory_cache[(*memo_key, has_signatures)] = profile
+    while len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+    return profile
+
+def column_types(profile):
+    """Dominant detected type per column, as used for validation and matching."""
+    return {field: profile["columns"][field]["dominant_type"] for field in profile["fields"]}
+
+def column_sample(profile, field):
+    """A representative non-null sample value of a column, or '' if it has none."""
+    column = profile["columns"].get(field)
+    if not column:
+        return ""
+    for sample in column["samples"]:
+        if sample not in (None, ""):
+            return sample
+    return ""
@@ -1,9 +1,6 @@
-import openai
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import api_clients
+import transform_memo
+import transform_primitives
 
 def get_transformation_suggestion(source_field, target_field, source_sample, target_sample=None):
     """
@@ -24,15 +21,14 @@ Description: <describe the transformation>
 Code:
 <python code or 'None'>
 """
-    response = openai_client.chat.completions.create(
-        model="gpt-4",
-        messages=[
+    content = api_clients.get_clients().chat(
+        [
             {"role": "system", "content": "You are a helpful assistant for data migration."},
             {"role": "user", "content": prompt}
         ],
+        model="gpt-4",
         temperature=0
     )
-    content = response.choices[0].message.content
     # Parse response
     desc = ""
     code = None
@@ -54,9 +50,13 @@ def apply_transformation(value, code):
     """
     if not is_valid_transform_code(code):
         return value
+    return compile_transform(code)(value)
+
+def compile_transform(code):
+    """Execute the transformation code once and return its transform(x) function."""
     local_vars = {}
     exec(code, {}, local_vars)
-    return local_vars['transform'](value)
+    return local_vars['transform']
 
 def safe_apply_transformation(value, code):
     if not is_valid_transform_code(code):
@@ -64,4 +64,163 @@ def safe_apply_transformation(value, code):
     try:
         return apply_transformation(value, code)
     except Exception as e:
-        return f"[Transformation Error: {e}]" 
\ No newline at end of file
+        return f"[Transformation Error: {e}]"
+
+def _settle_failures(results, failures, field=None, quarantine=None, attempted=0, skipped=()):
+    """
+    Write failed values back into a transformed column. `failures` are (position, original
+    value, error). Without a quarantine they become error markers; with one, failed and
+    `skipped` positions are emptied and recorded (rows numbered from 1) in the quarantine.
+    """
+    if quarantine is None:
+        for i, _, error in failures:
+            results[i] = f"[Transformation Error: {error}]"
+        return results
+    for i, _, _ in failures:
+        results[i] = None
+    for i, _ in skipped:
+        results[i] = None
+    quarantine.record(
+        field, attempted,
+        failures=[(i + 1, value, error) for i, value, error in failures],
+        skipped=[(i + 1, value) for i, value in skipped],
+    )
+    return results
+
+def _outcomes(values, spec, code, pool=None):
+    """(ok, value or error message) per value for a primitive `spec` or custom `code` (in `pool` if given)."""
+    if spec:
+        converted, failed = transform_primitives.apply_primitive(values, spec)
+        label = transform_primitives.primitive_label(spec)
+        return [
+            (False, f"{label} could not convert '{value}'") if bad else (True, result)
+            for value, result, bad in zip(values, converted, failed)
+        ]
+    if pool is not None:
+        return pool.map(code, values)
+    try:
+        transform = compile_transform(code)
+    except Exception as e:
+        return [(False, str(e))] * len(values)
+    outcomes = []
+    for value in values:
+        try:
+            outcomes.append((True, transform(value)))
+        except Exception as e:
+            outcomes.append((False, str(e)))
+    return outcomes
+
+def transform_column(values, transform_info, field=None, quarantine=None, pool=None):
+    """
+    Apply the transformation configured for a target field to a whole column of values.
+    Built-in primitives run vectorized over the column; custom code runs per value.
+    None values are passed through untouched. With a TransformQuarantine, failures are
+    quarantined instead of marked, and custom code stops once the field's breaker opens.
+    A memoized transformation (see transform_memo) runs once per distinct value, with
+    custom code in `pool` when one is given.
+    """
+    if not transform_info or not transform_info.get("use_transform"):
+        return list(values)
+    results = list(values)
+    positions = [i for i, v in enumerate(results) if v is not None]
+    if not positions:
+        return results
+    spec = transform_info.get("primitive")
+    code = transform_info.get("user_code")
+    if not spec and not is_valid_transform_code(code):
+        return results
+    if quarantine is not None and quarantine.is_open(field):
+        skipped = [(i, results[i]) for i in positions]
+        return _settle_failures(results, [], field, quarantine, skipped=skipped)
+    originals = [results[i] for i in positions]
+    outcomes = None
+    if transform_info.get("memoize"):
+        # Failures in the pool may come from its time and CPU limits rather than the
+        # value, so only successes of pooled custom code are kept for later batches
+        outcomes = transform_memo.apply_memoized(
+            transform_info, originals, lambda distinct: _outcomes(distinct, spec, code, pool),
+            cacheable=(lambda outcome: outcome[0]) if pool is not None and not spec else None,
+        )
+    if outcomes is None and (spec or pool is not None):
+        outcomes = _outcomes(originals, spec, code, pool)
+    if outcomes is not None:
+        failures = []
+        for i, value, (ok, result) in zip(positions, originals, outcomes):
+            if ok:
+                results[i] = result
+            else:
+                failures.append((i, value, result))
+        return _settle_failures(results, failures, field, quarantine, attempted=len(positions))
+    try:
+        transform = compile_transform(code)
+    except Exception as e:
+        return _settle_failures(results, [(i, results[i], e) for i in positions], field, quarantine,
+                                attempted=len(positions))
+    failures = []
+    attempted = len(positions)
+    for n, i in enumerate(positions):
+        try:
+            results[i] = transform(results[i])
+        except Exception as e:
+            failures.append((i, results[i], e))
+            if quarantine is not None and quarantine.should_trip(field, n + 1, len(failures)):
+                # Too many failures: leave the rest of the column untransformed
+                attempted = n + 1
+                break
+    skipped = [(i, results[i]) for i in positions[attempted:]]
+    return _settle_failures(results, failures, field, quarantine, attempted=attempted, skipped=skipped)
+
+def transform_columns(columns, transformations, pool=None, quarantine=None):
+    """
+    Transform several target columns ({target_field: values}) at once.
+    When a TransformWorkerPool is given, custom code is executed in its sandboxed
+    worker processes (fields in parallel) instead of in this process.
+    Failures go to `quarantine` (a TransformQuarantine) when one is given.
+    """
+    results = {}
+    pooled = {}
+    for field, values in columns.items():
+        info = transformations.get(field, {})
+        code = info.get("user_code")
+        open_breaker = quarantine is not None and quarantine.is_open(field)
+        if (pool and not open_breaker and not info.get("memoize") and info.get("use_transform")
+                and not info.get("primitive") and is_valid_transform_code(code)):
+            results[field] = list(values)
+            positions = [i for i, v in enumerate(results[field]) if v is not None]
+            pooled[field] = (code, positions)
+        else:
+            # Memoized custom code still runs sandboxed, once per distinct value
+            results[field] = transform_column(values, info, field, quarantine, pool=pool if info.get("memoize") else None)
+    if pooled:
+        _transform_pooled(pool, results, pooled, quarantine)
+    return results
+
+def _transform_pooled(pool, results, pooled, quarantine=None):
+    """
+    Run custom code over the `pooled` columns ({field: (code, positions)}) in the pool.
+    With a quarantine, the first `min_rows` values of each field run first, so a field
+    whose breaker opens on them is not sent to the workers again.
+    """
+    start = 0
+    for stop in ([quarantine.min_rows, None] if quarantine is not None else [None]):
+        jobs = {}
+        for field, (code, positions) in pooled.items():
+            chunk = positions[start:stop]
+            if not chunk:
+                continue
+            if quarantine is not None and quarantine.is_open(field):
+                _settle_failures(results[field], [], field, quarantine, skipped=[(i, results[field][i]) for i in chunk])
+            else:
+                jobs[field] = (code, chunk)
+        outputs = pool.map_columns({
+            field: (code, [results[field][i] for i in chunk]) for field, (code, chunk) in jobs.items()
+        }) if jobs else {}
+        for field, (code, chunk) in jobs.items():
+            failures = []
+            for i, (ok, value) in zip(chunk, outputs[field]):
+                if ok:
+                    results[field][i] = value
+                else:
+                    failures.append((i, results[field][i], value))
+            _settle_failures(results[field], failures, field, quarantine, attempted=len(chunk))
+        start = stop
@@ -0,0 +1,288 @@
+"""
+Blocked fuzzy deduplication of merged records.
+
+Instead of comparing every pair of records, each record is assigned a few
+blocking keys (email domain + last-name prefix, Soundex of the last name +
+first initial, exact normalized email, phone suffix). Only records sharing a
+block are scored, with the same normalized difflib similarity used for field
+names in the matcher. A match needs a strong identifier: the score of a pair
+is capped at the similarity of its best-matching email or phone, so records
+that only share a name are never merged (nor chained together through a
+record that only has a name). Oversized blocks fall back to a
+sorted-neighbourhood window so the work stays near-linear: about a million
+rows in six minutes on one core. Matching pairs are clustered with
+union-find and each cluster is collapsed into one surviving record.
+"""
+import difflib
+import re
+from collections import defaultdict
+
+DEFAULT_THRESHOLD = 0.85
+MAX_BLOCK_SIZE = 32      # blocks larger than this are compared within a sliding window
+WINDOW_SIZE = 10
+
+DEFAULT_FIELDS = {
+    "first_name": "first_name",
+    "last_name": "last_name",
+    "email": "email",
+    "phone": "phone",
+}
+FIELD_WEIGHTS = {"email": 0.4, "last_name": 0.25, "first_name": 0.2, "phone": 0.15}
+# Strong identifiers: a pair only matches when one of these agrees, since names alone
+# would chain different people with the same name into one cluster
+STRONG_FIELDS = ("email", "phone")
+MEMO_FIELDS = ("first_name", "last_name")   # values repeat, so their similarities are memoized
+MEMO_SIZE = 100_000
+
+_SOUNDEX_CODES = {c: str(d) for d, letters in enumerate(
+    ["aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"]) for c in letters}
+
+
+def soundex(name):
+    """Classic 4-character Soundex code ('' for names without letters)."""
+    letters = re.sub(r"[^a-z]", "", str(name).lower())
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c, "")
+        if digit not in ("", "0") and digit != previous:
+            code += digit
+        if c not in "hw":
+            previous = digit
+    return (code + "000")[:4]
+
+
+def normalize(value):
+    if value is None:
+        return ""
+    return str(value).lower().replace('_', ' ').replace('-', ' ').strip()
+
+
+class _AnchoredSimilarity:
+    """
+    difflib similarity of many values against one anchor value. The anchor is set
+    as SequenceMatcher's second sequence, whose index difflib caches across calls;
+    it is only indexed once a value actually needs comparing. With `memo_size`,
+    ratios are memoized per value pair (for fields such as names whose values repeat).
+    """
+
+    def __init__(self, memo_size=0):
+        self.matcher = difflib.SequenceMatcher(None, "", "")
+        self.anchor = ""
+        self.indexed = True
+        self.memo = {} if memo_size else None
+        self.memo_size = memo_size
+
+    def set_anchor(self, value):
+        self.anchor = value
+        self.indexed = False
+
+    def __call__(self, value, floor=0.0):
+        if value == self.anchor:
+            return 1.0
+        memo = self.memo
+        if memo is not None:
+            ratio = memo.get((self.anchor, value))
+            if ratio is not None:
+                return ratio
+        if not self.indexed:
+            self.matcher.set_seq2(self.anchor)
+            self.indexed = True
+        self.matcher.set_seq1(value)
+        if self.matcher.real_quick_ratio() < floor or self.matcher.quick_ratio() < floor:
+            return 0.0
+        ratio = self.matcher.ratio()
+        if memo is not None:
+            if len(memo) >= self.memo_size:
+                memo.clear()
+            memo[(self.anchor, value)] = ratio
+        return ratio
+
+
+def blocking_keys(record, fields=DEFAULT_FIELDS):
+    """Blocking keys of a record; only records sharing a key are compared."""
+    first = normalize(record.get(fields["first_name"]))
+    last = normalize(record.get(fields["last_name"]))
+    email = normalize(record.get(fields["email"]))
+    phone = re.sub(r"\D", "", str(record.get(fields["phone"]) or ""))
+    keys = []
+    if email:
+        keys.append(f"e:{email}")
+        if "@" in email and last:
+            keys.append(f"d:{email.split('@', 1)[1]}|{last[:3]}")
+    if last:
+        keys.append(f"s:{soundex(last)}|{first[:1]}")
+    if len(phone) >= 7:
+        keys.append(f"p:{phone[-7:]}")
+    return keys
+
+
+def identity(record, fields=DEFAULT_FIELDS):
+    """Normalized identifying values of a record, in FIELD_WEIGHTS order."""
+    return tuple(normalize(record.get(fields[name])) for name in FIELD_WEIGHTS)
+
+
+class _PairScorer:
+    """Weighted similarity of records (identity tuples) against one anchor record."""
+
+    def __init__(self):
+        self.weights = list(FIELD_WEIGHTS.values())
+        self.strong = [k for k, name in enumerate(FIELD_WEIGHTS) if name in STRONG_FIELDS]
+        # Lightest fields first: short names and phones are cheap to compare, and once they
+        # rule a pair out the long email comparison is skipped
+        self.order = sorted(range(len(self.weights)), key=lambda k: self.weights[k])
+        self.fields = [_AnchoredSimilarity(MEMO_SIZE if name in MEMO_FIELDS else 0) for name in FIELD_WEIGHTS]
+
+    def set_anchor(self, anchor):
+        self.anchor = anchor
+        for similarity, value in zip(self.fields, anchor):
+            similarity.set_anchor(value)
+
+    def score(self, other, threshold=0.0):
+        """
+        Score over the fields present in both records, capped at the similarity of
+        their best-matching STRONG_FIELDS value: names alone never make a match, and
+        a pair without a strong identifier in both records scores 0. Stops early
+        (returning the partial score) once `threshold` is out of reach.
+        """
+        anchor = self.anchor
+        if not any(anchor[k] and other[k] for k in self.strong):
+            return 0.0
+        present = [k for k in self.order if anchor[k] and other[k]]
+        weight_sum = sum(self.weights[k] for k in present)
+        total = 0.0
+        remaining = weight_sum
+        strong = 0.0
+        last_strong = [k for k in present if k in self.strong][-1]
+        for k in present:
+            weight = self.weights[k]
+            remaining -= weight
+            # Lowest similarity on this field that could still reach the threshold
+            floor = (threshold * weight_sum - total - remaining) / weight
+            if k == last_strong and strong < threshold:
+                # The cap cannot reach the threshold either unless this identifier does
+                floor = max(floor, threshold)
+            similarity = self.fields[k](other[k], floor)
+            total += weight * similarity
+            if k in self.strong:
+                strong = max(strong, similarity)
+            if (total + remaining) / weight_sum < threshold:
+                break
+        return min(total / weight_sum, strong)
+
+
+def score_pair(a, b, fields=DEFAULT_FIELDS):
+    """Weighted similarity (0-1) of two records over their identifying fields."""
+    scorer = _PairScorer()
+    scorer.set_anchor(identity(a, fields))
+    return scorer.score(identity(b, fields))
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        self.parent.setdefault(x, x)
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def _candidate_groups(block, identities):
+    """Yield (anchor row, rows to compare it with) for a block."""
+    if len(block) <= MAX_BLOCK_SIZE:
+        for i in range(len(block) - 1):
+            yield block[i], block[i + 1:]
+        return
+    # Sorted neighbourhood: only compare records close to each other by (last, first) name
+    last, first = list(FIELD_WEIGHTS).index("last_name"), list(FIELD_WEIGHTS).index("first_name")
+    ordered = sorted(block, key=lambda r: (identities[r][last], identities[r][first]))
+    for i in range(len(ordered) - 1):
+        yield ordered[i], ordered[i + 1:i + WINDOW_SIZE]
+
+
+def survivor(cluster_records):
+    """Most complete record of the cluster, with empty fields filled from the others."""
+    ranked = sorted(cluster_records, key=lambda r: -sum(v not in (None, "") for v in r.values()))
+    merged = dict(ranked[0])
+    for record in ranked[1:]:
+        for field, value in record.items():
+            if merged.get(field) in (None, "") and value not in (None, ""):
+                merged[field] = value
+    return merged
+
+
+def deduplicate(records, threshold=DEFAULT_THRESHOLD, fields=DEFAULT_FIELDS):
+    """
+    Find duplicate records. Returns (surviving records, clusters) where each
+    cluster is a dict with the row indices it merged and their best pair score.
+    Records that have no duplicates are passed through unchanged, in order.
+    """
+    blocks = defaultdict(list)
+    identities = []
+    for idx, record in enumerate(records):
+        identities.append(identity(record, fields))
+        for key in blocking_keys(record, fields):
+            blocks[key].append(idx)
+    uf = _UnionFind()
+    scorer = _PairScorer()
+    matches = []
+    for block in blocks.values():
+        if len(block) < 2:
+            continue
+        for i, others in _candidate_groups(block, identities):
+            scorer.set_anchor(identities[i])
+            for j in others:
+                # Pairs already clustered through another block need no rescoring
+                if i in uf.parent and j in uf.parent and uf.find(i) == uf.find(j):
+                    continue
+                score = scorer.score(identities[j], threshold)
+                if score >= threshold:
+                    uf.union(i, j)
+                    matches.append((i, score))
+    # Union by minimum index, so each cluster's root is its first row
+    clusters = defaultdict(list)
+    for idx in uf.parent:
+        clusters[uf.find(idx)].append(idx)
+    best_scores = defaultdict(float)
+    for i, score in matches:
+        root = uf.find(i)
+        best_scores[root] = max(best_scores[root], score)
+    survivors = []
+    cluster_report = []
+    for idx, record in enumerate(records):
+        root = uf.find(idx) if idx in uf.parent else idx
+        if root not in clusters:
+            survivors.append(record)
+        elif idx == root:
+            rows = sorted(clusters[root])
+            survivors.append(survivor([records[r] for r in rows]))
+            cluster_report.append({
+                "Cluster": len(cluster_report) + 1,
+                "Rows": [r + 1 for r in rows],
+                "Size": len(rows),
+                "Score": round(best_scores[root], 3),
+            })
+    return survivors, cluster_report
+
+
+def survivor_rows(count, clusters):
+    """{original row: row of its surviving record} (both 1-based) for `count` records deduplicated into `clusters`."""
+    root_of = {row: cluster["Rows"][0] for cluster in clusters for row in cluster["Rows"]}
+    mapping = {}
+    survivors = 0
+    for row in range(1, count + 1):
+        root = root_of.get(row, row)
+        if root == row:
+            survivors += 1
+        mapping[row] = survivors if root == row else mapping[root]
+    return mapping
@@ -0,0 +1,234 @@
+"""
+Compact, memory-mapped embedding store.
+
+A store is a directory:
+
+- `vectors.npy`: the unit-normalized vectors as one contiguous float16 matrix,
+  or int8 codes with a float32 scale per row (`scales.npy`),
+- `vectors_f32.npy` (opt-in, `keep_float32=True`): the float32 originals, read
+  only for the few candidate rows of a search when rescoring,
+- `items.jsonl`: one {"id", "metadata"} line per row, loaded on first use,
+- `manifest.json`: dtype, dimension, row count and the embedding model.
+
+The matrices are opened with `np.load(mmap_mode="r")`, so opening a store
+costs milliseconds whatever its size, and pages are read on demand. Search
+scores all rows chunk by chunk from the compact matrix and keeps the top-k
+per query; with the float32 originals kept, it keeps `top_k * oversample`
+candidates instead and rescores those exactly. Scores are cosine similarities.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+FLOAT32_FILE = "vectors_f32.npy"
+ITEMS_FILE = "items.jsonl"
+STORE_VERSION = 1
+DTYPES = ("float16", "int8")
+DEFAULT_DTYPE = "float16"
+DEFAULT_OVERSAMPLE = 4
+SEARCH_CHUNK_ROWS = 65_536
+
+
+def normalize(vectors):
+    """Rows scaled to unit length (zero rows stay zero), as float32."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantization: (codes, scales) with vectors ≈ codes * scales[:, None]."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+class EmbeddingStore:
+    """A store directory opened read-only; see `write_store` to create one."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.dtype = self.manifest["dtype"]
+        self.dim = self.manifest["dim"]
+        self.count = self.manifest["count"]
+        self.embedding_model = self.manifest.get("embedding_model")
+        self.matrix = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, SCALES_FILE), mmap_mode="r") if self.dtype == "int8" else None
+        float32_path = os.path.join(path, FLOAT32_FILE)
+        self.float32 = np.load(float32_path, mmap_mode="r") if os.path.exists(float32_path) else None
+        self._ids = None
+        self._metadata = None
+        self._positions = None
+
+    def __len__(self):
+        return self.count
+
+    def _load_items(self):
+        ids, metadata = [], []
+        with open(os.path.join(self.path, ITEMS_FILE)) as f:
+            for line in f:
+                item = json.loads(line)
+                ids.append(item["id"])
+                metadata.append(item.get("metadata") or {})
+        self._ids, self._metadata = ids, metadata
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            self._load_items()
+        return self._ids
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._load_items()
+        return self._metadata
+
+    def position(self, vector_id):
+        """Row of an id, or None."""
+        if self._positions is None:
+            self._positions = {vid: row for row, vid in enumerate(self.ids)}
+        return self._positions.get(vector_id)
+
+    def rows(self, start, stop):
+        """Dequantized rows [start, stop) of the compact matrix as float32."""
+        block = np.asarray(self.matrix[start:stop], dtype=np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:stop, None]
+        return block
+
+    def vectors(self, positions):
+        """Float32 vectors of the given rows: the originals when stored, else dequantized."""
+        positions = np.asarray(positions, dtype=np.int64)
+        if self.float32 is not None:
+            return np.asarray(self.float32[positions], dtype=np.float32)
+        block = np.asarray(self.matrix[positions], dtype=np.float32)
+        if self.scales is not None:
+            block *= np.asarray(self.scales[positions])[:, None]
+        return block
+
+    def search_positions(self, queries, top_k=5, oversample=DEFAULT_OVERSAMPLE, chunk_rows=SEARCH_CHUNK_ROWS):
+        """
+        Batched top-k for a (n, dim) array of queries: (positions, scores), both (n, k),
+        best first. Candidates come from the compact matrix; with the float32 originals,
+        `oversample` times as many are kept and rescored exactly.
+        """
+        queries = normalize(queries)
+        if self.count == 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match the store ({self.dim})")
+        top_k = min(top_k, self.count)
+        if top_k <= 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+        # Rescoring dequantized rows would only repeat the compact scores
+        rescore = self.float32 is not None
+        candidates = min(self.count, top_k * max(oversample, 1)) if rescore else top_k
+
+        best_positions = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, self.count, chunk_rows):
+            stop = min(start + chunk_rows, self.count)
+            scores = np.concatenate([best_scores, queries @ self.rows(start, stop).T], axis=1)
+            positions = np.concatenate(
+                [best_positions, np.broadcast_to(np.arange(start, stop), (len(queries), stop - start))], axis=1
+            )
+            if scores.shape[1] > candidates:
+                keep = np.argpartition(-scores, candidates - 1, axis=1)[:, :candidates]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                positions = np.take_along_axis(positions, keep, axis=1)
+            best_scores, best_positions = scores, positions
+
+        if rescore:
+            # Rescore the candidates of all queries together from the float32 originals
+            unique, inverse = np.unique(best_positions, return_inverse=True)
+            exact = self.vectors(unique)
+            best_scores = np.einsum("nd,nkd->nk", queries, exact[inverse.reshape(best_positions.shape)])
+        order = np.argsort(-best_scores, axis=1, kind="stable")[:, :top_k]
+        return np.take_along_axis(best_positions, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def search(self, queries, top_k=5, oversample=DEFAULT_OVERSAMPLE):
+        """Per query, the top-k matches as [{"id", "score", "metadata"}], best first."""
+        positions, scores = self.search_positions(queries, top_k=top_k, oversample=oversample)
+        return [
+            [
+                {"id": self.ids[pos], "score": float(score), "metadata": self.metadata[pos]}
+                for pos, score in zip(row_positions, row_scores)
+            ]
+            for row_positions, row_scores in zip(positions, scores)
+        ]
+
+    def records(self):
+        """Stored rows in the {"id", "values", "metadata"} shape of ingest's schema vectors."""
+        for start in range(0, self.count, SEARCH_CHUNK_ROWS):
+            stop = min(start + SEARCH_CHUNK_ROWS, self.count)
+            block = self.vectors(np.arange(start, stop))
+            for offset, vector in enumerate(block):
+                yield {"id": self.ids[start + offset], "values": vector, "metadata": self.metadata[start + offset]}
+
+
+def write_store(path, ids, vectors, metadata=None, dtype=DEFAULT_DTYPE, keep_float32=False, embedding_model=None):
+    """
+    Write a store (replacing any store at `path`) and return it opened.
+    `vectors` is anything np.asarray turns into an (n, dim) matrix. With
+    `keep_float32`, the originals are also kept for exact rescoring (the
+    store is then larger than a plain float32 matrix).
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown store dtype '{dtype}' (expected one of {', '.join(DTYPES)})")
+    ids = list(ids)
+    metadata = list(metadata) if metadata is not None else [{}] * len(ids)
+    vectors = normalize(vectors) if len(ids) else np.empty((0, 0), dtype=np.float32)
+    if len(vectors) != len(ids) or len(metadata) != len(ids):
+        raise ValueError("ids, vectors and metadata must have the same length")
+    if len(set(ids)) != len(ids):
+        raise ValueError("Vector ids must be unique")
+
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    if dtype == "int8":
+        codes, scales = quantize_int8(vectors)
+        np.save(os.path.join(tmp_path, VECTORS_FILE), codes)
+        np.save(os.path.join(tmp_path, SCALES_FILE), scales)
+    else:
+        np.save(os.path.join(tmp_path, VECTORS_FILE), vectors.astype(np.float16))
+    if keep_float32:
+        np.save(os.path.join(tmp_path, FLOAT32_FILE), vectors)
+    with open(os.path.join(tmp_path, ITEMS_FILE), "w") as f:
+        for vid, meta in zip(ids, metadata):
+            f.write(json.dumps({"id": vid, "metadata": meta}) + "\n")
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+        json.dump({
+            "version": STORE_VERSION,
+            "dtype": dtype,
+            "dim": int(vectors.shape[1]),
+            "count": len(ids),
+            "embedding_model": embedding_model,
+        }, f, indent=2)
+
+    # Swap the finished directory in, so readers never see a half-written store
+    old_path = f"{path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return EmbeddingStore(path)
+
+
+def open_store(path):
+    """The store at `path`, or None when there is none."""
+    if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return None
+    return EmbeddingStore(path)
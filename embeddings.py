@@ -0,0 +1,138 @@
+"""
+Embedding providers for schema ingestion and field matching.
+
+- `openai`: text-embedding-3-small through the shared, rate-limited client
+  layer (api_clients.py). The default.
+- `local`: a SentenceTransformer model (default all-MiniLM-L6-v2, the model
+  check_field_matches.py uses) run on the CPU in batches, optionally spread
+  over a pool of encoder processes for large inputs. No network needed after
+  the model is downloaded once.
+
+The provider is chosen with EMBEDDING_PROVIDER in .env (or the --embedding-provider
+option of ingest_metadata_to_pinecone.py). Ingest and matching must use the
+same provider: vectors of different models are not comparable, and the
+Pinecone index dimension has to match the model (1536 for OpenAI, 384 for
+all-MiniLM-L6-v2).
+"""
+import atexit
+import os
+import threading
+
+from dotenv import load_dotenv
+
+import api_clients
+
+load_dotenv()
+
+DEFAULT_PROVIDER = "openai"
+DEFAULT_LOCAL_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_BATCH_SIZE = 64
+MULTI_PROCESS_MIN_TEXTS = 1000   # below this, starting encoder processes costs more than it saves
+
+
+class EmbeddingProvider:
+    """Turns texts into embedding vectors (lists of floats), in order."""
+
+    name = "base"
+
+    def embed(self, texts):
+        raise NotImplementedError
+
+    def embed_one(self, text):
+        return self.embed([text])[0]
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, model=api_clients.EMBEDDING_MODEL, batch_size=256, clients=None):
+        self.model = model
+        self.batch_size = batch_size
+        self.clients = clients
+        self.name = f"openai:{model}"
+
+    def embed(self, texts):
+        clients = self.clients or api_clients.get_clients()
+        texts = list(texts)
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(clients.embed(texts[i:i + self.batch_size], model=self.model))
+        return vectors
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """SentenceTransformer on the CPU; `processes` > 1 adds a multi-process encode pool for large inputs."""
+
+    def __init__(self, model_name=DEFAULT_LOCAL_MODEL, batch_size=DEFAULT_BATCH_SIZE, processes=0, device="cpu"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.processes = processes
+        self.device = device
+        self.name = f"local:{model_name}"
+        self._model = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name, device=self.device)
+            return self._model
+
+    def _encode_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._model.start_multi_process_pool(target_devices=[self.device] * self.processes)
+                atexit.register(self.close)
+            return self._pool
+
+    def embed(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        model = self.model
+        if self.processes > 1 and len(texts) >= MULTI_PROCESS_MIN_TEXTS:
+            vectors = model.encode_multi_process(texts, self._encode_pool(), batch_size=self.batch_size)
+        else:
+            vectors = model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False)
+        return vectors.astype("float32").tolist()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._model.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def create_provider(name=None):
+    """A new provider from its name ('openai' or 'local'); settings come from .env."""
+    name = (name or os.getenv("EMBEDDING_PROVIDER") or DEFAULT_PROVIDER).lower()
+    if name == "openai":
+        return OpenAIEmbeddingProvider(model=os.getenv("OPENAI_EMBEDDING_MODEL", api_clients.EMBEDDING_MODEL))
+    if name == "local":
+        return LocalEmbeddingProvider(
+            model_name=os.getenv("LOCAL_EMBEDDING_MODEL", DEFAULT_LOCAL_MODEL),
+            batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+            processes=int(os.getenv("EMBEDDING_PROCESSES", 0)),
+        )
+    raise ValueError(f"Unknown embedding provider '{name}' (expected 'openai' or 'local')")
+
+
+def get_provider(name=None):
+    """The process-wide provider for `name` (default: EMBEDDING_PROVIDER), created on first use."""
+    key = (name or os.getenv("EMBEDDING_PROVIDER") or DEFAULT_PROVIDER).lower()
+    with _providers_lock:
+        if key not in _providers:
+            _providers[key] = create_provider(key)
+        return _providers[key]
+
+
+def set_provider(provider, name=None):
+    """Install a provider (e.g. a fake in tests) for `name` (default: EMBEDDING_PROVIDER)."""
+    key = (name or os.getenv("EMBEDDING_PROVIDER") or DEFAULT_PROVIDER).lower()
+    with _providers_lock:
+        _providers[key] = provider
@@ -0,0 +1,181 @@
+"""
+Dotted / JSONPath-style field paths for nested source records and targets.
+
+    contact.email            key "email" of the object under "contact"
+    contact.emails[0]        first element of the "emails" array
+    payment_methods[-1]      last element
+    orders[*].sku            "sku" of every element, as a list
+    meta['created.at']       a key that itself contains dots or brackets
+    $.contact.email          a leading "$." is ignored
+
+Paths are parsed and compiled once (and cached) into accessor functions, so
+the merge evaluates a column with a single call per row and no path parsing.
+A missing key, an index out of range or a non-container along the way gives
+None. A record that has the whole path as a literal key (e.g. a flattened
+"contact.email" column) is read as that key.
+"""
+import re
+from functools import lru_cache
+
+_TOKEN = re.compile(
+    r"""\.?(?P<key>[^.\[\]]+)"""            # .key or key
+    r"""|\[(?P<index>-?\d+)\]"""            # [0] / [-1]
+    r"""|\[(?P<wild>\*)\]"""                # [*]
+    r"""|\[(?P<quote>['"])(?P<qkey>.*?)(?P=quote)\]"""  # ['key with . or ]']
+)
+WILDCARD = "*"
+
+
+def is_path(name):
+    """Whether a field name needs path evaluation (plain keys are read directly)."""
+    return isinstance(name, str) and ("." in name or "[" in name)
+
+
+@lru_cache(maxsize=None)
+def parse_path(path):
+    """Steps of a path: str keys, int indices and WILDCARD; raises ValueError on bad syntax."""
+    text = path[2:] if path.startswith("$.") else path
+    steps, pos = [], 0
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None or (pos > 0 and match.group("key") is not None and text[pos] != "."):
+            raise ValueError(f"Invalid field path '{path}' at position {pos}")
+        if match.group("key") is not None:
+            steps.append(match.group("key"))
+        elif match.group("index") is not None:
+            steps.append(int(match.group("index")))
+        elif match.group("wild") is not None:
+            steps.append(WILDCARD)
+        else:
+            steps.append(match.group("qkey"))
+        pos = match.end()
+    if not steps:
+        raise ValueError(f"Empty field path '{path}'")
+    return tuple(steps)
+
+
+def path_root(name):
+    """Top-level source key a field name or path reads."""
+    if not is_path(name):
+        return name
+    try:
+        root = parse_path(name)[0]
+    except ValueError:
+        return name
+    return root if isinstance(root, str) and root != WILDCARD else name
+
+
+def _compile_steps(steps):
+    """Accessor for wildcard-free steps, generated as one chained subscription."""
+    expression = "value" + "".join(f"[{step!r}]" for step in steps)
+    namespace = {}
+    exec(
+        "def get(value):\n"
+        "    try:\n"
+        f"        return {expression}\n"
+        "    except (KeyError, IndexError, TypeError):\n"
+        "        return None\n",
+        namespace,
+    )
+    return namespace["get"]
+
+
+def _compile_wildcard(steps):
+    """Accessor for steps with [*]: the rest of the path is applied to every element."""
+    at = steps.index(WILDCARD)
+    head = _compile_steps(steps[:at]) if at else (lambda value: value)
+    tail = _compile_wildcard(steps[at + 1:]) if WILDCARD in steps[at + 1:] else (
+        _compile_steps(steps[at + 1:]) if steps[at + 1:] else (lambda value: value)
+    )
+
+    def get(value):
+        items = head(value)
+        if not isinstance(items, list):
+            return None
+        return [tail(item) for item in items]
+    return get
+
+
+@lru_cache(maxsize=None)
+def compile_accessor(path):
+    """
+    A function reading `path` from a record. Plain names become a dict lookup;
+    paths fall back to a literal key of the same name when the record has one.
+    """
+    if not is_path(path):
+        return lambda row: row.get(path)
+    steps = parse_path(path)
+    nested = _compile_wildcard(steps) if WILDCARD in steps else _compile_steps(steps)
+
+    def get(row):
+        if path in row:
+            return row[path]
+        return nested(row)
+    return get
+
+
+def extract_column(data, path):
+    """Values of `path` for every record, in order."""
+    return list(map(compile_accessor(path), data))
+
+
+def _set(container, steps, value):
+    """
+    Set a value at a (wildcard-free) path inside nested dicts/lists, creating them as
+    needed. Existing containers along the path are copied first, so objects shared
+    with the source records are never modified.
+    """
+    for step, next_step in zip(steps, steps[1:]):
+        child = _get_child(container, step)
+        if child is None:
+            child = [] if isinstance(next_step, int) else {}
+        elif isinstance(child, (dict, list)):
+            child = type(child)(child)
+        _put(container, step, child)
+        container = child
+    _put(container, steps[-1], value)
+
+
+def _get_child(container, step):
+    if isinstance(step, int):
+        return container[step] if -len(container) <= step < len(container) else None
+    return container.get(step)
+
+
+def _put(container, step, value):
+    if isinstance(step, int):
+        if step < 0:
+            raise ValueError("Negative indices cannot be used in target paths")
+        container.extend([None] * (step + 1 - len(container)))
+    container[step] = value
+
+
+def target_steps(path):
+    """(root target field, steps below it) of a nested target path like `address.city`."""
+    steps = parse_path(path)
+    if not isinstance(steps[0], str) or len(steps) < 2 or WILDCARD in steps:
+        raise ValueError(f"Target path '{path}' must name a field and a key or index below it, without [*]")
+    return steps[0], steps[1:]
+
+
+def build_nested_column(length, parts, base=None):
+    """
+    Values of a nested target field from its sub-paths. `parts` is [(steps, column)];
+    `base` is an optional column of values mapped to the field itself, whose objects
+    are copied (along the paths written) and completed; the base values are not changed. Rows where every part and the base are None stay None.
+    """
+    values = []
+    for row in range(length):
+        base_value = base[row] if base is not None else None
+        row_parts = [(steps, column[row]) for steps, column in parts]
+        if base_value is None and all(value is None for _, value in row_parts):
+            values.append(None)
+            continue
+        if isinstance(base_value, (dict, list)):
+            obj = type(base_value)(base_value)
+        else:
+            obj = [] if isinstance(parts[0][0][0], int) else {}
+        for steps, value in row_parts:
+            _set(obj, steps, value)
+        values.append(obj)
+    return values
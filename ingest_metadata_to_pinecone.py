@@ -1,92 +1,275 @@
-import os
 import json
-from dotenv import load_dotenv
-from pinecone import Pinecone
-from openai import OpenAI
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
+import api_clients
+import embedding_store
+import embeddings
+
+VECTOR_ID_PREFIX = "target_schema_"
+DEFAULT_UPSERT_BATCH_SIZE = 100
+DEFAULT_EMBED_BATCH_SIZE = 256
+DEFAULT_WORKERS = 4
+FETCH_BATCH_SIZE = 100
+DEFAULT_STORE_PATH = "output/schema_vectors"
+# Vectors ingested before the model was recorded in their metadata
+LEGACY_EMBEDDING_MODEL = f"openai:{api_clients.EMBEDDING_MODEL}"
+
 def load_json(path):
     """Load JSON data from file."""
     with open(path, "r") as f:
         return json.load(f)
 
-def get_embedding(text, client):
-    """Generate OpenAI embedding for text."""
-    response = client.embeddings.create(
-        input=[text],
-        model="text-embedding-3-small"
-    )
-    return response.data[0].embedding
+def get_embedding(text, provider):
+    """Generate the embedding of a text with an embeddings.EmbeddingProvider."""
+    return get_embeddings([text], provider)[0]
 
-def build_schema_vectors(schema, client):
-    """Create vectors for schema fields with their metadata."""
+def get_embeddings(texts, provider, batch_size=DEFAULT_EMBED_BATCH_SIZE):
+    """Generate embeddings for many texts, one provider call (API request or local batch) per batch."""
     vectors = []
-    
-    for field in schema["fields"]:
-        # Create a rich text representation of the field for embedding
-        field_text = f"""
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(provider.embed(texts[i:i+batch_size]))
+    return vectors
+
+def field_text(field):
+    """Rich text representation of a schema field used for its embedding."""
+    return f"""
         Field Name: {field['name']}
         Data Type: {field['data_type']}
         Required: {field['required']}
         Description: {field['description']}
         Default Value: {field.get('default_value', 'None')}
         """
-        
-        # Generate embedding
-        vector = get_embedding(field_text, client)
-        
-        # Create metadata dictionary with proper handling of default_value
-        metadata = {
-            "field_name": field["name"],
-            "data_type": field["data_type"],
-            "required": field["required"],
-            "description": field["description"],
-            "schema_version": schema["version"]
-        }
-        
-        # Only add default_value to metadata if it exists and is not None
-        if "default_value" in field and field["default_value"] is not None:
-            metadata["default_value"] = str(field["default_value"])
-        
-        # Create vector with metadata
-        vectors.append({
-            "id": f"target_schema_{field['name']}",
-            "values": vector,
-            "metadata": metadata
-        })
-    
-    return vectors
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def schema_prefix(schema):
+    """Id prefix of a schema's vectors, so schemas sharing an index never share ids."""
+    return f"{VECTOR_ID_PREFIX}{schema['name']}:"
+
+def vector_id(field, schema):
+    return f"{schema_prefix(schema)}{field['name']}"
+
+def legacy_vector_id(field):
+    """Id of a field's vector from before ids were namespaced by schema."""
+    return f"{VECTOR_ID_PREFIX}{field['name']}"
+
+def build_metadata(field, schema, embedding_model=LEGACY_EMBEDDING_MODEL):
+    """Create metadata dictionary with proper handling of default_value."""
+    metadata = {
+        "field_name": field["name"],
+        "data_type": field["data_type"],
+        "required": field["required"],
+        "description": field["description"],
+        "schema_version": schema["version"],
+        # Owner of the vector in an index shared by several schemas
+        "schema_name": schema.get("name"),
+        "text_hash": text_hash(field_text(field)),
+        "embedding_model": embedding_model,
+    }
+    # Only add default_value to metadata if it exists and is not None
+    if "default_value" in field and field["default_value"] is not None:
+        metadata["default_value"] = str(field["default_value"])
+    return metadata
+
+def build_schema_vectors(schema, provider, fields=None, embed_batch_size=DEFAULT_EMBED_BATCH_SIZE):
+    """Create vectors for schema fields (all of them, or only `fields`) with their metadata."""
+    fields = schema["fields"] if fields is None else fields
+    vectors = get_embeddings([field_text(field) for field in fields], provider, embed_batch_size)
+    return [
+        {"id": vector_id(field, schema), "values": vector, "metadata": build_metadata(field, schema, provider.name)}
+        for field, vector in zip(fields, vectors)
+    ]
+
+def list_existing_ids(clients, schema):
+    """
+    Ids to check in the index for a schema: its vectors, listed by prefix with index.list
+    (serverless indexes), plus the legacy ids of its fields. Falls back to the ids of the
+    current fields when listing is unsupported, in which case removed fields cannot be detected.
+    """
+    legacy_ids = [legacy_vector_id(field) for field in schema["fields"]]
+    try:
+        return clients.list_ids(schema_prefix(schema)) + legacy_ids
+    except Exception:
+        return [vector_id(field, schema) for field in schema["fields"]] + legacy_ids
+
+def vector_state(metadata):
+    """(text_hash, embedding model, owning schema name) recorded in a vector's metadata."""
+    return (
+        metadata.get("text_hash"),
+        metadata.get("embedding_model", LEGACY_EMBEDDING_MODEL),
+        metadata.get("schema_name"),
+    )
+
+def field_state(field, schema, embedding_model):
+    """The vector_state an up-to-date vector of `field` has."""
+    return text_hash(field_text(field)), embedding_model, schema.get("name")
+
+def fetch_existing_hashes(clients, ids):
+    """Return {vector id: vector_state} for the given ids that exist in the index."""
+    hashes = {}
+    for i in range(0, len(ids), FETCH_BATCH_SIZE):
+        response = clients.fetch(ids[i:i+FETCH_BATCH_SIZE])
+        vectors = response.vectors if hasattr(response, "vectors") else response.get("vectors", {})
+        for vid, vector in vectors.items():
+            metadata = vector.metadata if hasattr(vector, "metadata") else vector.get("metadata")
+            metadata = metadata or {}
+            hashes[vid] = vector_state(metadata)
+    return hashes
+
+def plan_ingest(schema, existing_hashes, full=False, embedding_model=LEGACY_EMBEDDING_MODEL):
+    """
+    Split schema fields into (changed fields to re-embed, unchanged count, vector ids to delete).
+    Fields embedded with another model, or not yet stored under this schema's ids, count as
+    changed. Only vectors owned by this schema are deleted (including its legacy ids, which
+    are replaced): other schemas in a shared index, and vectors written before owners were
+    recorded, are left alone.
+    """
+    current_ids = {vector_id(field, schema) for field in schema["fields"]}
+    changed = [
+        field for field in schema["fields"]
+        if full or existing_hashes.get(vector_id(field, schema)) != field_state(field, schema, embedding_model)
+    ]
+    removed = sorted(
+        vid for vid, state in existing_hashes.items()
+        if vid not in current_ids and state[2] is not None and state[2] == schema.get("name")
+    )
+    return changed, len(schema["fields"]) - len(changed), removed
+
+def store_hashes(store):
+    """Return {vector id: vector_state} of the schema vectors in a local store."""
+    if store is None:
+        return {}
+    return {vid: vector_state(metadata) for vid, metadata in zip(store.ids, store.metadata)}
+
+def write_schema_store(path, schema, vectors, store, provider, dtype=embedding_store.DEFAULT_DTYPE,
+                       embed_batch_size=DEFAULT_EMBED_BATCH_SIZE, keep_float32=False):
+    """
+    Write the local embedding store of the whole schema: freshly built `vectors`,
+    unchanged vectors reused from the previous `store`, and any field missing
+    from both embedded now. Returns (store, number of fields embedded for it).
+    """
+    fresh = {vector["id"]: vector for vector in vectors}
+    previous = store_hashes(store)
+    rows, missing = {}, []
+    for field in schema["fields"]:
+        vid = vector_id(field, schema)
+        # A store written before ids were namespaced is reused under the new ids
+        stored_id = next((i for i in (vid, legacy_vector_id(field))
+                          if previous.get(i) == field_state(field, schema, provider.name)), None)
+        if vid in fresh:
+            rows[vid] = fresh[vid]
+        elif stored_id is not None:
+            position = store.position(stored_id)
+            rows[vid] = {"id": vid, "values": store.vectors([position])[0], "metadata": store.metadata[position]}
+        else:
+            missing.append(field)
+    for vector in build_schema_vectors(schema, provider, fields=missing, embed_batch_size=embed_batch_size):
+        rows[vector["id"]] = vector
+    ordered = [rows[vector_id(field, schema)] for field in schema["fields"]]
+    if (not fresh and not missing and store is not None and store.dtype == dtype
+            and (store.float32 is not None) == keep_float32 and store.ids == [row["id"] for row in ordered]):
+        # Nothing changed: keep the store as it is
+        return store, 0
+    new_store = embedding_store.write_store(
+        path,
+        [row["id"] for row in ordered],
+        [row["values"] for row in ordered],
+        [row["metadata"] for row in ordered],
+        dtype=dtype,
+        keep_float32=keep_float32,
+        embedding_model=provider.name,
+    )
+    return new_store, len(missing)
+
+def upsert_vectors(clients, vectors, batch_size=DEFAULT_UPSERT_BATCH_SIZE, workers=DEFAULT_WORKERS):
+    """Upsert vectors in batches, running several batches concurrently (within the shared upsert rate limit)."""
+    batches = [vectors[i:i+batch_size] for i in range(0, len(vectors), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(tqdm(executor.map(clients.upsert, batches), total=len(batches)))
+
+def delete_vectors(clients, ids, batch_size=DEFAULT_UPSERT_BATCH_SIZE):
+    for i in range(0, len(ids), batch_size):
+        clients.delete(ids=ids[i:i+batch_size])
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Incrementally ingest target schema metadata into Pinecone.")
+    parser.add_argument("--schema", default="schemas/target_schema.json", help="Path to the target schema JSON")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_UPSERT_BATCH_SIZE, help="Vectors per upsert request")
+    parser.add_argument("--embed-batch-size", type=int, default=DEFAULT_EMBED_BATCH_SIZE, help="Texts per embedding request")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent upsert requests")
+    parser.add_argument("--full", action="store_true", help="Re-embed every field even if unchanged")
+    parser.add_argument("--embedding-provider", choices=["openai", "local"], default=None,
+                        help="Embedding backend (default: EMBEDDING_PROVIDER from .env, else openai)")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Local memory-mapped store of the schema vectors")
+    parser.add_argument("--store-dtype", choices=embedding_store.DTYPES, default=embedding_store.DEFAULT_DTYPE,
+                        help="Storage type of the local store's matrix")
+    parser.add_argument("--store-float32", action="store_true",
+                        help="Also keep float32 originals in the local store for exact rescoring")
+    parser.add_argument("--skip-pinecone", action="store_true",
+                        help="Only build the local store; compare against it instead of the Pinecone index")
+    return parser.parse_args()
 
 def main():
-    # Load API keys from .env
-    load_dotenv()
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    index = pc.Index(os.getenv("PINECONE_INDEX_NAME"))
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    
+    args = parse_args()
+    # Shared, rate-limited OpenAI/Pinecone clients (API keys from .env)
+    clients = api_clients.get_clients()
+    provider = embeddings.get_provider(args.embedding_provider)
+
     # Load target schema
     try:
-        schema = load_json("schemas/target_schema.json")
+        schema = load_json(args.schema)
         print(f"✅ Loaded target schema: {schema['name']}")
         print(f"Found {len(schema['fields'])} fields")
     except Exception as e:
         print(f"❌ Error loading schema: {str(e)}")
         return
-    
-    # Create vectors for schema fields
-    print("🔁 Creating embeddings for schema fields...")
-    vectors = build_schema_vectors(schema, client)
-    
-    # Upload vectors to Pinecone
-    print("📤 Uploading vectors to Pinecone...")
-    for i in tqdm(range(0, len(vectors), 10)):
-        batch = vectors[i:i+10]
-        index.upsert(vectors=batch)
-    
-    print("✅ Done: Schema metadata uploaded to Pinecone.")
-    print("\nUploaded fields:")
-    for field in schema["fields"]:
-        print(f"- {field['name']} ({field['data_type']})")
+
+    # Compare field text hashes with what is already in the index (or the local store)
+    store = embedding_store.open_store(args.store)
+    if args.skip_pinecone:
+        print("🔎 Checking existing vectors in the local store...")
+        existing_hashes = store_hashes(store)
+    else:
+        print("🔎 Checking existing vectors in Pinecone...")
+        existing_ids = list_existing_ids(clients, schema)
+        existing_hashes = fetch_existing_hashes(clients, existing_ids)
+    changed, unchanged, removed = plan_ingest(schema, existing_hashes, full=args.full, embedding_model=provider.name)
+    print(f"{len(changed)} new/changed, {unchanged} unchanged, {len(removed)} removed fields")
+
+    vectors = []
+    if changed:
+        # Create vectors for new or changed schema fields only
+        print(f"🔁 Creating embeddings for changed schema fields ({provider.name})...")
+        vectors = build_schema_vectors(schema, provider, fields=changed, embed_batch_size=args.embed_batch_size)
+
+        if not args.skip_pinecone:
+            # Upload vectors to Pinecone
+            print("📤 Uploading vectors to Pinecone...")
+            upsert_vectors(clients, vectors, batch_size=args.batch_size, workers=args.workers)
+
+    if removed and not args.skip_pinecone:
+        print("🧹 Deleting vectors for removed fields...")
+        delete_vectors(clients, removed, batch_size=args.batch_size)
+
+    print(f"💾 Writing local embedding store to {args.store}...")
+    store, embedded = write_schema_store(args.store, schema, vectors, store, provider,
+                                         dtype=args.store_dtype, embed_batch_size=args.embed_batch_size,
+                                         keep_float32=args.store_float32)
+    if embedded:
+        print(f"{embedded} fields missing from the previous store were embedded")
+    print(f"Stored {len(store)} vectors ({store.dim} dims, {store.dtype})")
+
+    print("✅ Done: Schema metadata synced to Pinecone." if not args.skip_pinecone else "✅ Done: Local schema store updated.")
+    for line in clients.summary():
+        print(f"🌐 {line}")
+    if changed:
+        print("\nUploaded fields:")
+        for field in changed:
+            print(f"- {field['name']} ({field['data_type']})")
 
 if __name__ == "__main__":
     main()
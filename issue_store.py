@@ -0,0 +1,94 @@
+"""
+Compact, aggregated store of validation issues.
+
+Instead of one dict per bad cell, issues are aggregated per (field, issue):
+a counter, the affected row numbers as a packed integer array and the first
+few example rows with their values. Summaries for the UI come straight from
+the counters; the detailed per-row CSV is only streamed to disk on request.
+"""
+import csv
+from array import array
+
+import pandas as pd
+
+DEFAULT_MAX_EXAMPLES = 5
+DETAIL_COLUMNS = ["System", "Row", "Field", "Issue"]
+
+
+class IssueStore:
+    """Per (field, issue) counters, packed row lists and capped examples for one validated system."""
+
+    def __init__(self, system_name, max_examples=DEFAULT_MAX_EXAMPLES):
+        self.system_name = system_name
+        self.max_examples = max_examples
+        self.rows = {}
+        self.examples = {}
+        self.detail_path = None
+
+    def add(self, row, field, issue, value=None):
+        """Record an issue for a (1-based) row number."""
+        key = (field, issue)
+        rows = self.rows.get(key)
+        if rows is None:
+            rows = self.rows[key] = array("I")
+            self.examples[key] = []
+        rows.append(row)
+        if len(self.examples[key]) < self.max_examples:
+            self.examples[key].append((row, value))
+
+    def add_rows(self, field, issue, row_numbers, values=None):
+        """Record the same issue for many rows at once (e.g. from a vectorized mask)."""
+        row_numbers = list(row_numbers)
+        if not row_numbers:
+            return
+        key = (field, issue)
+        if key not in self.rows:
+            self.rows[key] = array("I")
+            self.examples[key] = []
+        self.rows[key].extend(row_numbers)
+        room = self.max_examples - len(self.examples[key])
+        if room > 0:
+            sample_values = list(values)[:room] if values is not None else [None] * room
+            self.examples[key].extend(zip(row_numbers[:room], sample_values))
+
+    def merge(self, other, row_offset=0):
+        """Add the issues of another store, shifting its row numbers by `row_offset`."""
+        for (field, issue), rows in other.rows.items():
+            if row_offset:
+                rows = [row + row_offset for row in rows]
+            self.add_rows(field, issue, rows, [value for _, value in other.examples[(field, issue)]])
+
+    def total(self):
+        return sum(len(rows) for rows in self.rows.values())
+
+    def __len__(self):
+        return self.total()
+
+    def summary_df(self):
+        """One row per (field, issue) with its count and example rows."""
+        records = [
+            {
+                "System": self.system_name,
+                "Field": field,
+                "Issue": issue,
+                "Count": len(rows),
+                "Example Rows": ", ".join(str(row) for row, _ in self.examples[(field, issue)]),
+                "Example Values": ", ".join(repr(value) for _, value in self.examples[(field, issue)]),
+            }
+            for (field, issue), rows in self.rows.items()
+        ]
+        columns = ["System", "Field", "Issue", "Count", "Example Rows", "Example Values"]
+        return pd.DataFrame(records, columns=columns).sort_values("Count", ascending=False, kind="stable")
+
+    def write_csv(self, path):
+        """Stream the detailed per-row issues CSV to disk; returns the number of rows written."""
+        count = 0
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(DETAIL_COLUMNS)
+            for (field, issue), rows in sorted(self.rows.items()):
+                for row in rows:
+                    writer.writerow([self.system_name, row, field, issue])
+                    count += 1
+        self.detail_path = path
+        return count
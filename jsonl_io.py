@@ -0,0 +1,135 @@
+"""
+JSON Lines (NDJSON) input and output, plain or gzip/xz compressed.
+
+Plain .jsonl files can be split into byte ranges that start and end at line
+boundaries (`split_ranges`), so several worker processes can each read and
+parse their own range (`read_range`) without the parent touching the records.
+Compressed files (.gz, .xz) cannot be split and are read and written as
+streams. Files are recognised by extension: .jsonl / .ndjson, optionally
+followed by .gz or .xz.
+"""
+import gzip
+import json
+import lzma
+import os
+
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+COMPRESSIONS = {".gz": gzip.open, ".xz": lzma.open}
+SAMPLE_BYTES = 1 << 20          # read to estimate the average line length
+READ_CHUNK_SIZE = 1 << 20       # read at a time when streaming a JSON array
+GZIP_LEVEL = 6
+
+
+def _split_compression(path):
+    base, ext = os.path.splitext(path)
+    return (base, ext) if ext in COMPRESSIONS else (path, None)
+
+
+def is_jsonl(path):
+    base, _ = _split_compression(path)
+    return base.endswith(JSONL_EXTENSIONS)
+
+
+def is_compressed(path):
+    return _split_compression(path)[1] is not None
+
+
+def open_text(path, mode="r"):
+    """Open a plain, .gz or .xz file as a UTF-8 text stream ("r" or "w")."""
+    _, compression = _split_compression(path)
+    if compression is None:
+        return open(path, mode, encoding="utf-8", newline="" if "w" in mode else None)
+    kwargs = {"compresslevel": GZIP_LEVEL} if compression == ".gz" and "w" in mode else {}
+    return COMPRESSIONS[compression](path, mode + "t", encoding="utf-8", **kwargs)
+
+
+def _parse_line(line, path, location):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path}: invalid JSON at {location}: {e.msg}") from None
+
+
+def iter_jsonl(path):
+    """Yield the records of a JSON Lines file (plain or compressed) one at a time; blank lines are skipped."""
+    with open_text(path) as f:
+        for number, line in enumerate(f, start=1):
+            if line.strip():
+                yield _parse_line(line, path, f"line {number}")
+
+
+def iter_json_array(path, chunk_size=READ_CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array one at a time, without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open_text(path) as f:
+        buf = ""
+        pos = 0
+        eof = False
+        started = False
+        while True:
+            # Skip whitespace, the opening bracket and separators
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == "," or (buf[pos] == "[" and not started)):
+                started = started or buf[pos] == "["
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            if pos < len(buf):
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                    # A value ending exactly at the buffer end may be cut short (e.g. a number)
+                    if end < len(buf) or eof:
+                        yield item
+                        pos = end
+                        continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            elif eof:
+                if not started:
+                    raise ValueError(f"{path} does not contain a JSON array")
+                raise ValueError(f"{path}: unexpected end of JSON array")
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
+def average_line_bytes(path, sample_bytes=SAMPLE_BYTES):
+    """Average line length over the start of a plain file (at least 1)."""
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    return max(1, len(sample) // max(1, sample.count(b"\n")))
+
+
+def split_ranges(path, target_bytes):
+    """
+    Yield (start, end) byte ranges of a plain JSON Lines file, about `target_bytes`
+    long, each ending just after a newline (or at the end of the file).
+    """
+    size = os.path.getsize(path)
+    start = 0
+    with open(path, "rb") as f:
+        while start < size:
+            end = start + max(1, int(target_bytes))
+            if end < size:
+                f.seek(end - 1)
+                f.readline()
+                end = f.tell()
+            else:
+                end = size
+            yield start, end
+            start = end
+
+
+def read_range(path, start, end):
+    """The records of the lines in byte range [start, end) of a plain JSON Lines file."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    records = []
+    offset = start
+    for line in data.split(b"\n"):
+        if line.strip():
+            records.append(_parse_line(line, path, f"byte {offset}"))
+        offset += len(line) + 1
+    return records
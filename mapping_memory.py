@@ -0,0 +1,119 @@
+"""
+Learned mapping memory.
+
+Every approve/reject decision made in the review is remembered per normalized
+source field name (`Cust-ID`, `cust_id` and `cust id` are the same entry) in a
+local JSON store shared across projects. Approved targets also learn the
+MinHash value signature of the source columns mapped to them, so a renamed
+column can still be recognised by its values. `match_fields` consults the
+memory before any embedding or Pinecone call, and targets a field was mostly
+rejected for are suppressed as candidates.
+"""
+import json
+import os
+import re
+import threading
+
+import value_matching
+
+DEFAULT_MEMORY_PATH = os.path.join("output", "mapping_memory.json")
+MEMORY_VERSION = 1
+VALUE_MATCH_THRESHOLD = 0.7   # Jaccard of a source column with a learned target signature
+
+
+def normalize_field_name(name):
+    return re.sub(r"[\s_\-.]+", " ", str(name).lower()).strip()
+
+
+class MappingMemory:
+    """Approve/reject counts per (normalized source field, target field) plus learned target value signatures."""
+
+    def __init__(self, path=DEFAULT_MEMORY_PATH):
+        self.path = path
+        self.fields = {}
+        self.targets = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.fields = data.get("fields", {})
+            self.targets = data.get("targets", {})
+
+    def counts(self, source_field, target_field):
+        """(approvals, rejections) recorded for a source/target pair."""
+        entry = self.fields.get(normalize_field_name(source_field), {})
+        return entry.get("approved", {}).get(target_field, 0), entry.get("rejected", {}).get(target_field, 0)
+
+    def is_rejected(self, source_field, target_field):
+        approved, rejected = self.counts(source_field, target_field)
+        return rejected > approved
+
+    def record(self, source_field, target_field, decision, signature=None):
+        """Remember one review decision; approvals also teach the target the source column's value signature."""
+        key = "approved" if decision == "Approve" else "rejected"
+        with self._lock:
+            entry = self.fields.setdefault(normalize_field_name(source_field), {"approved": {}, "rejected": {}})
+            entry[key][target_field] = entry[key].get(target_field, 0) + 1
+            if key == "approved" and signature is not None and not signature.is_empty():
+                learned = self.targets.get(target_field)
+                if learned is not None and len(learned) == signature.num_perm:
+                    signature = signature.merge(value_matching.MinHash(len(learned), learned))
+                self.targets[target_field] = signature.to_list()
+
+    def best_source(self, target_field, source_fields, source_signatures=None):
+        """
+        Source field to map to `target_field` from past decisions: (source, confidence, method)
+        or (None, 0.0, None). Name matches come first; value signatures are the fallback.
+        """
+        best = (None, 0.0, None)
+        best_votes = 0
+        for src in source_fields:
+            approved, rejected = self.counts(src, target_field)
+            if approved > rejected and approved > best_votes:
+                best = (src, approved / (approved + rejected), "Memory")
+                best_votes = approved
+        if best[0] or not source_signatures or target_field not in self.targets:
+            return best
+        learned = value_matching.MinHash(len(self.targets[target_field]), self.targets[target_field])
+        for src in source_fields:
+            signature = source_signatures.get(src)
+            if signature is None or signature.num_perm != learned.num_perm:
+                continue
+            approved, rejected = self.counts(src, target_field)
+            if rejected and rejected >= approved:
+                # Contested by reviewers: values alone are not enough
+                continue
+            overlap = signature.jaccard(learned)
+            if overlap >= VALUE_MATCH_THRESHOLD and overlap > best[1]:
+                best = (src, overlap, "Memory (Values)")
+        return best
+
+    def save(self):
+        """Write the memory atomically."""
+        with self._lock:
+            data = {"version": MEMORY_VERSION, "fields": self.fields, "targets": self.targets}
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.fields)
+
+
+def record_decisions(memory, matches, decisions, profile=None, reviewed=None):
+    """
+    Record the review decisions of a set of suggestions, e.g. when the output is
+    generated. With `reviewed`, only the decisions for those target fields (the
+    ones the reviewer changed or confirmed) are learned; untouched UI defaults
+    would otherwise teach the memory rejections nobody made.
+    """
+    signatures = value_matching.profile_signatures(profile) if profile else {}
+    for m in matches:
+        if reviewed is not None and m["Target Field"] not in reviewed:
+            continue
+        decision = decisions.get(m["Target Field"])
+        if decision and m["Source Field"] not in (None, 'No Match'):
+            memory.record(m["Source Field"], m["Target Field"], decision, signatures.get(m["Source Field"]))
+    memory.save()
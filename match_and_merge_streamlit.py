@@ -1,304 +1,177 @@
 import streamlit as st
 import os
-import json
 import pandas as pd
-import io
-from dotenv import load_dotenv
-from pinecone import Pinecone
-from openai import OpenAI
-import difflib
 import re
 from datetime import datetime
+import api_clients
 import data_transformation
+import transform_primitives
+import data_profiling
+import field_paths
+import audit_journal
+import migration_plan
+import mapping_memory
+import transform_memo
+from migration_engine import (
+    load_target_schema, load_source, validate_data, match_fields, default_decisions,
+    merge_table, unmatched_source, deduplicate_output, write_outputs, read_output_page,
+)
+from issue_store import IssueStore
+from quarantine import DEAD_LETTER_FILE, TransformQuarantine
+from transform_pool import TransformWorkerPool
 import logging
+import uuid
 
 logging.basicConfig(level=logging.DEBUG)
 
 # Load target schema fields for output structure (move to top)
-with open("schemas/target_schema.json") as f:
-    target_schema = json.load(f)
-target_fields = [f["name"] for f in target_schema["fields"]]
-target_defaults = {f["name"]: f.get("default_value") for f in target_schema["fields"]}
-
-# === Init API Clients ===
-load_dotenv()
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index(os.getenv("PINECONE_INDEX_NAME"))
-openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# === Constants ===
-SIMILARITY_THRESHOLD = 0.7
-TOP_K = 3
-
-# === Manual Mapping and Synonyms ===
-manual_mapping = {
-    'cust_id': 'customer_id',
-    'full_name': 'name',
-    'contact_email': 'email',
-    'signup_date': 'registration_date',
-    'mobile_number': 'phone',
-    'shipping_address': 'billing_address',
-    'rewards_earned': 'loyalty_points',
-    'dob': 'date_of_birth',
-    'first_name': 'first_name',
-    'last_name': 'last_name',
-    'address': 'address',
-    'age': 'age',
-    'preferences': 'preferences',
-    'subscription_tier': 'subscription_tier',
-    'last_login': 'last_login',
-    'account_balance': 'account_balance',
-    'payment_methods': 'payment_methods',
-    'notes': 'notes',
-}
-synonym_dict = {
-    'customer_id': ['cust_id', 'customerid', 'customer id', 'client_id', 'clientid'],
-    'cust_id': ['customer_id', 'customerid', 'customer id', 'client_id', 'clientid'],
-    'name': ['full_name', 'fullname', 'full name', 'contact_name', 'person_name'],
-    'full_name': ['name', 'fullname', 'full name', 'contact_name', 'person_name'],
-    'email': ['contact_email', 'email_address', 'mail', 'emailid'],
-    'contact_email': ['email', 'email_address', 'mail', 'emailid'],
-    'registration_date': ['signup_date', 'registrationdate', 'registration date', 'join_date', 'created_at'],
-    'signup_date': ['registration_date', 'registrationdate', 'registration date', 'join_date', 'created_at'],
-    'phone': ['mobile_number', 'telephone', 'mobile', 'cell', 'contact_number'],
-    'mobile_number': ['phone', 'telephone', 'mobile', 'cell', 'contact_number'],
-    'billing_address': ['shipping_address', 'address', 'location', 'addr', 'home_address'],
-    'shipping_address': ['billing_address', 'address', 'location', 'addr', 'home_address'],
-    'loyalty_points': ['rewards_earned', 'points', 'reward points'],
-    'rewards_earned': ['loyalty_points', 'points', 'reward points'],
-    'subscription_type': ['membership_status', 'subscription', 'membership'],
-    'membership_status': ['subscription_type', 'subscription', 'membership'],
-    'preferred_language': ['preferred_contact_method', 'language', 'contact_method'],
-    'preferred_contact_method': ['preferred_language', 'language', 'contact_method'],
-    'date_of_birth': ['dob', 'dateofbirth', 'date of birth'],
-    'dob': ['date_of_birth', 'dateofbirth', 'date of birth'],
-    'first_name': ['firstname', 'first name'],
-    'last_name': ['lastname', 'last name'],
-    'address': ['shipping_address', 'billing_address', 'location', 'addr', 'home_address'],
-    'age': ['years', 'years_old'],
-    'preferences': ['preference', 'likes', 'interests'],
-    'subscription_tier': ['subscription', 'tier', 'plan'],
-    'last_login': ['lastlogin', 'last login', 'recent_login'],
-    'account_balance': ['balance', 'accountbalance', 'funds'],
-    'payment_methods': ['payment', 'methods', 'paymentmethod'],
-    'notes': ['note', 'comments', 'remarks'],
-}
-strict_types = {'date', 'phone', 'id', 'email', 'amount', 'number'}
-common_patterns = {
-    'email': r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$',
-    'phone': r'^\+?1?\d{9,15}$',
-    'date': r'^\d{1,2}[/-]\d{1,2}[/-]\d{2,4}$',
-    'id': r'^[A-Z0-9]{3,}$',
-    'amount': r'^\$?\d+(\.\d{2})?$'
-}
-
-def get_data_type(value):
-    if re.match(common_patterns['email'], str(value)):
-        return 'email'
-    elif re.match(common_patterns['phone'], str(value)):
-        return 'phone'
-    elif re.match(common_patterns['date'], str(value)):
-        return 'date'
-    elif re.match(common_patterns['id'], str(value)):
-        return 'id'
-    elif re.match(common_patterns['amount'], str(value)):
-        return 'amount'
-    elif str(value).isdigit():
-        return 'number'
-    else:
-        return 'text'
-
-def are_synonyms(field_a, field_b):
-    field_a = field_a.lower().replace('_', ' ').replace('-', ' ')
-    field_b = field_b.lower().replace('_', ' ').replace('-', ' ')
-    for key, synonyms in synonym_dict.items():
-        if field_a == key or field_a in synonyms:
-            if field_b == key or field_b in synonyms:
-                return True
-    return False
-
-def compute_field_similarity(field_a, field_b):
-    field_a_norm = field_a.lower().replace('_', ' ').replace('-', ' ')
-    field_b_norm = field_b.lower().replace('_', ' ').replace('-', ' ')
-    if are_synonyms(field_a, field_b):
-        return 1.0
-    if field_a_norm == field_b_norm:
-        return 1.0
-    return difflib.SequenceMatcher(None, field_a_norm, field_b_norm).ratio()
-
-def validate_data(data, fields, types, system_name):
-    issues = []
-    for i, row in enumerate(data):
-        for field in fields:
-            value = row.get(field, None)
-            if value is None or value == '':
-                issues.append({
-                    "System": system_name,
-                    "Row": i+1,
-                    "Field": field,
-                    "Issue": f"Missing value for '{field}'"
-                })
-            else:
-                expected_type = types[field]
-                actual_type = get_data_type(value)
-                if expected_type != actual_type:
-                    issues.append({
-                        "System": system_name,
-                        "Row": i+1,
-                        "Field": field,
-                        "Issue": f"Type mismatch in '{field}' (expected {expected_type}, got {actual_type})"
-                    })
-    return issues
-
-def match_fields(source_data, target_fields):
-    source_fields = list(source_data[0].keys())
-    print(f"DEBUG: source_fields = {source_fields}")
-    print(f"DEBUG: target_fields = {target_fields}")
-    samples_source = {key: str(source_data[0][key]) for key in source_fields}
-    types_source = {key: get_data_type(samples_source[key]) for key in source_fields}
-    results = []
-    matched_target = set()
-    audit_log = []
-    for target_field in target_fields:
-        # Explicit fix: always match date_of_birth with dob if present
-        if target_field == "date_of_birth" and "dob" in source_fields:
-            print("DEBUG: Explicitly matching date_of_birth with dob")
-            source_field = "dob"
-            best_score = 1.0
-            status = "✅ Strong Match (Manual)"
-            method = "Manual"
-            matched_target.add(target_field)
-            results.append({
-                "Target Field": target_field,
-                "Source Field": source_field,
-                "Source Sample": samples_source[source_field],
-                "Status": status
-            })
-            audit_log.append({
-                "timestamp": datetime.now().isoformat(),
-                "Target Field": target_field,
-                "Source Field": source_field,
-                "Mapping Method": method,
-                "AI Score": '-',
-                "Status": status,
-                "User Decision": None
-            })
-            continue
-        # Manual mapping override
-        source_field = None
-        best_score = -1
-        status = ""
-        method = ""
-        if target_field in manual_mapping.values():
-            # Find the source field that maps to this target field
-            for k, v in manual_mapping.items():
-                if v == target_field and k in source_fields:
-                    source_field = k
-                    best_score = 1.0
-                    status = "✅ Strong Match (Manual)"
-                    method = "Manual"
-                    matched_target.add(target_field)
-                    break
-        if not source_field:
-            # Pinecone candidate search: query using the target field name
-            query = f"{target_field}"
-            if len(target_field) <= 3:
-                query += " (date of birth)"
-            vector = openai.embeddings.create(input=[query], model="text-embedding-3-small").data[0].embedding
-            result = index.query(vector=vector, top_k=TOP_K, include_metadata=True, filter=None)
-            best_score = -1
-            best_match = None
-            method = "AI"
-            for match in result["matches"]:
-                candidate_field = match["metadata"]["field_name"]
-                for src in source_fields:
-                    field_sim = compute_field_similarity(src, candidate_field)
-                    score = 0.7 * field_sim + 0.3 * match["score"]
-                    if score > best_score:
-                        best_score = score
-                        source_field = src
-                        best_match = candidate_field
-            if best_score < SIMILARITY_THRESHOLD or not source_field:
-                source_field = 'No Match'
-                status = "❌ No Match"
-            else:
-                status = (
-                    "✅ Strong Match" if best_score >= 0.85 else
-                    "🟡 Moderate Match" if best_score >= 0.7 else
-                    "❌ Weak/Incorrect"
-                )
-                matched_target.add(target_field)
-        results.append({
-            "Target Field": target_field,
-            "Source Field": source_field,
-            "Source Sample": samples_source[source_field] if source_field in samples_source else '-',
-            "Status": status
-        })
-        audit_log.append({
-            "timestamp": datetime.now().isoformat(),
-            "Target Field": target_field,
-            "Source Field": source_field,
-            "Mapping Method": method,
-            "AI Score": best_score if method == "AI" else '-',
-            "Status": status,
-            "User Decision": None
-        })
-    print("DEBUG: Final mapping results:", results)
-    return results, audit_log, types_source
+target_schema, target_fields, target_defaults, target_field_schemas = load_target_schema("schemas/target_schema.json")
 
-# === Load Sample Data ===
-def load_json(path):
-    with open(path, "r") as f:
-        return json.load(f)
+SOURCE_DATA_PATH = "system_a_data.json"
+OUTPUT_DIR = "output"
+MIGRATION_PLAN_PATH = os.path.join(OUTPUT_DIR, "migration_plan.json")
 
-data_a = load_json("system_a_data.json")
-# Remove System B loading and indexing
-# sample_b = data_b[0]
-# b_index = {r.get("contact_email", r.get("email", "")).lower(): r for r in data_b}
+def saved_source_join():
+    """
+    Source consolidation of the saved migration plan (additional systems joined with
+    System A on a normalized key, e.g. set with `migrate.py --merge-source`), if any.
+    """
+    if not os.path.exists(MIGRATION_PLAN_PATH):
+        return None
+    return migration_plan.load_plan(MIGRATION_PLAN_PATH).get("join")
+
+SOURCE_JOIN = saved_source_join()
+data_a, source_profile = load_source(SOURCE_DATA_PATH, SOURCE_JOIN)
 
 # === Ensure output directory exists ===
-OUTPUT_DIR = "output"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# === Append-only audit journal (shared across reruns and sessions) ===
+AUDIT_JOURNAL_PATH = os.path.join(OUTPUT_DIR, "audit_log.jsonl")
+
+@st.cache_resource
+def get_audit_journal():
+    return audit_journal.AuditJournal(AUDIT_JOURNAL_PATH)
+
+# === Learned mapping memory (shared across reruns and sessions) ===
+@st.cache_resource
+def get_mapping_memory():
+    return mapping_memory.MappingMemory(mapping_memory.DEFAULT_MEMORY_PATH)
+
+# === Sandboxed transformation workers (shared across reruns and sessions) ===
+@st.cache_resource
+def get_transform_pool():
+    return TransformWorkerPool()
+
+# === File-backed downloads: the file is only read when the button is clicked ===
+PREVIEW_PAGE_SIZE = 20
+
+def file_download_button(label, path, file_name, mime):
+    def read_file():
+        with open(path, "rb") as f:
+            return f.read()
+    st.download_button(label, data=read_file, file_name=file_name, mime=mime)
+
 # === Streamlit UI ===
 st.title("AI Enabled Data Migration Template")
 st.markdown("""
 **Instructions:**
-- Click **'Run Pre-Migration Data Validation'** to check for missing values and type mismatches in your data. Download the CSV report for details.
+- Click **'Run Pre-Migration Data Validation'** to check for missing values and type mismatches in your data. Review the per-field summary, and write the detailed CSV report if you need per-row details.
 - Click **'🔍 Match Fields'** to generate AI-powered field mapping suggestions between your two systems. All fields from both systems will be shown, including unmatched ones.
 - Review and approve or reject each suggested mapping. Then click **'✅ Generate Final Output'** to merge and save the normalized data to the project folder and download.
 """)
 
 # === Section 1: Pre-Migration Validation ===
 st.header("1. Pre-Migration Data Validation")
+def show_issue_report(issues, label, csv_name):
+    """Summary of an IssueStore; the detailed per-row CSV is only written when requested."""
+    count = issues.total()
+    if count == 0:
+        st.success(f"No {label} data validation issues detected.")
+        return
+    st.warning(f"{count} {label} data validation issues found in {len(issues.rows)} field/issue groups. Write the detailed CSV report for per-row details.")
+    summary_df = issues.summary_df()
+    st.dataframe(summary_df)
+    st.download_button(f"⬇️ Download {label.title()} Issues Summary CSV", data=summary_df.to_csv(index=False), file_name=csv_name.replace(".csv", "_summary.csv"), mime="text/csv")
+    if st.button(f"📝 Write Detailed {label.title()} Issues CSV", key=f"write_{csv_name}"):
+        issues.write_csv(os.path.join(OUTPUT_DIR, csv_name))
+    if issues.detail_path:
+        with open(issues.detail_path, "rb") as f:
+            st.download_button(f"⬇️ Download {label.title()} Issues CSV", data=f, file_name=csv_name, mime="text/csv")
+
 if st.button("Run Pre-Migration Data Validation"):
-    fields_a = list(data_a[0].keys())
-    samples_a = {key: str(data_a[0][key]) for key in fields_a}
-    types_a = {key: get_data_type(samples_a[key]) for key in fields_a}
-    pre_issues_a = validate_data(data_a, fields_a, types_a, 'System A')
-    all_issues = pre_issues_a
-    if all_issues:
-        issues_df = pd.DataFrame(all_issues)
-        issues_df.to_csv(os.path.join(OUTPUT_DIR, "pre_migration_issues.csv"), index=False)
-        st.session_state["pre_issues"] = (len(all_issues), issues_df)
-    else:
-        st.session_state["pre_issues"] = (0, None)
+    fields_a = source_profile["fields"]
+    types_a = data_profiling.column_types(source_profile)
+    st.session_state["pre_issues"] = validate_data(data_a, fields_a, types_a, 'System A')
 
 if "pre_issues" in st.session_state:
     with st.expander("Pre-Migration Validation Results", expanded=True):
-        count, issues_df = st.session_state["pre_issues"]
-        if count > 0:
-            st.warning(f"{count} pre-migration data validation issues found. Download the CSV report for details.")
-            st.download_button("⬇️ Download Pre-Migration Issues CSV", data=issues_df.to_csv(index=False), file_name="pre_migration_issues.csv", mime="text/csv")
-        else:
-            st.success("No pre-migration data validation issues detected.")
+        show_issue_report(st.session_state["pre_issues"], "pre-migration", "pre_migration_issues.csv")
 
 # === Section 2: Field Matching ===
 st.header("2. Field Mapping Suggestions & Review")
-if st.button("🔍 Match Fields"):
-    matches, audit_log, types_a = match_fields(data_a, target_fields)
+REVIEW_WIDGET_PREFIXES = ("match_", "mode_", "param_", "code_", "use_", "insert_template_")
+
+def start_review(matches, audit_log, from_plan=False):
     st.session_state["matches"] = matches
-    st.session_state["audit_log"] = audit_log
+    st.session_state["audit_session"] = uuid.uuid4().hex
+    st.session_state["decisions"] = {}
+    # Only decisions the reviewer changed or confirmed teach the mapping memory; a
+    # plan's decisions were learned when it was reviewed
+    st.session_state["initial_decisions"] = {
+        **default_decisions(matches), **{m["Target Field"]: m["decision"] for m in matches if "decision" in m}
+    }
+    st.session_state["reviewed"] = set()
+    st.session_state["review_from_plan"] = from_plan
+    # Each suggestion is one event in the append-only audit journal
+    journal = get_audit_journal()
+    for entry in audit_log:
+        journal.append({"event": "suggestion", "session": st.session_state["audit_session"], **entry})
+
+def load_migration_plan(plan):
+    """Restore a saved plan's mappings, decisions and transformations; no matching or AI suggestions needed."""
+    if migration_plan.schema_changed(plan, target_schema):
+        st.warning("⚠️ The target schema changed since this plan was saved. Review the mappings before merging.")
+    # Widgets of a previous review would otherwise keep their old values
+    for key in [k for k in st.session_state if k.startswith(REVIEW_WIDGET_PREFIXES)]:
+        del st.session_state[key]
+    matches = [dict(m, decision=plan["decisions"].get(m["Target Field"], "Reject")) for m in plan["matches"]]
+    audit_log = [
+        {
+            "Target Field": m["Target Field"],
+            "Source Field": m["Source Field"],
+            "Mapping Method": "Saved Plan",
+            "AI Score": '-',
+            "Status": m["Status"],
+            "User Decision": None
+        }
+        for m in matches
+    ]
+    start_review(matches, audit_log, from_plan=True)
+    transformations = {}
+    # Approved fields without a saved transformation stay untransformed instead of asking for a suggestion
+    for field in plan["mappings"]:
+        info = plan["transformations"].get(field, {"use_transform": False, "primitive": None})
+        entry = dict(info, planned=True)
+        entry.setdefault("description", "Loaded from saved migration plan")
+        entry.setdefault("code", entry.get("user_code"))
+        transformations[field] = entry
+    st.session_state["transformations"] = transformations
+    compiled = migration_plan.compile_plan(plan, target_fields, target_defaults, pool=get_transform_pool())
+    for field, error in compiled.errors.items():
+        st.warning(f"⚠️ Transformation for `{field}` from the plan is invalid: {error}")
+    st.success(f"📂 Loaded migration plan with {len(compiled.mappings)} mappings and {len(compiled.transformations)} transformations.")
+
+if os.path.exists(MIGRATION_PLAN_PATH) and st.button("📂 Load Saved Migration Plan"):
+    load_migration_plan(migration_plan.load_plan(MIGRATION_PLAN_PATH))
+
+if st.button("🔍 Match Fields"):
+    try:
+        matches, audit_log, types_a = match_fields(data_a, target_fields, profile=source_profile, memory=get_mapping_memory())
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        st.stop()
+    start_review(matches, audit_log)
 
 if "matches" in st.session_state:
     with st.expander("Field Mapping Suggestions & Review", expanded=True):
@@ -308,22 +181,56 @@ if "matches" in st.session_state:
         )
         # Only show mappings for real target fields (not 'No Match')
         filtered_matches = [m for m in st.session_state["matches"] if m["Target Field"] != 'No Match']
+        api_usage = api_clients.get_clients().summary()
+        if api_usage:
+            st.caption("🌐 API usage (shared by all sessions): " + "; ".join(api_usage))
         for i, m in enumerate(filtered_matches):
             col1, col2, col3 = st.columns([3, 3, 2])
             col1.markdown(f"**Target Field:** `{m['Target Field']}`")
             col2.markdown(f"**Matched in Source:** `{m['Source Field']}`")
-            decision = col3.radio("Decision", ["Approve", "Reject"], key=f"match_{i}", index=0 if m["Status"].startswith("✅") else 1)
+            initial = st.session_state["initial_decisions"].get(m["Target Field"])
+            decision = col3.radio("Decision", ["Approve", "Reject"], key=f"match_{i}", index=0 if initial == "Approve" else 1)
             m["decision"] = decision
-            # Update audit log with user decision
-            st.session_state["audit_log"][i]["User Decision"] = decision
-        st.download_button("⬇️ Download Audit Log", data=pd.DataFrame(st.session_state["audit_log"]).to_csv(index=False), file_name="audit_log.csv", mime="text/csv")
+            if decision != initial:
+                st.session_state["reviewed"].add(m["Target Field"])
+            # Journal the user decision only when it changes
+            if st.session_state["decisions"].get(m["Target Field"]) != decision:
+                st.session_state["decisions"][m["Target Field"]] = decision
+                get_audit_journal().append({
+                    "event": "decision",
+                    "session": st.session_state["audit_session"],
+                    "Target Field": m["Target Field"],
+                    "Source Field": m["Source Field"],
+                    "User Decision": decision
+                })
+        if st.button("✔️ Confirm All Decisions", help="Also teach the mapping memory the decisions left at their defaults"):
+            st.session_state["reviewed"].update(m["Target Field"] for m in filtered_matches)
+        # The CSV view is compacted from the journal on demand
+        audit_csv_path = os.path.join(OUTPUT_DIR, "audit_log.csv")
+        if st.button("📋 Prepare Audit Log CSV"):
+            get_audit_journal().flush()
+            audit_journal.compact_audit_log(AUDIT_JOURNAL_PATH, csv_path=audit_csv_path, session=st.session_state["audit_session"])
+            st.session_state["audit_csv_session"] = st.session_state["audit_session"]
+        if st.session_state.get("audit_csv_session") == st.session_state["audit_session"]:
+            with open(audit_csv_path, "rb") as f:
+                st.download_button("⬇️ Download Audit Log", data=f, file_name="audit_log.csv", mime="text/csv")
 
 # === Section 2.5: Transformation Suggestions & Review ===
-def get_sample_value(field, data):
-    for row in data:
-        if field in row and row[field]:
-            return row[field]
-    return ""
+SAMPLE_ROWS = 200
+
+def get_source_samples(field):
+    """
+    Example values of a source field: from the profile, or for nested paths (and fields
+    a loaded plan names but the source lacks) read from the first rows. [] if none.
+    """
+    column = source_profile["columns"].get(field)
+    if column:
+        return [value for value in column["samples"] if value not in (None, "")]
+    try:
+        values = field_paths.extract_column(data_a[:SAMPLE_ROWS], field)
+    except ValueError:
+        return []
+    return [value for value in values if value not in (None, "")]
 
 def get_target_sample_value(field, target_schema):
     for f in target_schema["fields"]:
@@ -357,18 +264,57 @@ if "matches" in st.session_state:
         for m in approved_matches:
             src_field = m["Source Field"]
             tgt_field = m["Target Field"]
-            src_sample = get_sample_value(src_field, data_a)
+            src_samples = get_source_samples(src_field)
+            src_sample = src_samples[0] if src_samples else ""
             tgt_sample = get_target_sample_value(tgt_field, target_schema)
-            # Only get suggestion if not already present
-            if tgt_field not in st.session_state["transformations"]:
-                with st.spinner(f"Getting transformation suggestion for {src_field} → {tgt_field}..."):
-                    suggestion = data_transformation.get_transformation_suggestion(src_field, tgt_field, src_sample, tgt_sample)
-                st.session_state["transformations"][tgt_field] = suggestion
-            else:
-                suggestion = st.session_state["transformations"][tgt_field]
             st.markdown(f"**{src_field} → {tgt_field}**")
             st.markdown(f"Sample Source Value: `{src_sample}`")
             st.markdown(f"Sample Target Value: `{tgt_sample}`")
+            transform_entry = st.session_state["transformations"].setdefault(tgt_field, {})
+            # Entries restored from a saved plan seed the widget defaults once
+            planned = transform_entry.pop("planned", False)
+
+            # Built-in vectorized primitives are offered first; custom code is the fallback
+            field_schema = target_field_schemas.get(tgt_field)
+            suggested = transform_primitives.suggest_primitive(field_schema, src_samples)
+            mode_options = ["Custom code"] + [p["label"] for p in transform_primitives.PRIMITIVES.values()]
+            primitive_names = {p["label"]: name for name, p in transform_primitives.PRIMITIVES.items()}
+            default_mode = transform_primitives.primitive_label(suggested) or "Custom code"
+            if planned:
+                default_mode = transform_primitives.primitive_label(transform_entry.get("primitive")) or "Custom code"
+            mode = st.selectbox(
+                f"Transformation type for `{tgt_field}`",
+                mode_options,
+                index=mode_options.index(default_mode),
+                key=f"mode_{tgt_field}"
+            )
+            if mode != "Custom code":
+                name = primitive_names[mode]
+                default_params = dict(transform_primitives.PRIMITIVES[name]["params"])
+                if suggested and suggested["name"] == name:
+                    default_params.update(suggested["params"])
+                if planned and transform_entry.get("primitive") and transform_entry["primitive"]["name"] == name:
+                    default_params.update(transform_entry["primitive"]["params"])
+                params = {
+                    p: st.text_input(f"{p} for `{tgt_field}`", value=str(v), key=f"param_{tgt_field}_{p}")
+                    for p, v in default_params.items()
+                }
+                spec = {"name": name, "params": params}
+                use_transform = st.checkbox(f"Apply transformation for `{tgt_field}`?", value=transform_entry.get("use_transform", True) if planned else True, key=f"use_{tgt_field}")
+                transform_entry["primitive"] = spec
+                transform_entry["use_transform"] = use_transform
+                if use_transform:
+                    preview = data_transformation.transform_column([src_sample], transform_entry)[0]
+                    st.markdown(f"**Preview transformed value:** `{preview}`")
+                st.markdown("---")
+                continue
+            transform_entry["primitive"] = None
+
+            # Only get suggestion if not already present
+            if "description" not in transform_entry:
+                with st.spinner(f"Getting transformation suggestion for {src_field} → {tgt_field}..."):
+                    transform_entry.update(data_transformation.get_transformation_suggestion(src_field, tgt_field, src_sample, tgt_sample))
+            suggestion = transform_entry
             st.markdown(f"**AI Suggestion:** {suggestion['description']}")
             # Clean up AI suggestion code (remove markdown/code block formatting)
             def clean_code_block(code):
@@ -403,10 +349,12 @@ if "matches" in st.session_state:
             template_flag_key = f"insert_template_{tgt_field}"
             if st.button(f"Insert function template for `{tgt_field}`", key=f"template_{tgt_field}"):
                 st.session_state[template_flag_key] = True
-                st.experimental_rerun()
+                st.rerun()
 
             # Set the default value for the text area
             default_code = clean_code_block(suggestion['code'])
+            if planned and transform_entry.get("user_code"):
+                default_code = transform_entry["user_code"]
             # If the field is a date and no valid transform is present, provide a default date transformation
             for f in target_schema["fields"]:
                 if f["name"] == tgt_field and f.get("data_type") == "date":
@@ -424,7 +372,8 @@ if "matches" in st.session_state:
                 value=default_code,
                 key=f"code_{tgt_field}"
             )
-            use_transform = st.checkbox(f"Apply transformation for `{tgt_field}`?", value=bool(code and code.lower() != 'none'), key=f"use_{tgt_field}")
+            default_use = transform_entry.get("use_transform", False) if planned else bool(code and code.lower() != 'none')
+            use_transform = st.checkbox(f"Apply transformation for `{tgt_field}`?", value=default_use, key=f"use_{tgt_field}")
             # Save user-edited code and choice
             st.session_state["transformations"][tgt_field]["user_code"] = code
             st.session_state["transformations"][tgt_field]["use_transform"] = use_transform
@@ -432,98 +381,130 @@ if "matches" in st.session_state:
                 if not data_transformation.is_valid_transform_code(code):
                     st.warning("⚠️ The transformation code must define a function 'transform(x)'. Please edit the code.")
                 else:
-                    # Show preview
-                    try:
-                        preview = data_transformation.safe_apply_transformation(src_sample, code)
-                    except Exception as e:
-                        preview = f"[Error: {e}]"
+                    # Show preview (runs in the sandboxed worker pool)
+                    ok, preview = get_transform_pool().map(code, [src_sample])[0]
+                    if not ok:
+                        preview = f"[Error: {preview}]"
                     st.markdown(f"**Preview transformed value:** `{preview}`")
             st.markdown("---")
 
+    # Save the reviewed mappings and transformations so the next run can skip matching and AI suggestions
+    if st.button("💾 Save Migration Plan"):
+        decisions = {m["Target Field"]: m["decision"] for m in st.session_state["matches"] if "decision" in m}
+        plan = migration_plan.build_plan(
+            st.session_state["matches"], decisions, st.session_state.get("transformations", {}), target_schema,
+            source=SOURCE_DATA_PATH, join=SOURCE_JOIN,
+        )
+        migration_plan.save_plan(plan, MIGRATION_PLAN_PATH)
+        st.success(f"💾 Migration plan saved to {MIGRATION_PLAN_PATH}")
+    if os.path.exists(MIGRATION_PLAN_PATH):
+        with open(MIGRATION_PLAN_PATH, "rb") as f:
+            st.download_button("⬇️ Download Migration Plan", data=f, file_name="migration_plan.json", mime="application/json")
+
 # === Section 3: Merging & Output ===
 st.header("3. Merging, Validation & Output Preview")
+dedupe_output = st.checkbox("Deduplicate merged records (fuzzy match on name, email and phone)", value=False, key="dedupe_output")
 if st.button("✅ Generate Final Output"):
     valid_matches = [m for m in st.session_state["matches"] if "decision" in m]
     approved = {m["Target Field"]: m["Source Field"] for m in valid_matches if m["decision"] == "Approve" and m["Source Field"] != 'No Match'}
     rejected_a = {m["Source Field"] for m in valid_matches if m["decision"] == "Reject" and m["Source Field"] != "No Match"}
 
-    fields_a = set(data_a[0].keys())
-    mapped_a = set(approved.values())
-    final_fields = target_fields
-
     logging.debug(f"Approved mapping: {approved}")
-    merged_data = []
-    unmatched_source_fields = list(fields_a - mapped_a - rejected_a)
-    unmatched_source_data = []
-    for row_idx, row_a in enumerate(data_a):
-        merged = {}
-        for tgt_field in final_fields:
-            a_field = approved.get(tgt_field)
-            val = None
-            if a_field and a_field in row_a:
-                val = row_a.get(a_field)
-            if val is None and tgt_field in row_a:
-                val = row_a.get(tgt_field)
-            # Apply transformation if needed and value is not None
-            transform_info = st.session_state.get("transformations", {}).get(tgt_field, {})
-            code = transform_info.get("user_code")
-            if val is not None and transform_info.get("use_transform") and data_transformation.is_valid_transform_code(code):
-                val = data_transformation.safe_apply_transformation(val, code)
-            if val is None:
-                val = target_defaults.get(tgt_field)
-            merged[tgt_field] = val
-        merged_data.append(merged)
-        unmatched_row = {field: row_a.get(field) for field in unmatched_source_fields}
-        unmatched_source_data.append(unmatched_row)
+    # Teach the mapping memory this review's changed or confirmed decisions (once per review session)
+    if not st.session_state["review_from_plan"] and st.session_state.get("memory_session") != st.session_state["audit_session"]:
+        decisions = {m["Target Field"]: m["decision"] for m in valid_matches}
+        mapping_memory.record_decisions(get_mapping_memory(), valid_matches, decisions, source_profile,
+                                        reviewed=st.session_state["reviewed"])
+        st.session_state["memory_session"] = st.session_state["audit_session"]
+    final_fields = target_fields
+    # Custom transformation code runs in sandboxed worker processes, fields in parallel;
+    # the result is held as typed (and, for low-cardinality fields, categorical) columns
+    # and the post-migration validation against the target schema runs inside the merge
+    post_issues = IssueStore('Merged Output')
+    # Values whose transformation fails go to a dead-letter file, not into the output
+    quarantine = TransformQuarantine(path=os.path.join(OUTPUT_DIR, DEAD_LETTER_FILE))
+    # Transformations of low-cardinality source columns run once per distinct value
+    transformations = transform_memo.memoized_transformations(
+        st.session_state.get("transformations", {}), approved, source_profile
+    )
+    merged_data = merge_table(
+        data_a, approved, transformations, final_fields, target_defaults,
+        field_schemas=target_field_schemas, pool=get_transform_pool(), issues=post_issues, quarantine=quarantine
+    )
+    if dedupe_output:
+        # Blocked fuzzy matching: duplicate customers collapse into one surviving record,
+        # validated again with the quarantined values renumbered (before they are flushed)
+        merged_data, duplicate_clusters, post_issues = deduplicate_output(
+            merged_data, target_field_schemas, quarantine=quarantine
+        )
+        pd.DataFrame(duplicate_clusters, columns=["Cluster", "Rows", "Size", "Score"]).to_csv(
+            os.path.join(OUTPUT_DIR, "duplicate_clusters.csv"), index=False
+        )
+        st.session_state["duplicate_clusters"] = duplicate_clusters
+    else:
+        st.session_state.pop("duplicate_clusters", None)
+    quarantine.close()
+    st.session_state["quarantine"] = (quarantine.total(), quarantine.tripped, quarantine.summary_df())
+    unmatched_source_fields, unmatched_source_data = unmatched_source(data_a, source_profile["fields"], approved, rejected_a)
 
     # === Post-Migration Validation ===
-    post_issues = validate_data(merged_data, list(merged_data[0].keys()), {k: get_data_type(merged_data[0][k]) for k in merged_data[0].keys()}, 'Merged Output')
-    if post_issues:
-        post_issues_df = pd.DataFrame(post_issues)
-        post_issues_df.to_csv(os.path.join(OUTPUT_DIR, "post_migration_issues.csv"), index=False)
-        st.session_state["post_issues"] = (len(post_issues), post_issues_df)
-    else:
-        st.session_state["post_issues"] = (0, None)
-
-    # Save output to project folder
-    with open(os.path.join(OUTPUT_DIR, "normalized_output.json"), "w") as f:
-        json.dump(merged_data, f, indent=2)
-    df = pd.DataFrame(merged_data)
-    df.to_csv(os.path.join(OUTPUT_DIR, "normalized_output.csv"), index=False)
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False)
-    st.session_state["merged_data"] = (df, csv_buffer, merged_data, len(final_fields))
-    # Save unmatched source data for UI
-    st.session_state["unmatched_source_fields"] = (unmatched_source_fields, unmatched_source_data)
-
-if "post_issues" in st.session_state or "merged_data" in st.session_state:
+    st.session_state["post_issues"] = post_issues
+
+    # Save output to project folder; the session keeps only file paths and a sparse row index
+    writer = write_outputs(merged_data, OUTPUT_DIR)
+    del merged_data
+    st.session_state["output_files"] = {
+        "json_path": writer.json_path, "csv_path": writer.csv_path, "fields": writer.fields,
+        "rows": writer.rows, "index": writer.index,
+    }
+    st.session_state["output_page"] = 1
+    # Save unmatched source columns for UI
+    unmatched_path = os.path.join(OUTPUT_DIR, "unmatched_source_columns.csv")
+    if unmatched_source_fields:
+        unmatched_source_data.to_csv(unmatched_path)
+    st.session_state["unmatched_source_fields"] = (unmatched_source_fields, unmatched_path)
+
+if "post_issues" in st.session_state or "output_files" in st.session_state:
     with st.expander("Output Validation & Preview", expanded=True):
         if "post_issues" in st.session_state:
-            count, post_issues_df = st.session_state["post_issues"]
-            if count > 0:
-                st.warning(f"{count} post-migration data validation issues found. Download the CSV report for details.")
-                st.download_button("⬇️ Download Post-Migration Issues CSV", data=post_issues_df.to_csv(index=False), file_name="post_migration_issues.csv", mime="text/csv")
-            else:
-                st.success("No post-migration data validation issues detected.")
-        if "merged_data" in st.session_state:
-            df, csv_buffer, merged_data, num_fields = st.session_state["merged_data"]
-            st.subheader("🔎 Preview of Merged Output (first 10 rows)")
-            st.info(f"🧾 Final output will have {num_fields} columns.")
-            st.dataframe(df.head(10))
-        st.success("✅ Merged data ready! Download below:")
-        st.download_button("⬇️ Download Final Report - JSON", data=json.dumps(merged_data, indent=2), file_name="normalized_output.json", mime="application/json")
-        st.download_button("⬇️ Download Final Report - CSV", data=csv_buffer.getvalue().encode("utf-8"), file_name="normalized_output.csv", mime="text/csv")
+            show_issue_report(st.session_state["post_issues"], "post-migration", "post_migration_issues.csv")
+        if "output_files" in st.session_state:
+            output = st.session_state["output_files"]
+            st.subheader("🔎 Preview of Merged Output")
+            st.info(f"🧾 Final output has {len(output['fields'])} columns and {output['rows']} rows.")
+            # Pages are read back from the written CSV, so reruns don't hold or rebuild the output
+            page_count = max(1, -(-output["rows"] // PREVIEW_PAGE_SIZE))
+            page = st.number_input(f"Page (of {page_count}, {PREVIEW_PAGE_SIZE} rows each)", min_value=1, max_value=page_count, step=1, key="output_page")
+            start = (page - 1) * PREVIEW_PAGE_SIZE
+            page_df = read_output_page(output["csv_path"], output["fields"], output["index"], start, PREVIEW_PAGE_SIZE)
+            page_df.index = range(start + 1, start + 1 + len(page_df))
+            st.dataframe(page_df)
+        if st.session_state.get("duplicate_clusters"):
+            clusters = st.session_state["duplicate_clusters"]
+            st.info(f"🧬 {len(clusters)} duplicate clusters ({sum(c['Size'] for c in clusters)} rows) were merged into surviving records.")
+            file_download_button("⬇️ Download Duplicate Clusters CSV", os.path.join(OUTPUT_DIR, "duplicate_clusters.csv"), "duplicate_clusters.csv", "text/csv")
+        if st.session_state.get("quarantine", (0,))[0]:
+            failed, tripped, summary = st.session_state["quarantine"]
+            st.warning(f"🧯 {failed} values failed their transformation and were quarantined instead of written to the output.")
+            for field, reason in tripped.items():
+                st.error(f"Stopped transforming `{field}` (circuit breaker): {reason}")
+            st.dataframe(summary)
+            file_download_button("⬇️ Download Quarantined Values (JSONL)", os.path.join(OUTPUT_DIR, DEAD_LETTER_FILE), DEAD_LETTER_FILE, "application/x-ndjson")
+        if "output_files" in st.session_state:
+            st.success("✅ Merged data ready! Download below:")
+            file_download_button("⬇️ Download Final Report - JSON", output["json_path"], "normalized_output.json", "application/json")
+            file_download_button("⬇️ Download Final Report - CSV", output["csv_path"], "normalized_output.csv", "text/csv")
     # New section: Show unmatched source fields
     if "unmatched_source_fields" in st.session_state:
-        unmatched_fields, unmatched_data = st.session_state["unmatched_source_fields"]
+        unmatched_fields, unmatched_path = st.session_state["unmatched_source_fields"]
         if unmatched_fields:
             st.markdown("---")
             st.subheader(":warning: Unmatched Source Columns (not included in output)")
             st.markdown("These columns from the source data were not mapped to the target schema and are not present in the merged output. Review below:")
-            st.dataframe(pd.DataFrame(unmatched_data).head(10))
-            st.download_button("⬇️ Download Unmatched Source Columns (CSV)", data=pd.DataFrame(unmatched_data).to_csv(index=False), file_name="unmatched_source_columns.csv", mime="text/csv")
+            st.dataframe(pd.read_csv(unmatched_path, nrows=10, dtype=str, keep_default_na=False))
+            file_download_button("⬇️ Download Unmatched Source Columns (CSV)", unmatched_path, "unmatched_source_columns.csv", "text/csv")
+
+# Append this run's buffered audit events to the journal (no full rewrite)
+if "audit_session" in st.session_state:
+    get_audit_journal().flush()
 
-# Save audit log in output folder
-if "audit_log" in st.session_state:
-    audit_df = pd.DataFrame(st.session_state["audit_log"])
-    audit_df.to_csv(os.path.join(OUTPUT_DIR, "audit_log.csv"), index=False)
@@ -0,0 +1,247 @@
+"""
+Headless batch migration: runs Sections 1-3 of the Streamlit app without the UI.
+
+    python migrate.py --source system_a_data.json --plan migration_plan.json
+    python migrate.py --source crm.jsonl --merge-source Billing billing.csv contact_email --stream
+
+Pre-migration validation, merge (with transformations), post-migration
+validation and output writing all come from migration_engine. With a plan
+file (approved mappings and transformations) no AI calls are made; without
+one, fields are matched and the UI's review defaults are applied. The exit
+code is non-zero when an issue threshold is breached, so the run can gate a
+scheduled job or CI pipeline.
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+import api_clients
+import connectors
+import data_profiling
+import migration_engine
+import migration_plan
+import multi_source_merge
+import pipeline
+import quarantine
+import transform_memo
+from issue_store import IssueStore
+from transform_pool import TransformWorkerPool
+
+EXIT_OK = 0
+EXIT_THRESHOLD_BREACHED = 1
+
+
+def precedence_arg(text):
+    field, _, names = text.partition("=")
+    sources = [name.strip() for name in names.split(",") if name.strip()]
+    if not field or not sources:
+        raise argparse.ArgumentTypeError(f"expected FIELD=SOURCE[,SOURCE...], got '{text}'")
+    return field, sources
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a source-to-target data migration without the UI.")
+    parser.add_argument("--source", default="system_a_data.json",
+                        help="Source data: a JSON array or JSON Lines file (.jsonl/.ndjson, optionally .gz/.xz), "
+                             "a CSV file or a SQLite table (sqlite:///path.db?table=name)")
+    parser.add_argument("--merge-source", nargs=3, action="append", metavar=("NAME", "PATH", "KEY_FIELD"),
+                        help="Consolidate another source system with the source on a normalized key before "
+                             "migrating (repeatable; overrides the plan's additional sources)")
+    parser.add_argument("--source-key", help="Join key field of the main source (default: the plan's, else email)")
+    parser.add_argument("--key-normalizer", choices=list(multi_source_merge.KEY_NORMALIZERS),
+                        help="How join keys are normalized before matching (default: the plan's, else email)")
+    parser.add_argument("--precedence", type=precedence_arg, action="append", metavar="FIELD=SOURCE[,SOURCE...]",
+                        help="Sources to take a field from, in order, when several have a value (repeatable)")
+    parser.add_argument("--schema", default="schemas/target_schema.json", help="Path to the target schema JSON")
+    parser.add_argument("--plan", help="Saved migration plan JSON (skips matching and AI suggestions)")
+    parser.add_argument("--save-plan", help="Write the mappings used by this run as a migration plan")
+    parser.add_argument("--output-dir", default="output", help="Directory for outputs and reports")
+    parser.add_argument("--output-format", choices=list(migration_engine.OUTPUT_FORMATS), default="json",
+                        help="Format of the merged records file (JSON array, or JSON Lines, optionally compressed)")
+    parser.add_argument("--sink", help="Also bulk-insert the merged records into SQLite (sqlite:///path.db?table=name)")
+    parser.add_argument("--sink-mode", choices=["replace", "append"], default="replace",
+                        help="Recreate the sink table or append to it")
+    parser.add_argument("--dedupe", action="store_true", help="Collapse duplicate records in the merged output")
+    parser.add_argument("--workers", type=int, default=None, help="Transformation worker processes (default: CPU count)")
+    parser.add_argument("--stream", action="store_true", help="Pipeline read/transform/write in batches instead of loading the whole source")
+    parser.add_argument("--batch-size", type=int, default=pipeline.DEFAULT_BATCH_SIZE, help="Records per batch with --stream")
+    parser.add_argument("--issue-details", action="store_true", help="Also write the detailed per-row issue CSVs")
+    parser.add_argument("--max-pre-issues", type=int, default=None, help="Fail before merging above this many pre-migration issues")
+    parser.add_argument("--max-post-issues", type=int, default=None, help="Fail above this many post-migration issues")
+    parser.add_argument("--max-transform-errors", type=int, default=None, help="Fail above this many failed transformations")
+    parser.add_argument("--max-error-rate", type=float, default=quarantine.DEFAULT_MAX_ERROR_RATE,
+                        help="Stop applying a field's transformation once this share of its values failed")
+    parser.add_argument("--memoize-ratio", type=float, default=transform_memo.MAX_DISTINCT_RATIO,
+                        help="Run a field's transformation once per distinct value when its source has at most "
+                             "this share of distinct values (0 turns memoization off)")
+    parser.add_argument("--breaker-min-rows", type=int, default=quarantine.DEFAULT_MIN_ROWS,
+                        help="Values a transformation is tried on before its error rate can stop it")
+    args = parser.parse_args(argv)
+    if args.stream and args.dedupe:
+        parser.error("--dedupe needs the whole merged output in memory and cannot be combined with --stream")
+    return args
+
+
+def report_issues(issues, label, name, output_dir, details=False):
+    count = issues.total()
+    print(f"{'⚠️' if count else '✅'} {count} {label} issues in {len(issues.rows)} field/issue groups")
+    issues.summary_df().to_csv(os.path.join(output_dir, f"{name}_summary.csv"), index=False)
+    if details:
+        issues.write_csv(os.path.join(output_dir, f"{name}.csv"))
+    return count
+
+
+def source_join(args, plan=None):
+    """The plan's source consolidation (see migration_engine.iter_source) with the command-line options applied."""
+    join = dict((plan or {}).get("join") or {})
+    if args.merge_source:
+        join["additional_sources"] = [
+            {"name": name, "path": path, "key_field": key_field} for name, path, key_field in args.merge_source
+        ]
+    if args.source_key:
+        join["key_field"] = args.source_key
+    if args.key_normalizer:
+        join["key_normalizer"] = args.key_normalizer
+    if args.precedence:
+        join["precedence"] = dict(args.precedence)
+    if not join.get("additional_sources"):
+        return None
+    join.setdefault("key_field", "email")
+    join.setdefault("key_normalizer", "email")
+    join.setdefault("precedence", {})
+    return join
+
+
+def breached(count, limit, label):
+    if limit is not None and count > limit:
+        print(f"❌ {label}: {count} exceeds the limit of {limit}")
+        return True
+    return False
+
+
+def run(args):
+    started = time.time()
+    os.makedirs(args.output_dir, exist_ok=True)
+    schema, target_fields, target_defaults, field_schemas = migration_engine.load_target_schema(args.schema)
+    # Value matching (and so MinHash signatures in the profile) is only needed without a plan
+    signatures = not args.plan and migration_engine.has_reference_data()
+    plan = migration_plan.load_plan(args.plan) if args.plan else None
+    join = source_join(args, plan)
+    if join:
+        names = ", ".join(source["name"] for source in join["additional_sources"])
+        print(f"🔗 Consolidating the source with {names} on '{join['key_field']}' ({join['key_normalizer']} keys)")
+    if args.stream:
+        data = None
+        if join:
+            # The join is streamed again for each pass; the profile samples it
+            profile = data_profiling.profile_records(migration_engine.iter_source(args.source, join), signatures=signatures)
+        else:
+            profile = data_profiling.load_or_build_profile(args.source, records=pipeline.iter_records(args.source),
+                                                           signatures=signatures)
+    else:
+        data, profile = migration_engine.load_source(args.source, join, signatures=signatures)
+    print(f"✅ Loaded {profile['row_count']} source records with {len(profile['fields'])} fields")
+
+    # === Section 1: Pre-Migration Validation ===
+    types = data_profiling.column_types(profile)
+    if args.stream:
+        pre_issues = pipeline.validate_file(args.source, profile["fields"], types, 'System A', batch_size=args.batch_size,
+                                            join=join)
+    else:
+        pre_issues = migration_engine.validate_data(data, profile["fields"], types, 'System A')
+    pre_count = report_issues(pre_issues, "pre-migration", "pre_migration_issues", args.output_dir, args.issue_details)
+    if breached(pre_count, args.max_pre_issues, "Pre-migration issues"):
+        return EXIT_THRESHOLD_BREACHED
+
+    # === Section 2: Field Mapping ===
+    if plan is not None:
+        plan["join"] = join
+        if migration_plan.schema_changed(plan, schema):
+            print("⚠️ The target schema changed since this plan was saved; mappings to removed fields are ignored")
+    else:
+        print("🔍 No plan given: matching fields and applying the default review decisions...")
+        matches, _, _ = migration_engine.match_fields(data, target_fields, profile=profile)
+        for line in api_clients.get_clients().summary():
+            print(f"🌐 {line}")
+        plan = migration_plan.build_plan(matches, migration_engine.default_decisions(matches), {}, schema,
+                                          source=args.source, join=join)
+    if args.save_plan:
+        migration_plan.save_plan(plan, args.save_plan)
+        print(f"💾 Saved migration plan to {args.save_plan}")
+
+    # === Section 3: Merge, Validate & Write ===
+    sink = None
+    if args.sink:
+        sink = connectors.SQLiteSink(args.sink, target_fields, field_schemas, mode=args.sink_mode)
+    # Failed values are routed to a dead-letter file instead of being written into the output
+    failures = quarantine.TransformQuarantine(
+        args.max_error_rate, args.breaker_min_rows, path=os.path.join(args.output_dir, quarantine.DEAD_LETTER_FILE),
+    )
+    with TransformWorkerPool(workers=args.workers) as pool:
+        compiled = migration_plan.compile_plan(plan, target_fields, target_defaults, pool=pool, field_schemas=field_schemas)
+        print(f"📄 Plan: {len(compiled.mappings)} mappings, {len(compiled.transformations)} transformations")
+        for field, error in compiled.mapping_errors.items():
+            print(f"⚠️ Mapping for '{field}' skipped: {error}")
+        for field, error in compiled.errors.items():
+            print(f"⚠️ Transformation for '{field}' skipped: {error}")
+        memoized = compiled.memoize_low_cardinality(profile, args.memoize_ratio)
+        if memoized:
+            print(f"🧠 Low-cardinality sources, transformed once per distinct value: {', '.join(memoized)}")
+        missing = sorted(set(compiled.source_fields()) - set(profile["fields"]))
+        if missing:
+            print(f"⚠️ Plan maps source fields not present in the source: {', '.join(missing)}")
+        if args.stream:
+            # Reading, merging and writing overlap; only a few batches are in memory at a time
+            result = pipeline.migrate_file(
+                args.source, compiled.mappings, compiled.transformations, target_fields, target_defaults,
+                args.output_dir, pool=pool, batch_size=args.batch_size, field_schemas=field_schemas,
+                output_format=args.output_format, sink=sink, quarantine=failures, join=join,
+            )
+            row_count = result["rows"]
+            post_issues = result["post_issues"]
+            print("⏱️ Stage busy time: " + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in result["stage_seconds"].items()))
+        else:
+            # Post-migration validation against the schema runs inside the merge
+            post_issues = IssueStore('Merged Output')
+            merged_data = compiled.merge(data, pool=pool, issues=post_issues, quarantine=failures)
+    if not args.stream:
+        if args.dedupe:
+            # Surviving records changed: they are validated again, quarantined values renumbered
+            merged_data, clusters, post_issues = migration_engine.deduplicate_output(
+                merged_data, field_schemas, quarantine=failures
+            )
+            pd.DataFrame(clusters, columns=["Cluster", "Rows", "Size", "Score"]).to_csv(
+                os.path.join(args.output_dir, "duplicate_clusters.csv"), index=False
+            )
+            print(f"🧬 {len(clusters)} duplicate clusters merged")
+        row_count = len(merged_data)
+        migration_engine.write_outputs(merged_data, args.output_dir, args.output_format, sink=sink)
+    if sink is not None:
+        sink.close()
+        print(f"🗄️ Inserted {sink.summary()}")
+    failures.close()
+    failures.summary_df().to_csv(os.path.join(args.output_dir, "transform_quarantine_summary.csv"), index=False)
+    post_count = report_issues(post_issues, "post-migration", "post_migration_issues", args.output_dir, args.issue_details)
+    print(f"✅ Wrote {row_count} records to {args.output_dir} in {time.time() - started:.1f}s")
+    transform_errors = failures.total()
+    if transform_errors:
+        print(f"⚠️ {transform_errors} values failed their transformation (see {failures.path})")
+    for field, reason in failures.tripped.items():
+        print(f"🧯 Stopped transforming '{field}': {reason}")
+
+    failed = [
+        breached(post_count, args.max_post_issues, "Post-migration issues"),
+        breached(transform_errors, args.max_transform_errors, "Transformation errors"),
+    ]
+    return EXIT_THRESHOLD_BREACHED if any(failed) else EXIT_OK
+
+
+def main(argv=None):
+    sys.exit(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
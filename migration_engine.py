@@ -0,0 +1,641 @@
+"""
+Migration engine: validation, field matching and merge without any UI.
+
+Everything Sections 1-3 of the Streamlit app do to the data lives here so the
+same code runs interactively (match_and_merge_streamlit.py) and headless
+(migrate.py). API calls go through the shared, rate-limited client layer
+(api_clients.py), whose clients are created on the first call that needs
+them, so validating and merging with a saved plan never touches OpenAI or
+Pinecone.
+"""
+import bisect
+import csv
+import difflib
+import io
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+from dotenv import load_dotenv
+
+import api_clients
+import connectors
+import data_profiling
+import data_transformation
+import deduplication
+import embedding_store
+import embeddings
+import field_paths
+import jsonl_io
+import mapping_memory
+import multi_source_merge
+import value_matching
+from data_profiling import get_data_type
+from issue_store import IssueStore
+from schema_validation import TRANSFORM_ERROR_PREFIX, compile_validators
+from typed_table import DEFAULT_BATCH_SIZE, SourceProjection, TypedTable
+
+load_dotenv()
+
+INDEX_ROWS = 1000   # CSV offset sampled about every this many output rows
+# Output file of the merged records per output format
+OUTPUT_FORMATS = {
+    "json": "normalized_output.json",
+    "jsonl": "normalized_output.jsonl",
+    "jsonl.gz": "normalized_output.jsonl.gz",
+    "jsonl.xz": "normalized_output.jsonl.xz",
+}
+
+# === Constants ===
+SIMILARITY_THRESHOLD = 0.7
+TOP_K = 3
+# Reference datasets in target-schema shape used for value-overlap matching
+REFERENCE_DATA_DIR = "reference_data"
+VALUE_OVERLAP_THRESHOLD = 0.7
+# Local schema vectors (ingest_metadata_to_pinecone.py --store), searched when embeddings are not OpenAI's
+SCHEMA_STORE_PATH = os.path.join("output", "schema_vectors")
+
+# === Manual Mapping and Synonyms ===
+manual_mapping = {
+    'cust_id': 'customer_id',
+    'full_name': 'name',
+    'contact_email': 'email',
+    'signup_date': 'registration_date',
+    'mobile_number': 'phone',
+    'shipping_address': 'billing_address',
+    'rewards_earned': 'loyalty_points',
+    'dob': 'date_of_birth',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'address': 'address',
+    'age': 'age',
+    'preferences': 'preferences',
+    'subscription_tier': 'subscription_tier',
+    'last_login': 'last_login',
+    'account_balance': 'account_balance',
+    'payment_methods': 'payment_methods',
+    'notes': 'notes',
+}
+synonym_dict = {
+    'customer_id': ['cust_id', 'customerid', 'customer id', 'client_id', 'clientid'],
+    'cust_id': ['customer_id', 'customerid', 'customer id', 'client_id', 'clientid'],
+    'name': ['full_name', 'fullname', 'full name', 'contact_name', 'person_name'],
+    'full_name': ['name', 'fullname', 'full name', 'contact_name', 'person_name'],
+    'email': ['contact_email', 'email_address', 'mail', 'emailid'],
+    'contact_email': ['email', 'email_address', 'mail', 'emailid'],
+    'registration_date': ['signup_date', 'registrationdate', 'registration date', 'join_date', 'created_at'],
+    'signup_date': ['registration_date', 'registrationdate', 'registration date', 'join_date', 'created_at'],
+    'phone': ['mobile_number', 'telephone', 'mobile', 'cell', 'contact_number'],
+    'mobile_number': ['phone', 'telephone', 'mobile', 'cell', 'contact_number'],
+    'billing_address': ['shipping_address', 'address', 'location', 'addr', 'home_address'],
+    'shipping_address': ['billing_address', 'address', 'location', 'addr', 'home_address'],
+    'loyalty_points': ['rewards_earned', 'points', 'reward points'],
+    'rewards_earned': ['loyalty_points', 'points', 'reward points'],
+    'subscription_type': ['membership_status', 'subscription', 'membership'],
+    'membership_status': ['subscription_type', 'subscription', 'membership'],
+    'preferred_language': ['preferred_contact_method', 'language', 'contact_method'],
+    'preferred_contact_method': ['preferred_language', 'language', 'contact_method'],
+    'date_of_birth': ['dob', 'dateofbirth', 'date of birth'],
+    'dob': ['date_of_birth', 'dateofbirth', 'date of birth'],
+    'first_name': ['firstname', 'first name'],
+    'last_name': ['lastname', 'last name'],
+    'address': ['shipping_address', 'billing_address', 'location', 'addr', 'home_address'],
+    'age': ['years', 'years_old'],
+    'preferences': ['preference', 'likes', 'interests'],
+    'subscription_tier': ['subscription', 'tier', 'plan'],
+    'last_login': ['lastlogin', 'last login', 'recent_login'],
+    'account_balance': ['balance', 'accountbalance', 'funds'],
+    'payment_methods': ['payment', 'methods', 'paymentmethod'],
+    'notes': ['note', 'comments', 'remarks'],
+}
+strict_types = {'date', 'phone', 'id', 'email', 'amount', 'number'}
+
+def are_synonyms(field_a, field_b):
+    field_a = field_a.lower().replace('_', ' ').replace('-', ' ')
+    field_b = field_b.lower().replace('_', ' ').replace('-', ' ')
+    for key, synonyms in synonym_dict.items():
+        if field_a == key or field_a in synonyms:
+            if field_b == key or field_b in synonyms:
+                return True
+    return False
+
+def compute_field_similarity(field_a, field_b):
+    field_a_norm = field_a.lower().replace('_', ' ').replace('-', ' ')
+    field_b_norm = field_b.lower().replace('_', ' ').replace('-', ' ')
+    if are_synonyms(field_a, field_b):
+        return 1.0
+    if field_a_norm == field_b_norm:
+        return 1.0
+    return difflib.SequenceMatcher(None, field_a_norm, field_b_norm).ratio()
+
+def validate_data(data, fields, types, system_name, issues=None, row_offset=0):
+    """
+    Check every row for missing values and type mismatches; returns an aggregated IssueStore.
+    Pass `issues` and `row_offset` to validate a file batch by batch into one store.
+    """
+    if issues is None:
+        issues = IssueStore(system_name)
+    for i, row in enumerate(data, row_offset):
+        for field in fields:
+            value = row.get(field, None)
+            if value is None or value == '':
+                issues.add(i+1, field, f"Missing value for '{field}'", value)
+            else:
+                expected_type = types[field]
+                actual_type = get_data_type(value)
+                if expected_type != actual_type:
+                    issues.add(i+1, field, f"Type mismatch in '{field}' (expected {expected_type}, got {actual_type})", value)
+    return issues
+
+def has_reference_data(reference_dir=REFERENCE_DATA_DIR):
+    """Whether there are reference datasets to value-match against (else profiles need no MinHash signatures)."""
+    return os.path.isdir(reference_dir) and any(name.endswith(".json") for name in os.listdir(reference_dir))
+
+def load_reference_value_index(reference_dir=REFERENCE_DATA_DIR):
+    """LSH index of target-field value signatures from reference datasets (JSON records keyed by target field names)."""
+    signatures = []
+    if os.path.isdir(reference_dir):
+        for name in sorted(os.listdir(reference_dir)):
+            if name.endswith(".json"):
+                profile = data_profiling.load_or_build_profile(os.path.join(reference_dir, name))
+                signatures.extend(value_matching.profile_signatures(profile).items())
+    return value_matching.build_index(signatures)
+
+def target_query(target_field):
+    """Text embedded to search the schema vectors for a target field."""
+    query = f"{target_field}"
+    if len(target_field) <= 3:
+        query += " (date of birth)"
+    return query
+
+def open_schema_store(embedder, path=SCHEMA_STORE_PATH):
+    """
+    The local schema store to search with a non-OpenAI embedder. The Pinecone index
+    holds OpenAI vectors of another dimension, so without a store written by the
+    same model there is nothing to search.
+    """
+    store = embedding_store.open_store(path)
+    if store is None:
+        raise ValueError(
+            f"No local schema vectors at {path} for {embedder.name} embeddings; run "
+            "ingest_metadata_to_pinecone.py --embedding-provider local --skip-pinecone first"
+        )
+    if store.embedding_model != embedder.name:
+        raise ValueError(
+            f"The schema vectors at {path} were embedded with {store.embedding_model}, not {embedder.name}; "
+            "re-run ingest_metadata_to_pinecone.py with the same provider"
+        )
+    return store
+
+def match_fields(source_data, target_fields, profile=None, value_index=None, memory=None, embedder=None,
+                 candidates=None, store_path=SCHEMA_STORE_PATH):
+    """
+    Match source fields to target fields. `candidates` ({target field: vector
+    matches}) replaces the embedding + vector search with precomputed results,
+    as batch matching does for a whole schema catalog. OpenAI embeddings are
+    searched in Pinecone, others in the local schema store at `store_path`.
+    """
+    # Value-overlap (MinHash/LSH) scores of source columns against reference target data
+    if value_index is None:
+        value_index = load_reference_value_index()
+    if profile is None:
+        profile = data_profiling.profile_records(source_data, signatures=bool(value_index.signatures))
+    source_fields = profile["fields"]
+    samples_source = {key: str(data_profiling.column_sample(profile, key)) for key in source_fields}
+    types_source = data_profiling.column_types(profile)
+    source_signatures = value_matching.profile_signatures(profile)
+    value_scores = value_matching.value_overlap_scores(source_signatures, value_index)
+    # Decisions learned from past reviews are consulted before any embedding/Pinecone call
+    if memory is None:
+        memory = mapping_memory.MappingMemory()
+    results = []
+    matched_target = set()
+    audit_log = []
+    store = None
+    for target_field in target_fields:
+        # Explicit fix: always match date_of_birth with dob if present
+        if target_field == "date_of_birth" and "dob" in source_fields:
+            source_field = "dob"
+            best_score = 1.0
+            status = "✅ Strong Match (Manual)"
+            method = "Manual"
+            matched_target.add(target_field)
+            results.append({
+                "Target Field": target_field,
+                "Source Field": source_field,
+                "Source Sample": samples_source[source_field],
+                "Status": status
+            })
+            audit_log.append({
+                "timestamp": datetime.now().isoformat(),
+                "Target Field": target_field,
+                "Source Field": source_field,
+                "Mapping Method": method,
+                "AI Score": '-',
+                "Status": status,
+                "User Decision": None
+            })
+            continue
+        # Manual mapping override
+        source_field = None
+        best_score = -1
+        status = ""
+        method = ""
+        if target_field in manual_mapping.values():
+            # Find the source field that maps to this target field
+            for k, v in manual_mapping.items():
+                if v == target_field and k in source_fields:
+                    source_field = k
+                    best_score = 1.0
+                    status = "✅ Strong Match (Manual)"
+                    method = "Manual"
+                    matched_target.add(target_field)
+                    break
+        if not source_field:
+            source_field, best_score, method = memory.best_source(target_field, source_fields, source_signatures)
+            if source_field:
+                status = "✅ Strong Match (Memory)"
+                matched_target.add(target_field)
+        if not source_field:
+            if candidates is not None:
+                result = {"matches": candidates.get(target_field, [])}
+            else:
+                # Vector candidate search: query using the target field name
+                # Embedding provider from EMBEDDING_PROVIDER (OpenAI or a local SentenceTransformer)
+                embedder = embedder or embeddings.get_provider()
+                if isinstance(embedder, embeddings.OpenAIEmbeddingProvider):
+                    vector = embedder.embed_one(target_query(target_field))
+                    result = api_clients.get_clients().query(vector=vector, top_k=TOP_K, include_metadata=True, filter=None)
+                else:
+                    store = store or open_schema_store(embedder, store_path)
+                    vector = embedder.embed_one(target_query(target_field))
+                    result = {"matches": store.search([vector], top_k=TOP_K)[0]}
+            best_score = -1
+            method = "AI"
+            for match in result["matches"]:
+                candidate_field = match["metadata"]["field_name"]
+                for src in source_fields:
+                    if memory.is_rejected(src, target_field):
+                        continue
+                    field_sim = compute_field_similarity(src, candidate_field)
+                    score = 0.7 * field_sim + 0.3 * match["score"]
+                    if score > best_score:
+                        best_score = score
+                        source_field = src
+            # Content-based evidence: source columns whose values overlap this target's reference values
+            for src in source_fields:
+                overlap = value_scores.get(src, {}).get(target_field, 0.0)
+                if overlap >= VALUE_OVERLAP_THRESHOLD and overlap > best_score and not memory.is_rejected(src, target_field):
+                    best_score = overlap
+                    source_field = src
+                    method = "Value Overlap"
+            if best_score < SIMILARITY_THRESHOLD or not source_field:
+                source_field = 'No Match'
+                status = "❌ No Match"
+            else:
+                status = (
+                    "✅ Strong Match" if best_score >= 0.85 else
+                    "🟡 Moderate Match" if best_score >= 0.7 else
+                    "❌ Weak/Incorrect"
+                )
+                matched_target.add(target_field)
+        results.append({
+            "Target Field": target_field,
+            "Source Field": source_field,
+            "Source Sample": samples_source[source_field] if source_field in samples_source else '-',
+            "Status": status
+        })
+        audit_log.append({
+            "timestamp": datetime.now().isoformat(),
+            "Target Field": target_field,
+            "Source Field": source_field,
+            "Mapping Method": method,
+            "AI Score": best_score if method in ("AI", "Value Overlap", "Memory", "Memory (Values)") else '-',
+            "Value Overlap": round(value_scores.get(source_field, {}).get(target_field, 0.0), 3) if value_scores else '-',
+            "Status": status,
+            "User Decision": None
+        })
+    return results, audit_log, types_source
+
+def load_json(path):
+    """
+    Records of a JSON file; JSON Lines files (.jsonl/.ndjson, optionally .gz/.xz) are read
+    line by line, CSV files and sqlite:/// tables through their connectors.
+    """
+    if connectors.is_connector(path):
+        return list(connectors.open_source(path).iter_records())
+    if jsonl_io.is_jsonl(path):
+        return list(jsonl_io.iter_jsonl(path))
+    with jsonl_io.open_text(path) as f:
+        return json.load(f)
+
+def load_target_schema(path="schemas/target_schema.json"):
+    """Target schema plus its field names, default values and per-field definitions."""
+    schema = load_json(path)
+    fields = [f["name"] for f in schema["fields"]]
+    defaults = {f["name"]: f.get("default_value") for f in schema["fields"]}
+    field_schemas = {f["name"]: f for f in schema["fields"]}
+    return schema, fields, defaults, field_schemas
+
+def iter_records(path):
+    """
+    Records of a source: a JSON array or JSON Lines, plain or gzip/xz compressed, a CSV
+    file or a SQLite table/query (see connectors).
+    """
+    if connectors.is_connector(path):
+        return connectors.open_source(path).iter_records()
+    return jsonl_io.iter_jsonl(path) if jsonl_io.is_jsonl(path) else jsonl_io.iter_json_array(path)
+
+def iter_source(path, join=None, **merge_options):
+    """
+    Records of the source, streamed. With a `join` ({"key_field", "key_normalizer",
+    "additional_sources": [{"name", "path", "key_field"}], "precedence"}) the main
+    source and its additional sources are read record by record into the
+    multi_source_merge join, which spills to disk once its keys outgrow memory.
+    """
+    if not join or not join.get("additional_sources"):
+        return iter_records(path)
+    sources = [multi_source_merge.MergeSource("System A", iter_records(path), join.get("key_field", "email"))] + [
+        multi_source_merge.MergeSource(s["name"], iter_records(s["path"]), s["key_field"])
+        for s in join["additional_sources"]
+    ]
+    return multi_source_merge.merge_sources(
+        sources, normalize=join.get("key_normalizer", "email"), precedence=join.get("precedence") or {}, **merge_options,
+    )
+
+def load_source(path, join=None, signatures=None):
+    """
+    Load the source records and their profile, consolidated with the additional
+    sources of `join` (see iter_source) first. The profile has MinHash signatures
+    when `signatures` (default: when there is reference data to value-match against).
+    """
+    if signatures is None:
+        signatures = has_reference_data()
+    if join and join.get("additional_sources"):
+        data = list(iter_source(path, join))
+        return data, data_profiling.profile_records(data, signatures=signatures)
+    data = load_json(path)
+    # Whole-column profile of the source, cached on disk by file hash
+    return data, data_profiling.load_or_build_profile(path, records=data, signatures=signatures)
+
+def default_decisions(matches):
+    """The review defaults of the UI: strong matches approved, everything else rejected."""
+    return {
+        m["Target Field"]: "Approve" if m["Status"].startswith("✅") else "Reject"
+        for m in matches if m["Target Field"] != 'No Match'
+    }
+
+def approved_mapping(matches, decisions):
+    """{target field: source field} of the approved suggestions."""
+    return {
+        m["Target Field"]: m["Source Field"] for m in matches
+        if decisions.get(m["Target Field"]) == "Approve" and m["Source Field"] != 'No Match'
+    }
+
+def nested_targets(approved, target_fields):
+    """Mappings to paths below a target field (e.g. `address.city`): {target field: [(path, steps)]}."""
+    targets = set(target_fields)
+    nested = {}
+    for path in approved:
+        if path not in targets and field_paths.is_path(path):
+            root, steps = field_paths.target_steps(path)
+            if root in targets:
+                nested.setdefault(root, []).append((path, steps))
+    return nested
+
+def _source_column(data, a_field, tgt_field):
+    """Values of the source field or path mapped to a target, falling back to a source field named like the target."""
+    if not field_paths.is_path(a_field) and not field_paths.is_path(tgt_field):
+        values = [row_a.get(a_field) if a_field else None for row_a in data]
+        return [val if val is not None else row_a.get(tgt_field) for val, row_a in zip(values, data)]
+    # Paths are compiled once into accessors; rows are read without parsing them again
+    values = field_paths.extract_column(data, a_field) if a_field else [None] * len(data)
+    fallback = field_paths.compile_accessor(tgt_field)
+    return [val if val is not None else fallback(row_a) for val, row_a in zip(values, data)]
+
+def merge_columns(data, approved, transformations, target_fields, target_defaults, pool=None,
+                  field_schemas=None, issues=None, row_offset=0, quarantine=None):
+    """
+    Build the normalized output as {target field: column of values}. Transformations
+    run over whole columns; custom code runs in `pool` (a TransformWorkerPool) when
+    one is given. With an IssueStore as `issues`, each finished column is validated
+    against `field_schemas` on the spot (rows numbered from `row_offset` + 1).
+    With a TransformQuarantine, failed values are quarantined (rows numbered within
+    `data`) instead of written as error markers, and reported in `issues` too.
+    """
+    validators = compile_validators(field_schemas or {}, target_fields) if issues is not None else None
+    nested = nested_targets(approved, target_fields)
+    source_columns = {}
+    for tgt_field in list(target_fields) + [path for parts in nested.values() for path, _ in parts]:
+        source_columns[tgt_field] = _source_column(data, approved.get(tgt_field), tgt_field)
+    quarantined = len(quarantine.dead_letters) if quarantine is not None else 0
+    transformed = data_transformation.transform_columns(source_columns, transformations, pool=pool, quarantine=quarantine)
+    del source_columns
+    quarantined_rows = {}
+    if quarantine is not None and issues is not None:
+        quarantine.add_issues(issues, start=quarantined, row_offset=row_offset)
+        # Quarantined cells are reported once, not again as empty or invalid values
+        quarantined_rows = quarantine.rows_by_field(start=quarantined, row_offset=row_offset)
+    for tgt_field, parts in nested.items():
+        transformed[tgt_field] = field_paths.build_nested_column(
+            len(data), [(steps, transformed.pop(path)) for path, steps in parts], base=transformed[tgt_field],
+        )
+    columns = {}
+    for tgt_field in target_fields:
+        default = target_defaults.get(tgt_field)
+        columns[tgt_field] = [default if val is None else val for val in transformed.pop(tgt_field)]
+        if validators is not None:
+            validators[tgt_field].check(columns[tgt_field], issues, row_offset, skip=quarantined_rows.get(tgt_field, ()))
+    return columns
+
+def merge_records(data, approved, transformations, target_fields, target_defaults, pool=None,
+                  field_schemas=None, issues=None, row_offset=0, quarantine=None):
+    """The normalized output records as dicts (used for small batches)."""
+    columns = merge_columns(
+        data, approved, transformations, target_fields, target_defaults, pool=pool,
+        field_schemas=field_schemas, issues=issues, row_offset=row_offset, quarantine=quarantine,
+    )
+    return [dict(zip(target_fields, row_values)) for row_values in zip(*columns.values())]
+
+def merge_table(data, approved, transformations, target_fields, target_defaults, field_schemas=None, pool=None,
+                issues=None, quarantine=None):
+    """
+    The normalized output as a TypedTable: typed, categorical where it pays off, one column
+    per target field. Pass an IssueStore as `issues` to validate it against the schema while
+    merging, and a TransformQuarantine as `quarantine` to quarantine failed transformations.
+    """
+    columns = merge_columns(
+        data, approved, transformations, target_fields, target_defaults, pool=pool,
+        field_schemas=field_schemas, issues=issues, quarantine=quarantine,
+    )
+    return TypedTable.from_columns(columns, field_schemas)
+
+def unmatched_source(data, source_fields, approved, rejected=()):
+    """Source columns that were neither mapped nor rejected, as a lazy projection over the source records."""
+    excluded = {field_paths.path_root(field) for field in approved.values()} | set(rejected)
+    unmatched_fields = [f for f in source_fields if f not in excluded]
+    return unmatched_fields, SourceProjection(data, unmatched_fields)
+
+def _row_batches(merged_data, batch_size=DEFAULT_BATCH_SIZE):
+    """Batches of row dicts from a TypedTable or a list of records."""
+    if isinstance(merged_data, TypedTable):
+        yield from merged_data.iter_batches(batch_size)
+    else:
+        for start in range(0, len(merged_data), batch_size):
+            yield merged_data[start:start + batch_size]
+
+def validate_output(merged_data, field_schemas, skip=None):
+    """
+    Post-migration validation of already merged records (a TypedTable or a list of dicts)
+    against the target schema, e.g. after deduplication changed the rows. Merges validate
+    inline when given an IssueStore, without this extra pass. `skip` ({field: set of
+    1-based rows}) leaves cells unchecked, such as quarantined ones.
+    """
+    skip = skip or {}
+    issues = IssueStore('Merged Output')
+    if not len(merged_data):
+        return issues
+    is_table = isinstance(merged_data, TypedTable)
+    fields = merged_data.fields if is_table else list(merged_data[0].keys())
+    validators = compile_validators(field_schemas, fields)
+    for start in range(0, len(merged_data), DEFAULT_BATCH_SIZE):
+        stop = start + DEFAULT_BATCH_SIZE
+        batch = None if is_table else merged_data[start:stop]
+        for field in fields:
+            values = merged_data.values(field, start, stop) if is_table else [row.get(field) for row in batch]
+            validators[field].check(values, issues, start, skip=skip.get(field, ()))
+    return issues
+
+def deduplicate_output(merged_data, field_schemas, quarantine=None):
+    """
+    Collapse duplicate records of a merged TypedTable (see deduplication.py) and validate
+    the survivors again. Quarantined values, which must not have been flushed yet, are
+    renumbered to their surviving rows: their cells are left unchecked and they are
+    reported once, as quarantined. Returns (deduplicated table, clusters, post-migration issues).
+    """
+    merged_count = len(merged_data)
+    survivors, clusters = deduplication.deduplicate(merged_data.records())
+    deduplicated = TypedTable.from_records(survivors, merged_data.fields, field_schemas)
+    rows = deduplication.survivor_rows(merged_count, clusters)
+    skip = quarantine.rows_by_field(rows=rows) if quarantine is not None else None
+    issues = validate_output(deduplicated, field_schemas, skip=skip)
+    if quarantine is not None:
+        quarantine.add_issues(issues, rows=rows)
+    return deduplicated, clusters, issues
+
+def _is_transform_error(value):
+    return isinstance(value, str) and value.startswith(TRANSFORM_ERROR_PREFIX)
+
+def count_transform_errors(merged_data):
+    """Number of values per field that failed their transformation."""
+    counts = {}
+    if isinstance(merged_data, TypedTable):
+        for field in merged_data.fields:
+            count = merged_data.count_values(field, _is_transform_error)
+            if count:
+                counts[field] = count
+        return counts
+    for row in merged_data:
+        for field, value in row.items():
+            if _is_transform_error(value):
+                counts[field] = counts.get(field, 0) + 1
+    return counts
+
+def encode_records(records, fields, json_lines=False):
+    """
+    JSON array elements (laid out as json.dump(records, indent=2) would), or JSON Lines
+    with `json_lines`, and CSV rows of a batch.
+    """
+    if json_lines:
+        json_text = "\n".join(json.dumps(record) for record in records)
+    else:
+        json_text = ",\n".join("  " + json.dumps(record, indent=2).replace("\n", "\n  ") for record in records)
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore", lineterminator="\n").writerows(records)
+    return json_text, buffer.getvalue()
+
+class OutputWriter:
+    """
+    Incrementally writes normalized_output.json (a JSON array) or, depending on
+    `output_format`, JSON Lines (optionally gzip/xz compressed as a stream), and
+    normalized_output.csv. `index` samples (row number, CSV byte offset) about every
+    INDEX_ROWS rows so pages of the CSV can be read back without scanning the file
+    (see read_output_page).
+    """
+
+    def __init__(self, output_dir, fields, output_format="json"):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}' (expected one of {', '.join(OUTPUT_FORMATS)})")
+        os.makedirs(output_dir, exist_ok=True)
+        self.json_lines = output_format != "json"
+        self.json_path = os.path.join(output_dir, OUTPUT_FORMATS[output_format])
+        self.csv_path = os.path.join(output_dir, "normalized_output.csv")
+        self._json = jsonl_io.open_text(self.json_path, "w")
+        self._csv_file = open(self.csv_path, "w", newline="", encoding="utf-8")
+        self.fields = fields
+        header = io.StringIO()
+        csv.DictWriter(header, fieldnames=fields, lineterminator="\n").writeheader()
+        self._csv_file.write(header.getvalue())
+        self._csv_bytes = len(header.getvalue().encode("utf-8"))
+        if not self.json_lines:
+            self._json.write("[")
+        self.rows = 0
+        self.index = []
+
+    def write(self, records):
+        for start in range(0, len(records), INDEX_ROWS):
+            chunk = records[start:start + INDEX_ROWS]
+            json_text, csv_text = encode_records(chunk, self.fields, self.json_lines)
+            self.write_encoded(len(chunk), json_text, csv_text)
+
+    def write_encoded(self, count, json_text, csv_text):
+        if not count:
+            return
+        if not self.index or self.rows - self.index[-1][0] >= INDEX_ROWS:
+            self.index.append((self.rows, self._csv_bytes))
+        if self.json_lines:
+            self._json.write(json_text + "\n")
+        else:
+            self._json.write(("\n" if self.rows == 0 else ",\n") + json_text)
+        self._csv_file.write(csv_text)
+        self._csv_bytes += len(csv_text.encode("utf-8"))
+        self.rows += count
+
+    def close(self):
+        if not self.json_lines:
+            self._json.write("\n]" if self.rows else "]")
+        self._json.close()
+        self._csv_file.close()
+
+def read_output_page(csv_path, fields, index, start, count):
+    """Rows start..start+count of a written output CSV, as text, seeking via an OutputWriter index."""
+    position = bisect.bisect_right([row for row, _ in index], start) - 1
+    if position < 0:
+        return pd.DataFrame(columns=fields)
+    first_row, offset = index[position]
+    with open(csv_path, "rb") as f:
+        f.seek(offset)
+        return pd.read_csv(
+            f, header=None, names=fields, skiprows=start - first_row, nrows=count,
+            dtype=str, keep_default_na=False,
+        )
+
+def write_outputs(merged_data, output_dir="output", output_format="json", sink=None):
+    """
+    Write the merged output (see OutputWriter) batch by batch, also inserting each batch
+    into `sink` (a connectors.SQLiteSink) if given; returns the closed OutputWriter (paths, rows, index).
+    """
+    if isinstance(merged_data, TypedTable):
+        fields = merged_data.fields
+    else:
+        fields = list(merged_data[0].keys()) if merged_data else []
+    writer = OutputWriter(output_dir, fields, output_format)
+    try:
+        for batch in _row_batches(merged_data):
+            writer.write(batch)
+            if sink is not None:
+                sink.write(batch)
+    finally:
+        writer.close()
+    return writer
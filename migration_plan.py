@@ -0,0 +1,198 @@
+"""
+Saved migration plans.
+
+A plan captures everything a reviewer decided for one source/target pair: the
+suggested mappings with their approve/reject decisions, the transformation
+configured per target field (built-in primitive or user-edited code, plus the
+AI suggestion it started from), how the source is consolidated with other
+systems (the join) and the version of the target schema it was made against.
+Loading a plan skips field matching and transformation suggestions entirely,
+so a rerun makes no AI calls.
+
+`CompiledPlan` prepares a plan for merging once, at load time: the column
+projection (target field -> source field and default), transformation code
+checked for syntax errors and queued for compilation in the worker pool.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import field_paths
+import transform_memo
+import transform_primitives
+from data_transformation import is_valid_transform_code
+from migration_engine import approved_mapping, merge_table
+
+PLAN_VERSION = 1
+DEFAULT_PLAN_PATH = os.path.join("output", "migration_plan.json")
+MATCH_KEYS = ("Target Field", "Source Field", "Source Sample", "Status")
+TRANSFORM_KEYS = ("use_transform", "primitive", "user_code", "description", "code")
+
+
+def schema_fingerprint(schema):
+    """Short hash of the target schema's field definitions."""
+    canonical = json.dumps(schema["fields"], sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def build_plan(matches, decisions, transformations, schema, source=None, join=None):
+    """
+    Plan dict from the reviewed suggestions, {target: decision} and the Section 2.5
+    transformations; `join` is the source consolidation (see migration_engine.iter_source).
+    """
+    matches = [{key: m.get(key) for key in MATCH_KEYS} for m in matches]
+    return {
+        "plan_version": PLAN_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "source": source,
+        "join": join,
+        "schema": {
+            "name": schema.get("name"),
+            "version": schema.get("version"),
+            "fingerprint": schema_fingerprint(schema),
+        },
+        "matches": matches,
+        "decisions": dict(decisions),
+        "mappings": approved_mapping(matches, decisions),
+        "transformations": {
+            field: {key: info.get(key) for key in TRANSFORM_KEYS if key in info}
+            for field, info in transformations.items()
+        },
+    }
+
+
+def save_plan(plan, path=DEFAULT_PLAN_PATH):
+    """Write the plan atomically (a crash never leaves a half-written plan)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(plan, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _upgrade(plan):
+    """Bring older plan files up to PLAN_VERSION."""
+    if "plan_version" not in plan:
+        # Bare {"mappings", "transformations"} files: every mapping counts as approved
+        mappings = plan.get("mappings", {})
+        plan = {
+            "plan_version": PLAN_VERSION,
+            "created_at": None,
+            "source": None,
+            "schema": {},
+            "matches": [
+                {"Target Field": t, "Source Field": s, "Source Sample": "-", "Status": "✅ Strong Match (Plan)"}
+                for t, s in mappings.items()
+            ],
+            "decisions": {t: "Approve" for t in mappings},
+            "mappings": mappings,
+            "transformations": plan.get("transformations", {}),
+        }
+    plan.setdefault("join", None)
+    if plan["plan_version"] > PLAN_VERSION:
+        raise ValueError(f"Migration plan version {plan['plan_version']} is newer than supported ({PLAN_VERSION})")
+    return plan
+
+
+def load_plan(path=DEFAULT_PLAN_PATH):
+    with open(path) as f:
+        return _upgrade(json.load(f))
+
+
+def schema_changed(plan, schema):
+    """True when the target schema was edited since the plan was saved."""
+    fingerprint = plan.get("schema", {}).get("fingerprint")
+    return fingerprint is not None and fingerprint != schema_fingerprint(schema)
+
+
+def plan_codes(plan):
+    """Custom transformation code of the plan's active transformations."""
+    return [
+        info["user_code"] for info in plan["transformations"].values()
+        if info.get("use_transform") and not info.get("primitive") and is_valid_transform_code(info.get("user_code"))
+    ]
+
+
+class CompiledPlan:
+    """A plan resolved against the target schema and ready to merge."""
+
+    def __init__(self, plan, target_fields, target_defaults, field_schemas=None):
+        self.plan = plan
+        self.field_schemas = field_schemas or {}
+        self.target_fields = list(target_fields)
+        self.target_defaults = {field: target_defaults.get(field) for field in self.target_fields}
+        # Column projection: only mappings to fields (or paths below fields) that still exist in the
+        # target schema; source and target paths are compiled here, not per row
+        self.mappings = {}
+        self.mapping_errors = {}
+        for target, source in plan["mappings"].items():
+            if not self._in_schema(target):
+                continue
+            try:
+                field_paths.compile_accessor(source)
+                if field_paths.is_path(target) and target not in self.target_defaults:
+                    field_paths.target_steps(target)
+            except ValueError as e:
+                self.mapping_errors[target] = str(e)
+                continue
+            self.mappings[target] = source
+        self.transformations = {}
+        self.errors = {}
+        for field, info in plan["transformations"].items():
+            if not self._in_schema(field) or not info.get("use_transform"):
+                continue
+            spec = info.get("primitive")
+            if spec:
+                if spec.get("name") not in transform_primitives.PRIMITIVES:
+                    self.errors[field] = f"Unknown transformation primitive '{spec.get('name')}'"
+                    continue
+            elif is_valid_transform_code(info.get("user_code")):
+                try:
+                    compile(info["user_code"], f"<transform {field}>", "exec")
+                except SyntaxError as e:
+                    self.errors[field] = f"Syntax error in transformation code: {e}"
+                    continue
+            self.transformations[field] = info
+
+    def _in_schema(self, target):
+        return target in self.target_defaults or (
+            field_paths.is_path(target) and field_paths.path_root(target) in self.target_defaults
+        )
+
+    def source_fields(self):
+        """Top-level source fields the mappings read (the root of each path)."""
+        return sorted({field_paths.path_root(source) for source in self.mappings.values()})
+
+    def memoize_low_cardinality(self, profile, max_ratio=transform_memo.MAX_DISTINCT_RATIO):
+        """
+        Memoize the transformations of fields whose source column `profile` shows to be
+        low-cardinality (see transform_memo); returns those fields.
+        """
+        self.transformations = transform_memo.memoized_transformations(
+            self.transformations, self.mappings, profile, max_ratio,
+        )
+        return sorted(field for field, info in self.transformations.items() if info.get("memoize"))
+
+    def prepare(self, pool):
+        """Queue the custom code for compilation in every worker of a TransformWorkerPool."""
+        pool.preload(plan_codes({"transformations": self.transformations}))
+        return self
+
+    def merge(self, data, pool=None, issues=None, quarantine=None):
+        """
+        Merged output as a TypedTable; validated against the schema into `issues` (an IssueStore)
+        and with failed transformations quarantined in `quarantine` (a TransformQuarantine) if given.
+        """
+        return merge_table(
+            data, self.mappings, self.transformations, self.target_fields, self.target_defaults,
+            field_schemas=self.field_schemas, pool=pool, issues=issues, quarantine=quarantine,
+        )
+
+
+def compile_plan(plan, target_fields, target_defaults, pool=None, field_schemas=None):
+    compiled = CompiledPlan(plan, target_fields, target_defaults, field_schemas)
+    if pool is not None:
+        compiled.prepare(pool)
+    return compiled
@@ -0,0 +1,157 @@
+"""
+Multi-source keyed merge.
+
+Joins N source systems (e.g. a CRM and a billing export) on a configurable key
+such as the normalized email or customer id. Rows are combined with an
+in-memory hash join while they fit; once the number of distinct keys held in
+memory exceeds a limit, the join switches to a partitioned spill join: rows
+are hash-partitioned by key into JSON Lines files on disk and each partition
+is then joined in memory on its own. Per-field source precedence decides
+which source's value wins when several sources have one.
+"""
+import json
+import os
+import shutil
+import tempfile
+import zlib
+
+DEFAULT_MAX_IN_MEMORY_KEYS = 2_000_000
+DEFAULT_PARTITIONS = 64
+
+KEY_NORMALIZERS = {
+    "email": lambda v: str(v).strip().lower(),
+    "id": lambda v: str(v).strip().upper(),
+    "text": lambda v: " ".join(str(v).split()).lower(),
+    "raw": str,
+}
+
+
+class MergeSource:
+    """One input of the merge: a name, an iterable of dict records and the field holding its join key."""
+
+    def __init__(self, name, records, key_field):
+        self.name = name
+        self.records = records
+        self.key_field = key_field
+
+
+def _normalizer(normalize):
+    return KEY_NORMALIZERS[normalize] if isinstance(normalize, str) else normalize
+
+
+def _fill_missing(existing, row):
+    """Fill fields missing/empty in `existing` from another row of the same source and key."""
+    for field, value in row.items():
+        if existing.get(field) in (None, "") and value not in (None, ""):
+            existing[field] = value
+
+
+def combine_rows(rows_by_source, source_order, precedence=None):
+    """
+    Combine the rows of one key ({source name: row}) into a single record.
+    For each field the first source (in the field's precedence list, else
+    source order) with a non-empty value wins.
+    """
+    precedence = precedence or {}
+    fields = []
+    seen = set()
+    for name in source_order:
+        for field in rows_by_source.get(name, ()):
+            if field not in seen:
+                seen.add(field)
+                fields.append(field)
+    merged = {}
+    for field in fields:
+        order = precedence.get(field, source_order)
+        value = None
+        for name in order:
+            row = rows_by_source.get(name)
+            if row is not None and row.get(field) not in (None, ""):
+                value = row[field]
+                break
+        merged[field] = value
+    return merged
+
+
+class _PartitionSpill:
+    """Hash-partitioned JSON Lines spill files for the external-memory join."""
+
+    def __init__(self, partitions, spill_dir=None):
+        self.directory = tempfile.mkdtemp(prefix="merge_spill_", dir=spill_dir)
+        self.count = partitions
+        self.files = [
+            open(os.path.join(self.directory, f"part_{i:04d}.jsonl"), "w", encoding="utf-8")
+            for i in range(partitions)
+        ]
+
+    def add(self, key, source_name, row):
+        partition = zlib.crc32(key.encode("utf-8")) % self.count
+        self.files[partition].write(json.dumps([key, source_name, row], default=str) + "\n")
+
+    def partitions(self):
+        for f in self.files:
+            f.close()
+        for i in range(self.count):
+            path = os.path.join(self.directory, f"part_{i:04d}.jsonl")
+            with open(path, encoding="utf-8") as f:
+                yield (json.loads(line) for line in f)
+            os.remove(path)
+
+    def cleanup(self):
+        for f in self.files:
+            f.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _add_to_table(table, key, source_name, row):
+    per_source = table.setdefault(key, {})
+    if source_name in per_source:
+        _fill_missing(per_source[source_name], row)
+    else:
+        per_source[source_name] = dict(row)
+
+
+def merge_sources(sources, normalize="email", precedence=None,
+                  max_in_memory_keys=DEFAULT_MAX_IN_MEMORY_KEYS, partitions=DEFAULT_PARTITIONS, spill_dir=None):
+    """
+    Full outer join of `sources` (MergeSource list) on their key fields; yields merged records.
+    `normalize` is a KEY_NORMALIZERS name or a callable applied to key values.
+    `precedence` maps a field name to the ordered list of source names to take it from.
+    Rows without a key value cannot be joined and are yielded as they are.
+    """
+    normalize = _normalizer(normalize)
+    source_order = [source.name for source in sources]
+    table = {}
+    spill = None
+    try:
+        for source in sources:
+            for row in source.records:
+                raw_key = row.get(source.key_field)
+                if raw_key in (None, ""):
+                    yield combine_rows({source.name: row}, source_order, precedence)
+                    continue
+                key = normalize(raw_key)
+                if spill is not None:
+                    spill.add(key, source.name, row)
+                    continue
+                _add_to_table(table, key, source.name, row)
+                if len(table) > max_in_memory_keys:
+                    # Too many keys for an in-memory hash join: spill everything and partition from here on
+                    spill = _PartitionSpill(partitions, spill_dir)
+                    for spilled_key, per_source in table.items():
+                        for name, spilled_row in per_source.items():
+                            spill.add(spilled_key, name, spilled_row)
+                    table = {}
+        if spill is None:
+            for per_source in table.values():
+                yield combine_rows(per_source, source_order, precedence)
+            return
+        for partition in spill.partitions():
+            partition_table = {}
+            for key, name, row in partition:
+                _add_to_table(partition_table, key, name, row)
+            for per_source in partition_table.values():
+                yield combine_rows(per_source, source_order, precedence)
+    finally:
+        if spill is not None:
+            spill.cleanup()
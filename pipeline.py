@@ -0,0 +1,288 @@
+"""
+Pipelined read -> transform -> write execution.
+
+Instead of loading the whole source, merging it and then dumping the result,
+records flow through three stages connected by bounded queues:
+
+- a reader thread streams batches of records from the source JSON array or
+  JSON Lines file; a plain JSON Lines file is instead split into byte ranges at
+  line boundaries, which the workers read and parse themselves,
+- transform threads hand whole batches (or ranges) to the sandboxed
+  TransformWorkerPool processes, which merge, validate and encode them in parallel,
+- the writer appends the encoded batches, in source order, to the JSON (or
+  JSON Lines) and CSV outputs.
+
+Disk reads, transformation and writes overlap, and memory is bounded by the
+queue depth times the batch size rather than by the size of the file.
+"""
+import queue
+import threading
+import time
+
+import connectors
+import jsonl_io
+from issue_store import IssueStore
+from migration_engine import (
+    OutputWriter, count_transform_errors, encode_records, iter_records, iter_source, merge_records, validate_data,
+)
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_QUEUE_DEPTH = 4
+_DONE = object()
+
+
+def iter_batches(records, batch_size=DEFAULT_BATCH_SIZE):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _Stage(threading.Thread):
+    """Pipeline thread that records its busy time and hands its first exception to the pipeline."""
+
+    def __init__(self, name, target, errors, stop):
+        super().__init__(name=name, daemon=True)
+        self._target_fn = target
+        self._errors = errors
+        self._stop_event = stop
+        self.busy = 0.0
+
+    def run(self):
+        try:
+            self._target_fn(self)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop_event.set()
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def run_pipeline(batches, transform, write, workers=1, queue_depth=DEFAULT_QUEUE_DEPTH):
+    """
+    Run `transform(batch)` over the `batches` iterable in `workers` threads and
+    `write(result)` every result in the original batch order, with at most
+    `queue_depth` batches waiting between stages. Returns the busy seconds per stage.
+    """
+    read_q = queue.Queue(maxsize=queue_depth)
+    write_q = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    errors = []
+    # Caps batches between the reader and the writer, including results held back for reordering
+    in_flight = threading.Semaphore(2 * queue_depth + workers)
+
+    def read(stage):
+        iterator = iter(batches)
+        seq = 0
+        while True:
+            while not in_flight.acquire(timeout=0.1):
+                if stop.is_set():
+                    return
+            started = time.perf_counter()
+            batch = next(iterator, _DONE)
+            stage.busy += time.perf_counter() - started
+            if batch is _DONE or not _put(read_q, (seq, batch), stop):
+                break
+            seq += 1
+        for _ in range(workers):
+            _put(read_q, _DONE, stop)
+
+    def work(stage):
+        while True:
+            item = _get(read_q, stop)
+            if item is _DONE:
+                break
+            seq, batch = item
+            started = time.perf_counter()
+            result = transform(batch)
+            stage.busy += time.perf_counter() - started
+            if not _put(write_q, (seq, result), stop):
+                break
+        _put(write_q, _DONE, stop)
+
+    reader = _Stage("pipeline-reader", read, errors, stop)
+    transformers = [_Stage(f"pipeline-transform-{i}", work, errors, stop) for i in range(workers)]
+    for stage in [reader] + transformers:
+        stage.start()
+    write_busy = 0.0
+    pending = {}
+    next_seq = 0
+    finished = 0
+    try:
+        while finished < workers and not stop.is_set():
+            item = _get(write_q, stop)
+            if item is _DONE:
+                finished += 1
+                continue
+            seq, result = item
+            pending[seq] = result
+            # Results can arrive out of order from several transform workers
+            while next_seq in pending:
+                started = time.perf_counter()
+                write(pending.pop(next_seq))
+                write_busy += time.perf_counter() - started
+                in_flight.release()
+                next_seq += 1
+    finally:
+        stop.set()
+        for stage in [reader] + transformers:
+            stage.join()
+    if errors:
+        raise errors[0]
+    return {
+        "read": reader.busy,
+        "transform": sum(stage.busy for stage in transformers),
+        "write": write_busy,
+    }
+
+
+def _numbered(batches):
+    """(index of the batch's first row, batch) pairs."""
+    start = 0
+    for batch in batches:
+        yield start, batch
+        start += len(batch)
+
+
+def validate_file(path, fields, types, system_name, batch_size=DEFAULT_BATCH_SIZE, join=None):
+    """Pre-migration validation of a source file (consolidated per `join`, see iter_source), streamed batch by batch."""
+    issues = IssueStore(system_name)
+    for start, batch in _numbered(iter_batches(iter_source(path, join), batch_size)):
+        validate_data(batch, fields, types, system_name, issues=issues, row_offset=start)
+    return issues
+
+
+def process_batch(start, batch, approved, transformations, target_fields, target_defaults, field_schemas,
+                  json_lines=False, sink_rows=False, quarantine=None, pool=None):
+    """
+    The transform stage for one batch: merge with inline schema validation, and output
+    encoding (plus the parameter rows of a database sink with `sink_rows`). Runs inside
+    a TransformWorkerPool worker, so whole batches are processed in parallel processes
+    while the parent only parses and writes. Failed transformations go to `quarantine`
+    (a fresh TransformQuarantine for the batch), which is returned with the results.
+    """
+    issues = IssueStore('Merged Output')
+    records = merge_records(
+        batch, approved, transformations, target_fields, target_defaults, pool=pool,
+        field_schemas=field_schemas, issues=issues, row_offset=start, quarantine=quarantine,
+    )
+    json_text, csv_text = encode_records(records, target_fields, json_lines)
+    rows = connectors.encode_rows(records, target_fields, field_schemas) if sink_rows else None
+    if quarantine is not None:
+        errors = {
+            field: quarantine.failed.get(field, 0) + quarantine.skipped.get(field, 0)
+            for field in quarantine.attempted if quarantine.failed.get(field) or quarantine.skipped.get(field)
+        }
+    else:
+        errors = count_transform_errors(records)
+    return len(records), json_text, csv_text, issues, errors, rows, quarantine
+
+
+def process_range(path, start, end, *job):
+    """process_batch for the lines in byte range [start, end) of a JSON Lines file, parsed in the worker."""
+    return process_batch(0, jsonl_io.read_range(path, start, end), *job)
+
+
+def source_chunks(source_path, batch_size=DEFAULT_BATCH_SIZE, join=None):
+    """
+    Work items of a source file: (start, end) byte ranges of about `batch_size` lines
+    for a plain JSON Lines file, lists of `batch_size` records otherwise. A source
+    consolidated with additional sources (`join`, see iter_source) is always read
+    as record batches of the streamed join.
+    """
+    if join and join.get("additional_sources"):
+        return iter_batches(iter_source(source_path, join), batch_size)
+    if connectors.is_connector(source_path):
+        return connectors.open_source(source_path).iter_chunks(batch_size)
+    if jsonl_io.is_jsonl(source_path) and not jsonl_io.is_compressed(source_path):
+        return jsonl_io.split_ranges(source_path, jsonl_io.average_line_bytes(source_path) * batch_size)
+    return iter_batches(iter_records(source_path), batch_size)
+
+
+def migrate_file(source_path, approved, transformations, target_fields, target_defaults, output_dir="output",
+                 pool=None, batch_size=DEFAULT_BATCH_SIZE, workers=None, queue_depth=DEFAULT_QUEUE_DEPTH,
+                 field_schemas=None, output_format="json", sink=None, quarantine=None, join=None):
+    """
+    Stream `source_path` (consolidated with the additional sources of `join`,
+    see iter_source) through merge, post-migration validation against
+    `field_schemas` and output writing (`output_format`, see OutputWriter), and
+    into `sink` (a connectors.SQLiteSink) when given. With a TransformQuarantine,
+    each batch quarantines its failed transformations under the breakers opened
+    so far, and its dead letters are flushed as the batch is written.
+    With a TransformWorkerPool, batches are processed in its workers (`workers`
+    batches at a time, default: one per pool worker); byte ranges of a plain
+    JSON Lines source are also parsed there.
+    Returns a dict with the row count, the post-migration IssueStore, transformation
+    error counts per field and the busy seconds of each stage.
+    """
+    writer = OutputWriter(output_dir, target_fields, output_format)
+    job = (approved, transformations, target_fields, target_defaults, field_schemas or {}, writer.json_lines,
+           sink is not None)
+
+    def transform(item):
+        # Rows are numbered within the item; the writer shifts them once earlier items are counted
+        is_range = isinstance(item, tuple)
+        batch_quarantine = quarantine.spawn() if quarantine is not None else None
+        if pool is not None:
+            timeout = int(pool.timeout * max(1, -(-(batch_size if is_range else len(item)) // pool.batch_size)))
+            if is_range:
+                ok, result = pool.call("pipeline:process_range", source_path, *item, *job, batch_quarantine,
+                                       timeout=timeout, cpu_seconds=timeout)
+            else:
+                ok, result = pool.call("pipeline:process_batch", 0, item, *job, batch_quarantine,
+                                       timeout=timeout, cpu_seconds=timeout)
+            if ok:
+                return result
+            # The batch hit a limit as a whole: redo it column by column so only the offending values fail
+        batch = jsonl_io.read_range(source_path, *item) if is_range else item
+        return process_batch(0, batch, *job, batch_quarantine, pool=pool)
+
+    post_issues = IssueStore('Merged Output')
+    transform_errors = {}
+
+    def write(result):
+        count, json_text, csv_text, issues, errors, rows, batch_quarantine = result
+        post_issues.merge(issues, row_offset=writer.rows)
+        if quarantine is not None:
+            quarantine.merge(batch_quarantine, row_offset=writer.rows)
+            quarantine.flush()
+        for field, error_count in errors.items():
+            transform_errors[field] = transform_errors.get(field, 0) + error_count
+        writer.write_encoded(count, json_text, csv_text)
+        if sink is not None:
+            sink.write_rows(rows)
+
+    try:
+        stage_seconds = run_pipeline(
+            source_chunks(source_path, batch_size, join), transform, write,
+            workers=workers or (pool.size if pool is not None else 1), queue_depth=queue_depth,
+        )
+    finally:
+        writer.close()
+    return {
+        "rows": writer.rows,
+        "post_issues": post_issues,
+        "transform_errors": transform_errors,
+        "stage_seconds": stage_seconds,
+    }
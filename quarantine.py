@@ -0,0 +1,148 @@
+"""
+Quarantine for values that fail their transformation, with a per-field circuit breaker.
+
+Without a quarantine, a failed value is written into the output as
+"[Transformation Error: ...]". With one, the value is left empty (so the
+target default applies) and routed to a dead-letter file with its row, field,
+original value and error, and per-field counters track attempts and failures.
+Once a field has been attempted on at least `min_rows` values and its error
+rate reaches `max_error_rate`, its breaker opens: the transform is no longer
+applied, the field's remaining values are dead-lettered as skipped and the
+field is flagged in the summary.
+"""
+import json
+
+import pandas as pd
+
+import jsonl_io
+
+DEFAULT_MAX_ERROR_RATE = 0.5
+DEFAULT_MIN_ROWS = 100
+DEAD_LETTER_FILE = "transform_dead_letter.jsonl"
+SKIPPED_ERROR = "not transformed: circuit breaker open"
+SUMMARY_COLUMNS = ["Field", "Attempted", "Failed", "Error Rate", "Skipped", "Breaker"]
+
+
+class TransformQuarantine:
+    """Failed transformations of one batch or a whole run: counters, open breakers and dead letters."""
+
+    def __init__(self, max_error_rate=DEFAULT_MAX_ERROR_RATE, min_rows=DEFAULT_MIN_ROWS, path=None, tripped=None):
+        self.max_error_rate = max_error_rate
+        self.min_rows = min_rows
+        self.path = path
+        self.attempted = {}
+        self.failed = {}
+        self.skipped = {}
+        self.tripped = dict(tripped or {})   # field -> why its breaker opened
+        self.dead_letters = []               # (row, field, original value, error); rows are 1-based
+        self._file = None
+
+    def spawn(self):
+        """An empty quarantine with the same thresholds and open breakers (for one batch in a worker)."""
+        return TransformQuarantine(self.max_error_rate, self.min_rows, tripped=self.tripped)
+
+    def is_open(self, field):
+        return field in self.tripped
+
+    def should_trip(self, field, attempted, failed):
+        """Whether `failed` of `attempted` more values, on top of the field's counts so far, open its breaker."""
+        attempted += self.attempted.get(field, 0)
+        failed += self.failed.get(field, 0)
+        return attempted >= self.min_rows and failed >= self.max_error_rate * attempted
+
+    def record(self, field, attempted, failures=(), skipped=()):
+        """
+        Count a column of `field`: `attempted` values transformed, `failures` [(row, original
+        value, error)] among them, and `skipped` [(row, original value)] not transformed
+        because the breaker was open. Opens the breaker once the error rate is reached.
+        """
+        self.attempted[field] = self.attempted.get(field, 0) + attempted
+        self.failed[field] = self.failed.get(field, 0) + len(failures)
+        self.skipped[field] = self.skipped.get(field, 0) + len(skipped)
+        self.dead_letters.extend((row, field, value, str(error)) for row, value, error in failures)
+        self.dead_letters.extend((row, field, value, SKIPPED_ERROR) for row, value in skipped)
+        if field not in self.tripped and self.should_trip(field, 0, 0):
+            self.tripped[field] = f"{self.failed[field]} of {self.attempted[field]} values failed"
+
+    def merge(self, other, row_offset=0):
+        """Add the counts, open breakers and dead letters of another quarantine, shifting its rows by `row_offset`."""
+        for counts, other_counts in ((self.attempted, other.attempted), (self.failed, other.failed),
+                                     (self.skipped, other.skipped)):
+            for field, count in other_counts.items():
+                counts[field] = counts.get(field, 0) + count
+        for field, reason in other.tripped.items():
+            self.tripped.setdefault(field, reason)
+        self.dead_letters.extend((row + row_offset, field, value, error) for row, field, value, error in other.dead_letters)
+        for field in other.attempted:
+            if field not in self.tripped and self.should_trip(field, 0, 0):
+                self.tripped[field] = f"{self.failed[field]} of {self.attempted[field]} values failed"
+
+    def _letters(self, start=0, row_offset=0, rows=None):
+        """Dead letters from index `start` on, rows shifted by `row_offset` or renumbered through the dict `rows`."""
+        for row, field, value, error in self.dead_letters[start:]:
+            yield (rows[row] if rows is not None else row + row_offset), field, value, error
+
+    def rows_by_field(self, start=0, row_offset=0, rows=None):
+        """{field: set of rows} of the dead letters from index `start` on (rows as in `_letters`)."""
+        result = {}
+        for row, field, _, _ in self._letters(start, row_offset, rows):
+            result.setdefault(field, set()).add(row)
+        return result
+
+    def add_issues(self, issues, start=0, row_offset=0, rows=None):
+        """
+        Report the dead letters from index `start` on in an IssueStore, one issue per field
+        and outcome (rows shifted by `row_offset` or renumbered through the dict `rows`).
+        Letters renumbered onto the same row and field (merged duplicates) count once.
+        """
+        groups = {}
+        seen = set()
+        for row, field, value, error in self._letters(start, row_offset, rows):
+            if (row, field) in seen:
+                continue
+            seen.add((row, field))
+            issue = (f"Transformation skipped for '{field}' (circuit breaker open)" if error == SKIPPED_ERROR
+                     else f"Transformation failed for '{field}'")
+            group_rows, values = groups.setdefault((field, issue), ([], []))
+            group_rows.append(row)
+            values.append(value)
+        for (field, issue), (group_rows, values) in groups.items():
+            issues.add_rows(field, issue, group_rows, values)
+
+    def total(self):
+        """Values that were not transformed: failed or skipped."""
+        return sum(self.failed.values()) + sum(self.skipped.values())
+
+    def flush(self):
+        """Append the buffered dead letters to the JSON Lines file at `path` (created on the first flush)."""
+        if self.path is None:
+            return
+        if self._file is None:
+            self._file = jsonl_io.open_text(self.path, "w")
+        for row, field, value, error in self.dead_letters:
+            self._file.write(json.dumps(
+                {"row": row, "field": field, "value": value, "error": error}, default=str, ensure_ascii=False,
+            ) + "\n")
+        self.dead_letters = []
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def summary_df(self):
+        """One row per field that had a transformation applied, flagged ones first."""
+        fields = sorted(set(self.attempted) | set(self.tripped), key=lambda f: (f not in self.tripped, f))
+        records = [
+            {
+                "Field": field,
+                "Attempted": self.attempted.get(field, 0),
+                "Failed": self.failed.get(field, 0),
+                "Error Rate": round(self.failed.get(field, 0) / self.attempted[field], 4) if self.attempted.get(field) else 0.0,
+                "Skipped": self.skipped.get(field, 0),
+                "Breaker": f"open: {self.tripped[field]}" if field in self.tripped else "closed",
+            }
+            for field in fields
+        ]
+        return pd.DataFrame(records, columns=SUMMARY_COLUMNS)
@@ -0,0 +1,125 @@
+"""
+Schema-driven validation of merged output.
+
+Validators are compiled once from each target field's `data_type`, `required`
+and `format` in schemas/target_schema.json and run inline in the merge, on
+each finished output column right after defaults are filled. Every distinct
+value of a column is checked only once, so the post-migration report costs no
+extra pass over the output and checks the target contract rather than
+consistency with the first row.
+"""
+import re
+from datetime import datetime
+
+TRANSFORM_ERROR_PREFIX = "[Transformation Error"
+NUMBER_PATTERN = re.compile(r"[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?")
+BOOLEAN_STRINGS = {"true", "false"}
+
+
+def _is_number(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    return isinstance(value, str) and NUMBER_PATTERN.fullmatch(value.strip()) is not None
+
+
+def _is_boolean(value):
+    return isinstance(value, bool) or (isinstance(value, str) and value.strip().lower() in BOOLEAN_STRINGS)
+
+
+def _is_string(value):
+    return isinstance(value, str)
+
+
+def _is_array(value):
+    return isinstance(value, list)
+
+
+def _is_object(value):
+    return isinstance(value, dict)
+
+
+# Text forms of numbers and booleans are accepted: they convert losslessly and CSV output is text anyway
+TYPE_CHECKS = {
+    "string": _is_string,
+    "date": _is_string,
+    "number": _is_number,
+    "boolean": _is_boolean,
+    "array": _is_array,
+    "object": _is_object,
+}
+
+
+class FieldValidator:
+    """Checks the values of one target field against its schema definition."""
+
+    def __init__(self, field_schema):
+        self.field = field_schema["name"]
+        self.data_type = field_schema.get("data_type")
+        self.required = bool(field_schema.get("required"))
+        self.format = field_schema.get("format")
+        self.default = field_schema.get("default_value")
+        self.type_check = TYPE_CHECKS.get(self.data_type)
+        self.pattern = re.compile(self.format) if self.format and self.data_type != "date" else None
+        self.missing_issue = f"Missing required value for '{self.field}'"
+        self.error_issue = f"Transformation failed for '{self.field}'"
+        self.type_issue = f"Type mismatch in '{self.field}' (expected {self.data_type})"
+        self.format_issue = f"Format mismatch in '{self.field}' (expected {self.format})"
+
+    def _matches_format(self, value):
+        if self.data_type == "date":
+            try:
+                datetime.strptime(value, self.format)
+                return True
+            except ValueError:
+                return False
+        return self.pattern.fullmatch(str(value)) is not None
+
+    def problem(self, value):
+        """The issue with one value, or None when it satisfies the schema."""
+        if value is None or value == "":
+            return self.missing_issue if self.required else None
+        if self.default is not None and value == self.default:
+            # The schema's own default is part of the contract
+            return None
+        if isinstance(value, str) and value.startswith(TRANSFORM_ERROR_PREFIX):
+            return self.error_issue
+        if self.type_check is not None and not self.type_check(value):
+            return self.type_issue
+        if self.format and not self._matches_format(value):
+            return self.format_issue
+        return None
+
+    def check(self, values, issues, row_offset=0, skip=()):
+        """
+        Add the issues of a column of values (rows row_offset+1...) to an IssueStore,
+        leaving out the rows in `skip` (e.g. quarantined values, reported already).
+        """
+        cache = {}
+        failures = {}
+        for i, value in enumerate(values, row_offset + 1):
+            if skip and i in skip:
+                continue
+            try:
+                # Keyed by type too, so 1, 1.0, True and "1" are checked separately
+                key = (value.__class__, value)
+                problem = cache.get(key, cache)
+                if problem is cache:
+                    problem = cache[key] = self.problem(value)
+            except TypeError:
+                problem = self.problem(value)
+            if problem is not None:
+                rows, examples = failures.setdefault(problem, ([], []))
+                rows.append(i)
+                if len(examples) < issues.max_examples:
+                    examples.append(value)
+        for problem, (rows, examples) in failures.items():
+            issues.add_rows(self.field, problem, rows, examples)
+        return issues
+
+
+def compile_validators(field_schemas, fields=None):
+    """{field: FieldValidator}; fields without a schema entry are only checked for failed transformations."""
+    fields = list(fields) if fields is not None else list(field_schemas)
+    return {field: FieldValidator(field_schemas.get(field, {"name": field})) for field in fields}
@@ -0,0 +1,138 @@
+import random
+import types
+
+import pytest
+
+import api_clients
+from api_clients import ApiClients, TokenBucket, backoff_delay
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping only advances the clock."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        # Like a real sleep, always let some time pass
+        self.now += max(seconds, 1e-6)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(api_clients, "time", clock)
+    return clock
+
+
+class ApiError(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.response = types.SimpleNamespace(headers={"retry-after": str(retry_after)} if retry_after else {})
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+def fake_openai(errors):
+    """OpenAI stand-in whose embeddings endpoint raises `errors` in turn, then answers."""
+    calls = []
+
+    def create(input, model):
+        calls.append(input)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return types.SimpleNamespace(data=[types.SimpleNamespace(index=i, embedding=[float(i)])
+                                           for i in reversed(range(len(input)))])
+
+    return types.SimpleNamespace(embeddings=types.SimpleNamespace(create=create)), calls
+
+
+def test_transient_errors_are_retried_with_capped_backoff(clock, monkeypatch):
+    monkeypatch.setattr(api_clients.random, "uniform", lambda low, high: high)
+    client, calls = fake_openai([ApiError(503), APIConnectionError(), ApiError(500)])
+    clients = ApiClients(openai_client=client)
+    assert clients.embed(["a", "b"]) == [[0.0], [1.0]]
+    assert len(calls) == 4
+    assert clock.sleeps == [0.5, 1.0, 2.0]
+    assert clients.stats()["openai.embeddings"] == {
+        "requests": 4, "retries": 3, "errors": 3, "throttled_s": 0.0, "avg_latency_ms": 0.0, "max_latency_ms": 0.0,
+    }
+
+
+@pytest.mark.parametrize("status", [400, 401, 404, 409])
+def test_client_errors_are_not_retried(clock, status):
+    client, calls = fake_openai([ApiError(status)])
+    with pytest.raises(ApiError):
+        ApiClients(openai_client=client).embed(["a"])
+    assert len(calls) == 1 and clock.sleeps == []
+
+
+def test_retries_stop_after_max_retries(clock):
+    client, calls = fake_openai([ApiError(502)] * 10)
+    clients = ApiClients(openai_client=client, max_retries=2)
+    with pytest.raises(ApiError):
+        clients.embed(["a"])
+    assert len(calls) == 3
+    assert clients.stats()["openai.embeddings"]["retries"] == 2
+
+
+def test_retry_after_backs_off_once_through_the_shared_limiter(clock):
+    client, calls = fake_openai([ApiError(429, retry_after=4)])
+    clients = ApiClients(openai_client=client, rates={"openai.embeddings": (10.0, 10)})
+    clients.embed(["a"])
+    # The drained bucket holds the retry back for Retry-After (plus one token), not twice that
+    assert 4.0 <= clock.now <= 4.2
+    assert clients.stats()["openai.embeddings"]["throttled_s"] == pytest.approx(clock.now)
+    # Other callers of the endpoint waited out the same penalty and now proceed at the normal rate
+    started = clock.now
+    clients.limiters["openai.embeddings"].acquire()
+    assert clock.now - started == pytest.approx(0.1, abs=1e-3)
+
+
+def test_retry_after_without_a_limiter_sleeps_the_longer_of_both(clock, monkeypatch):
+    monkeypatch.setattr(api_clients.random, "uniform", lambda low, high: high)
+    client, calls = fake_openai([ApiError(429, retry_after=3), ApiError(429, retry_after=0.1)])
+    clients = ApiClients(openai_client=client)
+    clients.limiters.pop("openai.embeddings")
+    clients.embed(["a"])
+    assert clock.sleeps == [3.0, 1.0]
+
+
+def test_backoff_is_fully_jittered_under_the_cap():
+    random.seed(7)
+    for attempt in range(10):
+        delays = [backoff_delay(attempt) for _ in range(200)]
+        bound = min(api_clients.BACKOFF_MAX, api_clients.BACKOFF_BASE * 2 ** attempt)
+        assert all(0 <= delay <= bound for delay in delays)
+        # Spread over the whole range rather than clustered at the bound
+        assert min(delays) < bound * 0.1 and max(delays) > bound * 0.9
+
+
+def test_token_bucket_allows_a_burst_then_the_rate(clock):
+    bucket = TokenBucket(rate=5, capacity=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert clock.now == 0.0
+    for _ in range(10):
+        bucket.acquire()
+    assert clock.now == pytest.approx(2.0)
+    clock.now += 60
+    # Idle time refills at most `capacity` tokens
+    for _ in range(3):
+        assert bucket.acquire() == 0.0
+    assert bucket.acquire() == pytest.approx(0.2)
+
+
+def test_penalize_drains_the_bucket(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+    bucket.penalize(5)
+    assert bucket.acquire() == pytest.approx(5.5)
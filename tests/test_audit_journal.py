@@ -0,0 +1,100 @@
+import json
+import threading
+
+import audit_journal
+from audit_journal import AuditJournal, compact_audit_log, read_events
+
+
+def lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_events_are_buffered_until_flush(tmp_path):
+    path = str(tmp_path / "audit.jsonl")
+    journal = AuditJournal(path, flush_every=3)
+    journal.append({"event": "suggestion", "n": 1})
+    journal.append({"event": "suggestion", "n": 2})
+    assert lines(path) == []
+    journal.append({"event": "suggestion", "n": 3})
+    assert [event["n"] for event in lines(path)] == [1, 2, 3]
+    journal.append({"event": "suggestion", "n": 4})
+    journal.close()
+    events = lines(path)
+    assert [event["n"] for event in events] == [1, 2, 3, 4]
+    assert all("timestamp" in event for event in events)
+
+
+def test_explicit_timestamp_is_kept(tmp_path):
+    path = str(tmp_path / "audit.jsonl")
+    journal = AuditJournal(path)
+    journal.append({"event": "decision", "timestamp": "2024-01-01T00:00:00"})
+    journal.close()
+    assert lines(path)[0]["timestamp"] == "2024-01-01T00:00:00"
+
+
+def test_rotation_keeps_backups_and_replays_in_order(tmp_path):
+    path = str(tmp_path / "audit.jsonl")
+    journal = AuditJournal(path, flush_every=1, max_bytes=200, backup_count=2)
+    for n in range(40):
+        journal.append({"event": "suggestion", "n": n, "pad": "x" * 40})
+    journal.close()
+    assert (tmp_path / "audit.jsonl.1").exists() and (tmp_path / "audit.jsonl.2").exists()
+    assert not (tmp_path / "audit.jsonl.3").exists()
+    replayed = [event["n"] for event in read_events(path, backup_count=2)]
+    # The oldest backups are dropped, the rest is replayed oldest first
+    assert replayed == sorted(replayed) and replayed[-1] == 39 and replayed[0] > 0
+
+
+def test_concurrent_appends_are_not_interleaved(tmp_path):
+    path = str(tmp_path / "audit.jsonl")
+    journal = AuditJournal(path, flush_every=7)
+
+    def writer(thread):
+        for n in range(200):
+            journal.append({"event": "suggestion", "thread": thread, "n": n})
+
+    threads = [threading.Thread(target=writer, args=(t,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    journal.close()
+    events = lines(path)
+    assert len(events) == 800
+    for t in range(4):
+        assert [event["n"] for event in events if event["thread"] == t] == list(range(200))
+
+
+def suggestion(session, target, source):
+    return {"event": "suggestion", "session": session, "Target Field": target, "Source Field": source,
+            "Mapping Method": "AI", "AI Score": 0.9, "Value Overlap": None, "Status": "✅ Strong Match",
+            "User Decision": "Approve"}
+
+
+def test_compaction_applies_the_latest_decision_per_session(tmp_path):
+    path = str(tmp_path / "audit.jsonl")
+    csv_path = str(tmp_path / "audit.csv")
+    journal = AuditJournal(path)
+    journal.append(suggestion("s1", "email", "email"))
+    journal.append(suggestion("s1", "phone", "tel"))
+    journal.append(suggestion("s2", "email", "mail"))
+    journal.append({"event": "decision", "session": "s1", "Target Field": "phone", "User Decision": "Moderate"})
+    journal.append({"event": "decision", "session": "s1", "Target Field": "phone", "User Decision": "Reject"})
+    # A decision without a suggestion in its session is ignored
+    journal.append({"event": "decision", "session": "s2", "Target Field": "phone", "User Decision": "Approve"})
+    journal.close()
+
+    view = compact_audit_log(path, csv_path=csv_path)
+    assert list(view.columns) == audit_journal.AUDIT_COLUMNS + ["Decision Time"]
+    assert list(zip(view["Target Field"], view["User Decision"])) == [
+        ("email", "Approve"), ("phone", "Reject"), ("email", "Approve"),
+    ]
+    assert (tmp_path / "audit.csv").exists()
+    only_s2 = compact_audit_log(path, session="s2")
+    assert list(only_s2["Source Field"]) == ["mail"]
+
+
+def test_empty_journal_compacts_to_an_empty_view(tmp_path):
+    view = compact_audit_log(str(tmp_path / "missing.jsonl"))
+    assert view.empty and list(view.columns) == audit_journal.AUDIT_COLUMNS + ["Decision Time"]
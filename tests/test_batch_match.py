@@ -0,0 +1,103 @@
+import gzip
+import json
+
+import pandas as pd
+import pytest
+
+import batch_match
+import embeddings
+
+CUSTOMER = {
+    "name": "Customer", "version": "1.0",
+    "fields": [
+        {"name": "email", "data_type": "string", "required": True, "description": "Email address"},
+        {"name": "loyalty_points", "data_type": "number", "required": False, "description": "Points balance"},
+    ],
+}
+INVOICE = {
+    "name": "Invoice", "version": "1.0",
+    "fields": [
+        {"name": "invoice_number", "data_type": "string", "required": True, "description": "Invoice id"},
+        {"name": "amount_due", "data_type": "number", "required": True, "description": "Amount"},
+        {"name": "currency", "data_type": "string", "required": False, "description": "Currency code"},
+    ],
+}
+
+
+class LetterProvider(embeddings.EmbeddingProvider):
+    """Offline letter-count embeddings that count the texts embedded."""
+
+    name = "local:letters"
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed(self, texts):
+        texts = list(texts)
+        self.embedded += len(texts)
+        return [[text.lower().count(chr(c)) + 0.01 for c in range(ord("a"), ord("z") + 1)] for text in texts]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Workers read ./reference_data and ./output/mapping_memory.json; neither exists here
+    monkeypatch.chdir(tmp_path)
+    schemas = tmp_path / "schemas"
+    schemas.mkdir()
+    (schemas / "customer.json").write_text(json.dumps(CUSTOMER))
+    (schemas / "invoice.json").write_text(json.dumps(INVOICE))
+    (schemas / "notes.json").write_text(json.dumps({"not": "a schema"}))
+    sources = tmp_path / "sources"
+    sources.mkdir()
+    (sources / "crm.json").write_text(json.dumps([{"email": "a@x.com", "loyalty_points": 10}] * 5))
+    with gzip.open(sources / "billing.jsonl.gz", "wt") as f:
+        f.writelines(json.dumps({"invoice_number": f"I{i}", "amount_due": i, "currency": "EUR"}) + "\n"
+                     for i in range(5))
+    (sources / "broken.json").write_text("[{")
+    return tmp_path
+
+
+def test_catalog_skips_files_that_are_not_schemas(workdir):
+    catalog = batch_match.load_catalog(["schemas"])
+    assert [name for name, _ in catalog] == ["customer", "invoice"]
+    assert batch_match.load_catalog(["schemas/invoice.json"]) == [("invoice", INVOICE)]
+
+
+def test_source_names_drop_compression_suffixes():
+    assert batch_match.source_name("exports/billing.jsonl.gz") == "billing"
+    assert batch_match.source_name("crm.json") == "crm"
+
+
+def test_schema_fit_weights_required_coverage():
+    matches = [{"Target Field": "invoice_number", "Status": "✅ Strong Match"},
+               {"Target Field": "amount_due", "Status": "❌ No Match"},
+               {"Target Field": "currency", "Status": "🟡 Moderate Match"}]
+    audit = [{"AI Score": 1.2}, {"AI Score": 0.3}, {"AI Score": 0.75}]
+    fit = batch_match.schema_fit(INVOICE, matches, audit)
+    assert fit == {"Fit": round(0.7 * (1.0 + 0.75) / 3 + 0.3 * 0.5, 4), "Matched Fields": 2, "Target Fields": 3,
+                   "Required Matched": 1, "Required Fields": 2}
+
+
+def test_schema_candidates_reuse_the_store(workdir):
+    provider = LetterProvider()
+    candidates = batch_match.schema_candidates("customer", CUSTOMER, provider, store_dir="stores")
+    assert list(candidates) == ["email", "loyalty_points"]
+    assert candidates["email"][0]["metadata"]["field_name"] == "email"
+    # Schema fields are embedded once; later runs only embed the field queries
+    assert provider.embedded == 4
+    batch_match.schema_candidates("customer", CUSTOMER, provider, store_dir="stores")
+    assert provider.embedded == 6
+
+
+def test_run_batch_ranks_schemas_per_source_and_reports_failures(workdir):
+    sources = ["sources/crm.json", "sources/billing.jsonl.gz", "sources/broken.json"]
+    summary = batch_match.run_batch(sources, batch_match.load_catalog(["schemas"]), LetterProvider(),
+                                    output_dir="out", store_dir="stores", workers=1, timeout=120)
+    best = summary[summary["Rank"] == 1].set_index("Source")["Target Schema"].to_dict()
+    assert best == {"crm": "customer", "billing": "invoice"}
+    assert summary.loc[summary["Source"] == "broken", "Error"].iloc[0]
+    assert pd.read_csv("out/best_target_schemas.csv").shape == summary.shape
+    report = pd.read_csv("out/billing_mappings.csv")
+    assert report["Target Schema"].iloc[0] == "invoice" and report["Schema Rank"].iloc[0] == 1
+    invoice = report[report["Target Schema"] == "invoice"].set_index("Target Field")["Source Field"].to_dict()
+    assert invoice == {"invoice_number": "invoice_number", "amount_due": "amount_due", "currency": "currency"}
@@ -0,0 +1,146 @@
+import sqlite3
+
+import pytest
+
+import connectors
+import migration_engine
+from connectors import CSVSource, SQLiteSink, SQLiteSource
+
+FIELD_SCHEMAS = {
+    "customer_id": {"data_type": "string"},
+    "age": {"data_type": "number"},
+    "is_active": {"data_type": "boolean"},
+    "tags": {"data_type": "array"},
+    "address": {"data_type": "object"},
+}
+FIELDS = list(FIELD_SCHEMAS)
+
+
+def test_specs_are_routed_to_their_connectors(tmp_path):
+    assert connectors.parse_sqlite("sqlite:///data/legacy.db?table=crm") == ("data/legacy.db", "crm", None)
+    assert connectors.parse_sqlite("sqlite:////abs/x.db?query=SELECT a FROM t WHERE b = 1") == (
+        "/abs/x.db", None, "SELECT a FROM t WHERE b = 1")
+    assert connectors.source_file("sqlite:///legacy.db?table=crm") == "legacy.db"
+    assert connectors.is_connector("Export.TSV") and not connectors.is_connector("export.jsonl")
+    with pytest.raises(ValueError, match="No connector"):
+        connectors.open_source("export.json")
+    with pytest.raises(ValueError, match="needs \\?table="):
+        connectors.open_source(f"sqlite:///{tmp_path}/x.db")
+    with pytest.raises(FileNotFoundError):
+        connectors.open_source(f"sqlite:///{tmp_path}/missing.db?table=t")
+
+
+def test_csv_rows_are_streamed_in_chunks(tmp_path):
+    path = tmp_path / "export.csv"
+    lines = ["id,name,note"] + [f'{i},"Lee, {i}",' for i in range(7)] + ["7,x,y,extra"]
+    # A byte order mark (as Excel writes) is not part of the first column name
+    path.write_text("\ufeff" + "\n".join(lines) + "\n", encoding="utf-8")
+    source = connectors.open_source(str(path))
+    assert isinstance(source, CSVSource)
+    chunks = list(source.iter_chunks(chunk_rows=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 2]
+    assert chunks[0][1] == {"id": "1", "name": "Lee, 1", "note": None}
+    # Cells beyond the header are dropped
+    assert chunks[-1][-1] == {"id": "7", "name": "x", "note": "y"}
+
+
+def test_tsv_files_use_tabs(tmp_path):
+    path = tmp_path / "export.tsv"
+    path.write_text("a\tb\n1\t2,3\n")
+    assert list(CSVSource(str(path)).iter_records()) == [{"a": "1", "b": "2,3"}]
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE "crm ""main""" (id INTEGER, email TEXT)')
+    conn.executemany('INSERT INTO "crm ""main""" VALUES (?, ?)', [(i, f"u{i}@x.com") for i in range(10)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_sqlite_tables_and_queries_are_fetched_in_chunks(legacy_db):
+    source = connectors.open_source(f'sqlite:///{legacy_db}?table=crm "main"')
+    assert isinstance(source, SQLiteSource)
+    chunks = list(source.iter_chunks(chunk_rows=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert chunks[0][0] == {"id": 0, "email": "u0@x.com"}
+    query = SQLiteSource(legacy_db, query='SELECT email AS mail FROM "crm ""main""" WHERE id >= 8')
+    assert list(query.iter_records()) == [{"mail": "u8@x.com"}, {"mail": "u9@x.com"}]
+    assert migration_engine.load_json(f"sqlite:///{legacy_db}?query=SELECT id FROM \"crm \"\"main\"\"\" LIMIT 2") == [
+        {"id": 0}, {"id": 1}]
+
+
+def test_sqlite_sources_are_read_only(legacy_db):
+    source = SQLiteSource(legacy_db, query='DELETE FROM "crm ""main"""')
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        list(source.iter_records())
+
+
+def test_values_are_encoded_per_schema_type():
+    records = [
+        {"customer_id": "C1", "age": 31, "is_active": "Yes", "tags": ["a", "b"], "address": {"city": "Oslo"}},
+        {"customer_id": None, "age": "n/a", "is_active": True, "tags": None},
+        {"customer_id": 7, "age": 1.5, "is_active": "maybe", "tags": [], "address": {}},
+    ]
+    assert connectors.encode_rows(records, FIELDS, FIELD_SCHEMAS) == [
+        ("C1", 31, 1, '["a", "b"]', '{"city": "Oslo"}'),
+        (None, "n/a", 1, None, None),
+        (7, 1.5, "maybe", "[]", "{}"),
+    ]
+    ddl = connectors.create_table_sql("out", FIELDS, FIELD_SCHEMAS)
+    assert '"age" NUMERIC' in ddl and '"is_active" INTEGER' in ddl and '"tags" TEXT' in ddl
+
+
+def table_rows(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f'SELECT * FROM "{table}" ORDER BY rowid').fetchall()
+    finally:
+        conn.close()
+
+
+def test_replacing_sink_swaps_the_table_in_on_close(tmp_path):
+    path = str(tmp_path / "target" / "out.db")
+    first = SQLiteSink(f"sqlite:///{path}?table=customers", FIELDS, FIELD_SCHEMAS)
+    first.write([{"customer_id": "old", "is_active": "no"}])
+    first.close()
+    assert table_rows(path, "customers") == [("old", None, 0, None, None)]
+
+    second = SQLiteSink(f"sqlite:///{path}?table=customers", FIELDS, FIELD_SCHEMAS, commit_rows=2)
+    for i in range(5):
+        second.write([{"customer_id": f"C{i}", "age": i}])
+    # Committed batches land in the staging table; readers still see the previous contents
+    assert table_rows(path, "customers") == [("old", None, 0, None, None)]
+    assert len(table_rows(path, "customers" + connectors.STAGING_SUFFIX)) == 4
+    second.close()
+    assert [row[:2] for row in table_rows(path, "customers")] == [(f"C{i}", i) for i in range(5)]
+    assert second.rows == 5 and "5 rows into" in second.summary()
+
+
+def test_failed_replace_keeps_the_previous_table(tmp_path):
+    path = str(tmp_path / "out.db")
+    sink = SQLiteSink(path, FIELDS, FIELD_SCHEMAS)
+    sink.write([{"customer_id": "kept"}])
+    sink.close()
+    failed = SQLiteSink(path, FIELDS, FIELD_SCHEMAS, commit_rows=1)
+    failed.write([{"customer_id": "partial"}])
+    failed.conn.close()
+    assert table_rows(path, "normalized_output") == [("kept", None, None, None, None)]
+    # The next run drops the leftover staging table
+    retry = SQLiteSink(path, FIELDS, FIELD_SCHEMAS)
+    retry.write([{"customer_id": "new"}])
+    retry.close()
+    assert table_rows(path, "normalized_output") == [("new", None, None, None, None)]
+
+
+def test_appending_sink_adds_to_the_table(tmp_path):
+    path = str(tmp_path / "out.db")
+    for name in ("a", "b"):
+        sink = SQLiteSink(path, FIELDS, FIELD_SCHEMAS, mode="append")
+        migration_engine.write_outputs([{field: None for field in FIELDS} | {"customer_id": name}],
+                                       str(tmp_path / "output"), sink=sink)
+        sink.close()
+    assert [row[0] for row in table_rows(path, "normalized_output")] == ["a", "b"]
@@ -0,0 +1,108 @@
+import json
+import random
+from collections import Counter
+
+import pytest
+
+import data_profiling
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("jane@example.com", "email"), ("+4412345678901", "phone"), ("03/04/2024", "date"),
+    ("AB12", "id"), ("$12.50", "amount"), ("12", "amount"), ("hello", "text"), (True, "text"),
+])
+def test_get_data_type(value, expected):
+    assert data_profiling.get_data_type(value) == expected
+
+
+def test_hll_add_many_matches_add():
+    one, many = data_profiling.HyperLogLog(), data_profiling.HyperLogLog()
+    values = [f"value {i}" for i in range(20_000)]
+    for value in values:
+        one.add(value)
+    many.add_many(values)
+    assert one.registers == many.registers
+    assert abs(many.count() - 20_000) < 20_000 * 0.05
+
+
+def test_reservoir_is_uniform():
+    hits = Counter()
+    for seed in range(2000):
+        reservoir = data_profiling.Reservoir(5, random.Random(seed))
+        for start in range(0, 100, 7):
+            reservoir.extend(list(range(start, min(start + 7, 100))))
+        assert reservoir.seen == 100 and len(set(reservoir.items)) == 5
+        hits.update(reservoir.items)
+    # Each item is kept with probability 5/100, i.e. about 100 times in 2000 runs
+    assert min(hits.values()) > 60 and max(hits.values()) < 145
+
+
+def test_profile_counts_columns_that_appear_later_as_null():
+    records = [{"a": 1}] * 3 + [{"a": 2, "b": "x"}]
+    profile = data_profiling.profile_records(records)
+    assert profile["fields"] == ["a", "b"]
+    assert profile["columns"]["b"]["count"] == 4 and profile["columns"]["b"]["null_count"] == 3
+    assert profile["columns"]["a"]["top_values"] == [("1", 3), ("2", 1)]
+    assert profile["columns"]["a"]["distinct_estimate"] == 2
+
+
+def test_profile_is_the_same_across_chunks(monkeypatch):
+    records = [{"status": random.Random(i).choice("abc"), "id": f"ID{i:05d}"} for i in range(5000)]
+    whole = data_profiling.profile_records(records)
+    monkeypatch.setattr(data_profiling, "CHUNK_ROWS", 37)
+    chunked = data_profiling.profile_records(records)
+    for field in ("status", "id"):
+        for key in ("count", "type_counts", "distinct_estimate", "min_length", "max_length", "minhash"):
+            assert whole["columns"][field][key] == chunked["columns"][field][key]
+
+
+def test_streams_are_sampled():
+    records = ({"id": i} for i in range(1000))
+    profile = data_profiling.profile_records(records, max_rows=100)
+    assert profile["sampled"] and profile["row_count"] == 1000 and profile["profiled_rows"] == 100
+    short = data_profiling.profile_records(iter([{"id": 1}, {"id": 2}]), max_rows=100)
+    assert not short["sampled"] and short["row_count"] == 2
+
+
+def test_signatures_are_optional():
+    records = [{"a": "x"}, {"a": "y"}]
+    assert data_profiling.profile_records(records)["columns"]["a"]["minhash"]
+    assert data_profiling.profile_records(records, signatures=False)["columns"]["a"]["minhash"] is None
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_profiling, "_memory_cache", data_profiling.OrderedDict())
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps([{"a": "x"}, {"a": "y"}]))
+    return str(path)
+
+
+def test_cached_profile_with_signatures_serves_requests_without(source, tmp_path):
+    cache_dir = str(tmp_path / "profiles")
+    unsigned = data_profiling.load_or_build_profile(source, cache_dir=cache_dir, signatures=False)
+    assert unsigned["columns"]["a"]["minhash"] is None
+    signed = data_profiling.load_or_build_profile(source, cache_dir=cache_dir)
+    assert signed["columns"]["a"]["minhash"]
+    data_profiling._memory_cache.clear()
+    reread = data_profiling.load_or_build_profile(source, cache_dir=cache_dir, signatures=False)
+    assert reread["columns"]["a"]["minhash"] == signed["columns"]["a"]["minhash"]
+
+
+def test_truncated_cache_file_is_rebuilt(source, tmp_path):
+    cache_dir = tmp_path / "profiles"
+    data_profiling.load_or_build_profile(source, cache_dir=str(cache_dir))
+    [cache_file] = cache_dir.iterdir()
+    cache_file.write_text('{"row_count": ')
+    data_profiling._memory_cache.clear()
+    assert data_profiling.load_or_build_profile(source, cache_dir=str(cache_dir))["row_count"] == 2
+    assert not list(cache_dir.glob("*.tmp"))
+
+
+def test_memory_cache_is_bounded(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(data_profiling, "MEMORY_CACHE_SIZE", 2)
+    for i in range(4):
+        path = tmp_path / f"data{i}.json"
+        path.write_text(json.dumps([{"a": i}]))
+        data_profiling.load_or_build_profile(str(path), cache_dir=str(tmp_path / "profiles"))
+    assert len(data_profiling._memory_cache) == 2
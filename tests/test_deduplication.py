@@ -0,0 +1,85 @@
+import random
+
+import deduplication
+import migration_engine
+from quarantine import TransformQuarantine
+from typed_table import TypedTable
+
+
+def person(first, last, email="", phone=""):
+    return {"first_name": first, "last_name": last, "email": email, "phone": phone}
+
+
+def test_name_only_rows_do_not_chain_different_people():
+    records = [
+        person("John", "Smith", "jsmith99@other.com"),
+        person("John", "Smith"),
+        person("John", "Smith", "john.smith@x.com"),
+    ]
+    survivors, clusters = deduplication.deduplicate(records)
+    assert clusters == []
+    assert survivors == records
+
+
+def test_names_alone_never_match():
+    assert deduplication.score_pair(person("John", "Smith"), person("John", "Smith")) == 0.0
+    # Identical names with disagreeing phones: the strong identifier caps the score
+    score = deduplication.score_pair(person("John", "Smith", phone="555 123 4567"),
+                                     person("John", "Smith", phone="555 987 0011"))
+    assert score < deduplication.DEFAULT_THRESHOLD
+
+
+def test_duplicates_with_a_shared_identifier_are_merged():
+    records = [
+        person("Jon", "Smith", "John.Smith@x.com"),
+        person("Ann", "Lee", "ann@y.org", "555-000-1111"),
+        person("John", "Smith", "john.smith@x.com ", "555 123 4567"),
+        person("Anne", "Lee", "", "5550001111"),
+    ]
+    survivors, clusters = deduplication.deduplicate(records)
+    assert [cluster["Rows"] for cluster in clusters] == [[1, 3], [2, 4]]
+    assert survivors[0]["phone"] == "555 123 4567"
+    assert deduplication.survivor_rows(4, clusters) == {1: 1, 2: 2, 3: 1, 4: 2}
+
+
+def test_oversized_blocks_still_find_neighbouring_duplicates():
+    rng = random.Random(7)
+    word = lambda: "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(8))
+    # Soundex (Smith + J) and domain (gmail.com + smi) blocks far larger than MAX_BLOCK_SIZE;
+    # the duplicate has a typo in its email, so it shares no exact-email block
+    records = [person("J" + word(), "Smith", f"{word()}@gmail.com") for _ in range(deduplication.MAX_BLOCK_SIZE * 5)]
+    records.append(dict(records[40], first_name=records[40]["first_name"][:-1], email="x" + records[40]["email"][1:]))
+    _, clusters = deduplication.deduplicate(records)
+    assert [cluster["Rows"] for cluster in clusters] == [[41, len(records)]]
+
+
+def test_early_exit_does_not_change_accepted_scores():
+    a = person("Maria", "Garcia", "maria.garcia@mail.com", "555 222 3333")
+    b = person("Mariа", "Garcia", "maria.garcia@mail.con", "555 222 3333")
+    scorer = deduplication._PairScorer()
+    scorer.set_anchor(deduplication.identity(a))
+    full = scorer.score(deduplication.identity(b))
+    assert full >= deduplication.DEFAULT_THRESHOLD
+    assert scorer.score(deduplication.identity(b), deduplication.DEFAULT_THRESHOLD) == full
+
+
+def test_deduplicated_output_is_revalidated_with_quarantined_rows_renumbered():
+    records = [
+        dict(person("Jon", "Smith", "John.Smith@x.com"), age=None),
+        dict(person("Ann", "Lee", "", "555-000-1111"), age="n/a"),
+        dict(person("John", "Smith", "john.smith@x.com ", "555 123 4567"), age=None),
+        dict(person("Anne", "Lee", "", "5550001111"), age=40),
+    ]
+    schemas = {"email": {"name": "email", "data_type": "string", "required": True},
+               "age": {"name": "age", "data_type": "number"}}
+    quarantine = TransformQuarantine()
+    quarantine.record("age", 4, failures=[(1, "x", "bad"), (3, "y", "bad")])
+    table = TypedTable.from_records(records, list(records[0]), schemas)
+    deduplicated, clusters, issues = migration_engine.deduplicate_output(table, schemas, quarantine=quarantine)
+    assert len(deduplicated) == 2 and [cluster["Rows"] for cluster in clusters] == [[1, 3], [2, 4]]
+    assert {key: list(rows) for key, rows in issues.rows.items()} == {
+        ("email", "Missing required value for 'email'"): [2],
+        ("age", "Type mismatch in 'age' (expected number)"): [2],
+        # Both quarantined rows belong to the first survivor, which is reported once
+        ("age", "Transformation failed for 'age'"): [1],
+    }
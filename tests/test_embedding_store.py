@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pytest
+
+import embedding_store
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).normal(size=(300, 32)).astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype", embedding_store.DTYPES)
+def test_search_finds_each_stored_vector_first(tmp_path, vectors, dtype):
+    ids = [f"v{i}" for i in range(len(vectors))]
+    store = embedding_store.write_store(str(tmp_path / "store"), ids, vectors, dtype=dtype)
+    positions, scores = store.search_positions(vectors[:20], top_k=3)
+    assert positions.shape == scores.shape == (20, 3)
+    assert positions[:, 0].tolist() == list(range(20))
+    assert np.all(scores[:, :-1] >= scores[:, 1:])
+
+
+def test_search_across_chunks_matches_single_chunk(tmp_path, vectors):
+    store = embedding_store.write_store(str(tmp_path / "store"), range(len(vectors)), vectors, dtype="int8")
+    whole = store.search_positions(vectors[:5], top_k=4)
+    chunked = store.search_positions(vectors[:5], top_k=4, chunk_rows=7)
+    assert np.array_equal(whole[0], chunked[0])
+    assert np.allclose(whole[1], chunked[1])
+
+
+def test_float32_sidecar_is_opt_in(tmp_path, vectors):
+    plain = embedding_store.write_store(str(tmp_path / "plain"), range(len(vectors)), vectors, dtype="int8")
+    exact = embedding_store.write_store(str(tmp_path / "exact"), range(len(vectors)), vectors, dtype="int8",
+                                        keep_float32=True)
+    assert plain.float32 is None
+    assert not os.path.exists(tmp_path / "plain" / embedding_store.FLOAT32_FILE)
+    assert exact.float32 is not None
+    assert np.allclose(exact.vectors([3]), embedding_store.normalize(vectors[3]))
+
+
+def test_search_returns_ids_and_metadata(tmp_path, vectors):
+    store = embedding_store.write_store(
+        str(tmp_path / "store"), ["a", "b"], vectors[:2], metadata=[{"field": "x"}, {"field": "y"}],
+    )
+    reopened = embedding_store.open_store(str(tmp_path / "store"))
+    [matches] = reopened.search(vectors[1], top_k=1)
+    assert matches[0]["id"] == "b"
+    assert matches[0]["metadata"] == {"field": "y"}
+    assert len(store) == 2
+
+
+def test_search_of_empty_store_is_empty(tmp_path, vectors):
+    store = embedding_store.write_store(str(tmp_path / "store"), [], [])
+    positions, scores = store.search_positions(vectors[:2], top_k=5)
+    assert positions.shape == scores.shape == (2, 0)
+    assert store.search(vectors[:2]) == [[], []]
+
+
+def test_open_store_without_store_is_none(tmp_path):
+    assert embedding_store.open_store(str(tmp_path / "missing")) is None
+
+
+def test_search_without_originals_ranks_by_the_compact_scores(tmp_path, vectors, monkeypatch):
+    store = embedding_store.write_store(str(tmp_path / "store"), range(len(vectors)), vectors, dtype="int8")
+    monkeypatch.setattr(store, "vectors", lambda positions: pytest.fail("nothing to rescore without originals"))
+    queries = vectors[:10] + 0.5
+    positions, scores = store.search_positions(queries, top_k=5, oversample=8)
+    compact = embedding_store.normalize(queries) @ store.rows(0, len(store)).T
+    assert np.allclose(scores, np.take_along_axis(compact, positions, axis=1))
+    assert np.allclose(scores, -np.sort(-compact, axis=1)[:, :5])
+
+
+def test_search_with_originals_rescores_exactly(tmp_path, vectors):
+    store = embedding_store.write_store(str(tmp_path / "store"), range(len(vectors)), vectors, dtype="int8",
+                                        keep_float32=True)
+    queries = vectors[:10] + 0.5
+    positions, scores = store.search_positions(queries, top_k=5)
+    exact = embedding_store.normalize(queries) @ embedding_store.normalize(vectors).T
+    assert np.array_equal(positions, np.argsort(-exact, axis=1)[:, :5])
+    assert np.allclose(scores, np.take_along_axis(exact, positions, axis=1))
@@ -0,0 +1,66 @@
+import pytest
+
+import field_paths
+
+RECORD = {
+    "contact": {"email": "a@example.com", "emails": ["a@example.com", "b@example.com"]},
+    "orders": [{"sku": "X1"}, {"sku": "Y2"}, {}],
+    "meta": {"created.at": "2024-01-31"},
+    "flat.key": "literal",
+}
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("contact.email", "a@example.com"),
+    ("$.contact.email", "a@example.com"),
+    ("contact.emails[0]", "a@example.com"),
+    ("contact.emails[-1]", "b@example.com"),
+    ("orders[*].sku", ["X1", "Y2", None]),
+    ("meta['created.at']", "2024-01-31"),
+    ("flat.key", "literal"),
+    ("contact.phone", None),
+    ("contact.emails[5]", None),
+    ("contact.email.domain", None),
+    ("missing[*].sku", None),
+])
+def test_compile_accessor(path, expected):
+    assert field_paths.compile_accessor(path)(RECORD) == expected
+
+
+def test_parse_path_steps():
+    assert field_paths.parse_path("a.b[2][*]['c.d']") == ("a", "b", 2, field_paths.WILDCARD, "c.d")
+
+
+@pytest.mark.parametrize("path", ["a..b", "a[x]", "$."])
+def test_parse_path_rejects_bad_syntax(path):
+    with pytest.raises(ValueError):
+        field_paths.parse_path(path)
+
+
+def test_path_root():
+    assert field_paths.path_root("contact.email") == "contact"
+    assert field_paths.path_root("email") == "email"
+
+
+def test_extract_column():
+    assert field_paths.extract_column([RECORD, {}], "contact.email") == ["a@example.com", None]
+
+
+def test_target_steps_rejects_wildcards_and_top_level_names():
+    assert field_paths.target_steps("address.lines[1]") == ("address", ("lines", 1))
+    for path in ("address", "items[*].sku"):
+        with pytest.raises(ValueError):
+            field_paths.target_steps(path)
+
+
+def test_build_nested_column():
+    parts = [(("city",), ["Leeds", None]), (("lines", 1), ["Flat 2", None])]
+    assert field_paths.build_nested_column(2, parts) == [{"city": "Leeds", "lines": [None, "Flat 2"]}, None]
+
+
+def test_build_nested_column_does_not_change_the_base_objects():
+    base = [{"country": "UK", "geo": {"lat": 1}, "lines": ["1 High St"]}]
+    parts = [(("geo", "lon"), [2]), (("lines", 1), ["Flat 2"])]
+    [built] = field_paths.build_nested_column(1, parts, base=base)
+    assert built == {"country": "UK", "geo": {"lat": 1, "lon": 2}, "lines": ["1 High St", "Flat 2"]}
+    assert base == [{"country": "UK", "geo": {"lat": 1}, "lines": ["1 High St"]}]
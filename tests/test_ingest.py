@@ -0,0 +1,102 @@
+import hashlib
+
+import embedding_store
+import embeddings
+import ingest_metadata_to_pinecone as ingest
+
+
+class HashProvider(embeddings.EmbeddingProvider):
+    """Deterministic offline embeddings that count the texts embedded."""
+
+    name = "test:hash"
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed(self, texts):
+        self.embedded += len(texts)
+        return [[b / 255 for b in hashlib.sha256(text.encode()).digest()[:8]] for text in texts]
+
+
+class FakeIndex:
+    """The parts of the Pinecone client layer ingest uses, over a dict."""
+
+    def __init__(self):
+        self.vectors = {}
+
+    def list_ids(self, prefix):
+        return [vid for vid in self.vectors if vid.startswith(prefix)]
+
+    def fetch(self, ids):
+        return {"vectors": {vid: self.vectors[vid] for vid in ids if vid in self.vectors}}
+
+    def upsert(self, vectors):
+        self.vectors.update({vector["id"]: vector for vector in vectors})
+
+    def delete(self, ids):
+        for vid in ids:
+            self.vectors.pop(vid, None)
+
+
+def field(name, description="A field"):
+    return {"name": name, "data_type": "string", "required": False, "description": description}
+
+
+def schema(name, *fields):
+    return {"name": name, "version": "1.0", "fields": list(fields)}
+
+
+def run_ingest(index, target_schema, provider):
+    """The Pinecone part of ingest's main: returns (changed, unchanged, removed)."""
+    existing = ingest.fetch_existing_hashes(index, ingest.list_existing_ids(index, target_schema))
+    changed, unchanged, removed = ingest.plan_ingest(target_schema, existing, embedding_model=provider.name)
+    index.upsert(ingest.build_schema_vectors(target_schema, provider, fields=changed))
+    ingest.delete_vectors(index, removed)
+    return [f["name"] for f in changed], unchanged, removed
+
+
+def test_schemas_sharing_a_field_name_keep_their_own_vectors():
+    index, provider = FakeIndex(), HashProvider()
+    crm = schema("crm", field("email", "Customer email"), field("phone"))
+    billing = schema("billing", field("email", "Invoice email"))
+    assert run_ingest(index, crm, provider) == (["email", "phone"], 0, [])
+    assert run_ingest(index, billing, provider) == (["email"], 0, [])
+    # Re-ingesting either schema is a no-op: nothing was overwritten
+    assert run_ingest(index, crm, provider) == ([], 2, [])
+    assert run_ingest(index, billing, provider) == ([], 1, [])
+    assert sorted(index.vectors) == ["target_schema_billing:email", "target_schema_crm:email", "target_schema_crm:phone"]
+    assert index.vectors["target_schema_billing:email"]["metadata"]["description"] == "Invoice email"
+    assert provider.embedded == 3
+
+
+def test_removed_fields_are_deleted_only_for_their_schema():
+    index, provider = FakeIndex(), HashProvider()
+    run_ingest(index, schema("crm", field("email"), field("phone")), provider)
+    run_ingest(index, schema("billing", field("phone")), provider)
+    assert run_ingest(index, schema("crm", field("email")), provider) == ([], 1, ["target_schema_crm:phone"])
+    assert sorted(index.vectors) == ["target_schema_billing:phone", "target_schema_crm:email"]
+
+
+def test_legacy_ids_are_replaced_once():
+    index, provider = FakeIndex(), HashProvider()
+    crm = schema("crm", field("email"))
+    index.upsert([
+        {"id": "target_schema_email", "values": [0.0], "metadata": ingest.build_metadata(crm["fields"][0], crm, provider.name)},
+        {"id": "target_schema_phone", "values": [0.0], "metadata": {"field_name": "phone"}},
+    ])
+    assert run_ingest(index, crm, provider) == (["email"], 0, ["target_schema_email"])
+    # A legacy vector without a recorded owner may belong to another schema and stays
+    assert sorted(index.vectors) == ["target_schema_crm:email", "target_schema_phone"]
+    assert run_ingest(index, crm, provider) == ([], 1, [])
+
+
+def test_local_store_reuses_unchanged_vectors(tmp_path):
+    provider = HashProvider()
+    path = str(tmp_path / "store")
+    crm = schema("crm", field("email"), field("phone"))
+    store, embedded = ingest.write_schema_store(path, crm, [], None, provider)
+    assert embedded == 2 and store.ids == ["target_schema_crm:email", "target_schema_crm:phone"]
+    crm["fields"].append(field("fax"))
+    store, embedded = ingest.write_schema_store(path, crm, [], embedding_store.open_store(path), provider)
+    assert embedded == 1 and len(store) == 3
+    assert provider.embedded == 3
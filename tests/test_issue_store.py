@@ -0,0 +1,61 @@
+import csv
+
+from issue_store import DETAIL_COLUMNS, IssueStore
+
+
+def test_issues_are_counted_per_field_and_issue_with_capped_examples():
+    store = IssueStore("System A", max_examples=2)
+    for row in range(1, 6):
+        store.add(row, "email", "Missing value", None)
+    store.add(3, "age", "Type mismatch", "abc")
+    assert store.total() == len(store) == 6
+    assert list(store.rows[("email", "Missing value")]) == [1, 2, 3, 4, 5]
+    assert store.examples[("email", "Missing value")] == [(1, None), (2, None)]
+    assert store.examples[("age", "Type mismatch")] == [(3, "abc")]
+
+
+def test_add_rows_records_many_rows_at_once():
+    store = IssueStore("System A", max_examples=3)
+    store.add_rows("age", "Type mismatch", [], [])
+    assert store.total() == 0 and not store.rows
+    store.add(1, "age", "Type mismatch", "x")
+    store.add_rows("age", "Type mismatch", (r for r in [4, 7, 9]), ["a", "b", "c"])
+    store.add_rows("dob", "Invalid date", [2, 3])
+    assert list(store.rows[("age", "Type mismatch")]) == [1, 4, 7, 9]
+    assert store.examples[("age", "Type mismatch")] == [(1, "x"), (4, "a"), (7, "b")]
+    assert store.examples[("dob", "Invalid date")] == [(2, None), (3, None)]
+
+
+def test_merge_shifts_row_numbers():
+    total = IssueStore("Merged Output")
+    for start in (0, 100):
+        batch = IssueStore("Merged Output")
+        batch.add(1, "email", "Missing value")
+        batch.add(2, "email", "Missing value")
+        total.merge(batch, row_offset=start)
+    assert list(total.rows[("email", "Missing value")]) == [1, 2, 101, 102]
+
+
+def test_summary_is_sorted_by_count():
+    store = IssueStore("System A")
+    store.add(1, "age", "Type mismatch", "x")
+    store.add_rows("email", "Missing value", [1, 2, 3])
+    summary = store.summary_df()
+    assert list(summary["Field"]) == ["email", "age"]
+    assert list(summary["Count"]) == [3, 1]
+    assert summary.iloc[0]["Example Rows"] == "1, 2, 3"
+    assert summary.iloc[1]["Example Values"] == "'x'"
+    assert IssueStore("Empty").summary_df().empty
+
+
+def test_detail_csv_is_streamed_per_row(tmp_path):
+    store = IssueStore("System A")
+    store.add_rows("email", "Missing value", [2, 5])
+    store.add(1, "age", "Type mismatch", 3)
+    path = str(tmp_path / "issues.csv")
+    assert store.write_csv(path) == 3
+    assert store.detail_path == path
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows == [DETAIL_COLUMNS, ["System A", "1", "age", "Type mismatch"],
+                    ["System A", "2", "email", "Missing value"], ["System A", "5", "email", "Missing value"]]
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+import jsonl_io
+import pipeline
+
+
+def write_jsonl(path, records, blank_lines=False):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if blank_lines:
+                f.write("\n")
+
+
+RECORDS = [{"id": i, "name": f"name {i}", "note": "é" * (i % 7)} for i in range(200)]
+
+
+@pytest.mark.parametrize("target_bytes", [1, 17, 100, 1000, 10 ** 6])
+def test_ranges_cover_the_file_on_line_boundaries(tmp_path, target_bytes):
+    path = str(tmp_path / "data.jsonl")
+    write_jsonl(path, RECORDS, blank_lines=True)
+    ranges = list(jsonl_io.split_ranges(path, target_bytes))
+    with open(path, "rb") as f:
+        data = f.read()
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    assert all(data[end - 1:end] == b"\n" for _, end in ranges)
+    records = [record for start, end in ranges for record in jsonl_io.read_range(path, start, end)]
+    assert records == RECORDS
+
+
+def test_last_line_without_newline(tmp_path):
+    path = tmp_path / "data.jsonl"
+    path.write_text('{"a": 1}\n{"a": 2}', encoding="utf-8")
+    ranges = list(jsonl_io.split_ranges(str(path), 4))
+    assert [r for start, end in ranges for r in jsonl_io.read_range(str(path), start, end)] == [{"a": 1}, {"a": 2}]
+
+
+def test_read_range_reports_the_byte_of_a_bad_line(tmp_path):
+    path = tmp_path / "data.jsonl"
+    path.write_text('{"a": 1}\n{"a": \n', encoding="utf-8")
+    with pytest.raises(ValueError, match="byte 9"):
+        jsonl_io.read_range(str(path), 0, path.stat().st_size)
+
+
+@pytest.mark.parametrize("name", ["data.jsonl", "data.ndjson.gz", "data.jsonl.xz"])
+def test_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    with jsonl_io.open_text(path, "w") as f:
+        for record in RECORDS:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    assert jsonl_io.is_jsonl(path)
+    assert jsonl_io.is_compressed(path) == (not name.endswith(".jsonl"))
+    assert list(jsonl_io.iter_jsonl(path)) == RECORDS
+    assert list(pipeline.iter_records(path)) == RECORDS
+
+
+def test_source_chunks_splits_plain_jsonl_into_ranges(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    write_jsonl(path, RECORDS)
+    chunks = list(pipeline.source_chunks(path, batch_size=30))
+    assert all(isinstance(chunk, tuple) for chunk in chunks)
+    assert 5 <= len(chunks) <= 9
+    assert [r for start, end in chunks for r in jsonl_io.read_range(path, start, end)] == RECORDS
+
+
+def test_source_chunks_batches_compressed_jsonl(tmp_path):
+    path = str(tmp_path / "data.jsonl.gz")
+    with jsonl_io.open_text(path, "w") as f:
+        for record in RECORDS:
+            f.write(json.dumps(record) + "\n")
+    chunks = list(pipeline.source_chunks(path, batch_size=30))
+    assert [len(chunk) for chunk in chunks] == [30] * 6 + [20]
+    assert [r for chunk in chunks for r in chunk] == RECORDS
@@ -0,0 +1,40 @@
+import mapping_memory
+from mapping_memory import MappingMemory
+
+MATCHES = [
+    {"Target Field": "email", "Source Field": "E-Mail", "Status": "✅ Strong Match"},
+    {"Target Field": "phone", "Source Field": "tel", "Status": "⚠️ Moderate Match"},
+    {"Target Field": "age", "Source Field": "No Match", "Status": "❌ No Match"},
+]
+DECISIONS = {"email": "Approve", "phone": "Reject", "age": "Reject"}
+
+
+def test_only_reviewed_decisions_are_learned(tmp_path):
+    memory = MappingMemory(str(tmp_path / "memory.json"))
+    # The reviewer changed nothing but the phone decision
+    mapping_memory.record_decisions(memory, MATCHES, DECISIONS, reviewed={"phone"})
+    assert memory.counts("tel", "phone") == (0, 1)
+    assert memory.counts("email", "email") == (0, 0)
+    assert memory.is_rejected("TEL", "phone")
+    reloaded = MappingMemory(str(tmp_path / "memory.json"))
+    assert reloaded.fields == memory.fields
+
+
+def test_all_decisions_are_learned_without_a_reviewed_set(tmp_path):
+    memory = MappingMemory(str(tmp_path / "memory.json"))
+    mapping_memory.record_decisions(memory, MATCHES, DECISIONS)
+    assert memory.counts("e mail", "email") == (1, 0)
+    assert memory.counts("tel", "phone") == (0, 1)
+    # Suggestions without a source field are never recorded
+    assert len(memory) == 2
+
+
+def test_best_source_follows_the_votes(tmp_path):
+    memory = MappingMemory(str(tmp_path / "memory.json"))
+    memory.record("cust_id", "customer_id", "Approve")
+    memory.record("Cust-ID", "customer_id", "Approve")
+    memory.record("legacy id", "customer_id", "Approve")
+    memory.record("legacy_id", "customer_id", "Reject")
+    memory.record("legacy_id", "customer_id", "Reject")
+    assert memory.best_source("customer_id", ["legacy_id", "cust id"]) == ("cust id", 1.0, "Memory")
+    assert memory.best_source("customer_id", ["legacy_id"]) == (None, 0.0, None)
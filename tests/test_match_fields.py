@@ -0,0 +1,65 @@
+import pytest
+
+import api_clients
+import embeddings
+import ingest_metadata_to_pinecone as ingest
+import mapping_memory
+import migration_engine
+
+SCHEMA = {
+    "name": "Customer", "version": "1.0",
+    "fields": [
+        {"name": "email", "data_type": "string", "required": True, "description": "Email address"},
+        {"name": "loyalty_points", "data_type": "number", "required": False, "description": "Points balance"},
+    ],
+}
+SOURCE = [{"email": "a@x.com", "loyalty_points": 31, "notes": "vip"}, {"email": "b@x.com", "loyalty_points": 42, "notes": ""}]
+
+
+class LetterProvider(embeddings.EmbeddingProvider):
+    """Offline 26-dimensional letter-count embeddings, standing in for a local model."""
+
+    name = "local:letters"
+
+    def embed(self, texts):
+        return [[text.lower().count(chr(c)) + 0.01 for c in range(ord("a"), ord("z") + 1)] for text in texts]
+
+
+class NoPinecone(api_clients.ApiClients):
+    def query(self, vector, top_k, **kwargs):
+        raise AssertionError("Pinecone must not be queried with local embeddings")
+
+
+@pytest.fixture
+def offline(tmp_path):
+    previous = api_clients.set_clients(NoPinecone())
+    yield {
+        "value_index": migration_engine.load_reference_value_index(str(tmp_path / "no_reference_data")),
+        "memory": mapping_memory.MappingMemory(path=None),
+    }
+    api_clients.set_clients(previous)
+
+
+def test_local_embeddings_search_the_local_schema_store(tmp_path, offline):
+    provider = LetterProvider()
+    store_path = str(tmp_path / "schema_vectors")
+    ingest.write_schema_store(store_path, SCHEMA, [], None, provider)
+    matches, audit_log, _ = migration_engine.match_fields(
+        SOURCE, ["email", "loyalty_points"], embedder=provider, store_path=store_path, **offline)
+    assert [(m["Target Field"], m["Source Field"]) for m in matches] == [("email", "email"), ("loyalty_points", "loyalty_points")]
+    assert all(m["Status"] != "❌ No Match" for m in matches)
+    assert all(entry["Mapping Method"] == "AI" for entry in audit_log)
+
+
+def test_local_embeddings_without_a_matching_store_are_refused(tmp_path, offline):
+    provider = LetterProvider()
+    store_path = str(tmp_path / "schema_vectors")
+    with pytest.raises(ValueError, match="No local schema vectors"):
+        migration_engine.match_fields(SOURCE, ["email"], embedder=provider, store_path=store_path, **offline)
+
+    class OtherModel(LetterProvider):
+        name = "local:other"
+
+    ingest.write_schema_store(store_path, SCHEMA, [], None, OtherModel())
+    with pytest.raises(ValueError, match="embedded with local:other, not local:letters"):
+        migration_engine.match_fields(SOURCE, ["email"], embedder=provider, store_path=store_path, **offline)
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import migrate
+import migration_plan
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "schemas", "target_schema.json")
+
+def token(i, start):
+    return hashlib.md5(str(i).encode()).hexdigest()[start:start + 10]
+
+
+RECORDS = [
+    {"customer_id": f"A{i:03d}", "first_name": f"n{token(i, 0)}", "last_name": "Lee", "email": f"{token(i, 10)}@example.com",
+     "dob": "1982/12/31" if i % 5 else "not a date", "years": str(20 + i) if i % 7 else "unknown"}
+    for i in range(30)
+]
+
+PLAN = {
+    "mappings": {
+        "customer_id": "customer_id", "first_name": "first_name", "last_name": "last_name",
+        "email": "email", "date_of_birth": "dob", "age": "years",
+    },
+    "transformations": {
+        "date_of_birth": {"use_transform": True, "primitive": {
+            "name": "date_format", "params": {"source_format": "%Y/%m/%d", "target_format": "%Y-%m-%d"}}},
+        "first_name": {"use_transform": True, "primitive": None,
+                       "user_code": "def transform(x):\n    return x.title()"},
+        "age": {"use_transform": True, "primitive": {"name": "to_integer", "params": {}}},
+    },
+}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Profiles are cached under ./output
+    monkeypatch.chdir(tmp_path)
+    with open("source.jsonl", "w") as f:
+        f.writelines(json.dumps(record) + "\n" for record in RECORDS)
+    with open("plan.json", "w") as f:
+        json.dump(PLAN, f)
+    return tmp_path
+
+
+def run(*argv):
+    return migrate.run(migrate.parse_args(["--source", "source.jsonl", "--schema", SCHEMA_PATH, "--plan", "plan.json",
+                                           "--workers", "1", *argv]))
+
+
+def test_plan_run_writes_transformed_outputs_and_reports(workdir):
+    assert run("--output-dir", "out", "--save-plan", "saved.json") == migrate.EXIT_OK
+    output = json.load(open("out/normalized_output.json"))
+    assert len(output) == len(RECORDS)
+    assert output[1]["first_name"] == RECORDS[1]["first_name"].title()
+    assert output[1]["date_of_birth"] == "1982-12-31"
+    assert output[1]["age"] == 21
+    for name in ("normalized_output.csv", "pre_migration_issues_summary.csv", "post_migration_issues_summary.csv",
+                 "transform_quarantine_summary.csv"):
+        assert (workdir / "out" / name).exists()
+    saved = migration_plan.load_plan("saved.json")
+    assert saved["mappings"] == PLAN["mappings"]
+
+
+def test_stream_run_matches_the_in_memory_run(workdir):
+    assert run("--output-dir", "memory") == migrate.EXIT_OK
+    assert run("--output-dir", "stream", "--stream", "--batch-size", "4") == migrate.EXIT_OK
+    assert json.load(open("stream/normalized_output.json")) == json.load(open("memory/normalized_output.json"))
+    summaries = [pd.read_csv(f"{name}/post_migration_issues_summary.csv") for name in ("memory", "stream")]
+    assert summaries[0]["Count"].sum() == summaries[1]["Count"].sum()
+    quarantined = [pd.read_csv(f"{name}/transform_quarantine_summary.csv") for name in ("memory", "stream")]
+    assert quarantined[0].equals(quarantined[1])
+
+
+def test_thresholds_set_the_exit_code(workdir):
+    # Invalid dates and ages fail their transformations
+    assert run("--output-dir", "out", "--max-transform-errors", "0") == migrate.EXIT_THRESHOLD_BREACHED
+    assert run("--output-dir", "out", "--max-transform-errors", "100") == migrate.EXIT_OK
+    # Too many pre-migration issues stop the run before anything is merged
+    assert run("--output-dir", "pre", "--max-pre-issues", "0") == migrate.EXIT_THRESHOLD_BREACHED
+    assert not (workdir / "pre" / "normalized_output.json").exists()
+
+
+def test_dedupe_collapses_duplicates_and_renumbers_quarantined_rows(workdir):
+    with open("source.jsonl", "a") as f:
+        f.write(json.dumps(dict(RECORDS[3], phone="555 1234", years="x")) + "\n")
+    assert run("--output-dir", "out", "--dedupe", "--issue-details") == migrate.EXIT_OK
+    output = json.load(open("out/normalized_output.json"))
+    assert len(output) == len(RECORDS)
+    clusters = pd.read_csv("out/duplicate_clusters.csv")
+    assert list(clusters["Rows"]) == [f"[4, {len(RECORDS) + 1}]"]
+    # The duplicate's failed age is reported once, against its surviving row
+    post = pd.read_csv("out/post_migration_issues.csv")
+    age_rows = post.loc[post["Field"] == "age", "Row"].tolist()
+    assert 4 in age_rows and len(RECORDS) + 1 not in age_rows
+    assert len(age_rows) == len(set(age_rows))
+
+
+def test_stream_and_dedupe_are_exclusive():
+    with pytest.raises(SystemExit):
+        migrate.parse_args(["--stream", "--dedupe"])
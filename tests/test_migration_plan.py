@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+import migration_plan
+from issue_store import IssueStore
+
+SCHEMA = {
+    "name": "Customer", "version": "1.0",
+    "fields": [
+        {"name": "email", "data_type": "string", "required": True, "default_value": None, "format": None},
+        {"name": "age", "data_type": "number", "required": False, "default_value": None, "format": None},
+        {"name": "address", "data_type": "object", "required": False, "default_value": None, "format": None},
+        {"name": "is_active", "data_type": "boolean", "required": True, "default_value": "true", "format": None},
+    ],
+}
+TARGET_FIELDS = [f["name"] for f in SCHEMA["fields"]]
+TARGET_DEFAULTS = {f["name"]: f["default_value"] for f in SCHEMA["fields"]}
+FIELD_SCHEMAS = {f["name"]: f for f in SCHEMA["fields"]}
+
+MATCHES = [
+    {"Target Field": "email", "Source Field": "mail", "Source Sample": "a@x.com", "Status": "✅ Strong Match", "AI Score": 0.9},
+    {"Target Field": "age", "Source Field": "years", "Source Sample": "31", "Status": "⚠️ Moderate Match"},
+    {"Target Field": "is_active", "Source Field": "status", "Source Sample": "on", "Status": "❌ Weak Match"},
+]
+
+
+def test_build_save_and_load_round_trip(tmp_path):
+    transformations = {"age": {"use_transform": True, "primitive": {"name": "to_integer", "params": {}},
+                               "preview": "dropped"}}
+    plan = migration_plan.build_plan(MATCHES, {"email": "Approve", "age": "Approve", "is_active": "Reject"},
+                                     transformations, SCHEMA, source="crm.json")
+    assert plan["mappings"] == {"email": "mail", "age": "years"}
+    assert plan["matches"][0] == {key: MATCHES[0][key] for key in migration_plan.MATCH_KEYS}
+    assert plan["transformations"]["age"] == {"use_transform": True, "primitive": {"name": "to_integer", "params": {}}}
+    path = str(tmp_path / "plans" / "plan.json")
+    migration_plan.save_plan(plan, path)
+    assert not (tmp_path / "plans" / "plan.json.tmp").exists()
+    loaded = migration_plan.load_plan(path)
+    assert loaded == json.loads(json.dumps(plan, default=str))
+    assert not migration_plan.schema_changed(loaded, SCHEMA)
+    edited = dict(SCHEMA, fields=SCHEMA["fields"][:-1])
+    assert migration_plan.schema_changed(loaded, edited)
+
+
+def test_bare_plans_are_upgraded_with_every_mapping_approved(tmp_path):
+    path = tmp_path / "plan.json"
+    path.write_text(json.dumps({"mappings": {"email": "mail"}, "transformations": {}}))
+    plan = migration_plan.load_plan(str(path))
+    assert plan["plan_version"] == migration_plan.PLAN_VERSION
+    assert plan["decisions"] == {"email": "Approve"}
+    assert plan["matches"][0]["Source Field"] == "mail"
+    # A plan without a recorded schema is never reported as stale
+    assert not migration_plan.schema_changed(plan, SCHEMA)
+
+
+def test_newer_plan_versions_are_refused(tmp_path):
+    path = tmp_path / "plan.json"
+    path.write_text(json.dumps({"plan_version": migration_plan.PLAN_VERSION + 1, "mappings": {}}))
+    with pytest.raises(ValueError, match="newer than supported"):
+        migration_plan.load_plan(str(path))
+
+
+def compiled(mappings, transformations):
+    plan = {"mappings": mappings, "transformations": transformations}
+    return migration_plan.compile_plan(plan, TARGET_FIELDS, TARGET_DEFAULTS, field_schemas=FIELD_SCHEMAS)
+
+
+def test_compilation_projects_mappings_onto_the_schema():
+    plan = compiled(
+        {"email": "contact.emails[0]", "address.city": "city", "removed": "x", "age": "years[", "is_active": "status"},
+        {},
+    )
+    assert plan.mappings == {"email": "contact.emails[0]", "address.city": "city", "is_active": "status"}
+    assert list(plan.mapping_errors) == ["age"]
+    assert plan.source_fields() == ["city", "contact", "status"]
+    assert plan.target_defaults == TARGET_DEFAULTS
+
+
+def test_compilation_checks_transformations():
+    plan = compiled(
+        {"email": "mail", "age": "years", "is_active": "status"},
+        {
+            "email": {"use_transform": True, "user_code": "def transform(x):\n    return x.lower()"},
+            "age": {"use_transform": True, "primitive": {"name": "no_such_primitive"}},
+            "is_active": {"use_transform": True, "user_code": "def transform(x):\n    return x +"},
+            "address": {"use_transform": False, "user_code": "def transform(x):\n    return x"},
+            "removed": {"use_transform": True, "user_code": "def transform(x):\n    return x"},
+        },
+    )
+    assert list(plan.transformations) == ["email"]
+    assert "Unknown transformation primitive" in plan.errors["age"]
+    assert "Syntax error" in plan.errors["is_active"]
+    assert migration_plan.plan_codes({"transformations": plan.transformations}) == [
+        "def transform(x):\n    return x.lower()"
+    ]
+
+
+def test_compiled_plan_merges_and_validates():
+    plan = compiled(
+        {"email": "mail", "age": "years", "address.city": "city"},
+        {"email": {"use_transform": True, "user_code": "def transform(x):\n    return x.lower()"},
+         "age": {"use_transform": True, "primitive": {"name": "to_number", "params": {}}}},
+    )
+    data = [{"mail": "A@X.COM", "years": "31", "city": "Oslo"}, {"mail": None, "years": "n/a", "city": None}]
+    issues = IssueStore("Merged Output")
+    table = plan.merge(data, issues=issues)
+    records = table.records()
+    assert records[0] == {"email": "a@x.com", "age": 31, "address": {"city": "Oslo"}, "is_active": "true"}
+    assert records[1]["email"] is None
+    assert {key: list(rows) for key, rows in issues.rows.items()} == {
+        ("email", "Missing required value for 'email'"): [2],
+        ("age", "Transformation failed for 'age'"): [2],
+    }
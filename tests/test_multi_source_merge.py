@@ -0,0 +1,108 @@
+import csv
+import json
+import os
+import random
+
+import pytest
+
+import migrate
+import migration_engine
+import migration_plan
+import pipeline
+from multi_source_merge import MergeSource, merge_sources
+
+
+def canonical(records):
+    return sorted(json.dumps(record, sort_keys=True) for record in records)
+
+
+def make_sources(rows=600, seed=3):
+    rng = random.Random(seed)
+    crm = [{"email": f" User{rng.randrange(400)}@Example.com ", "name": f"crm {i}", "phone": rng.choice(["", "555"])}
+           for i in range(rows)]
+    crm += [{"email": "", "name": "no key"}, {"name": "missing key"}]
+    billing = [{"contact_email": f"user{rng.randrange(400)}@example.com", "phone": f"+1 {i}", "plan": rng.choice("ABC")}
+               for i in range(rows)]
+    return crm, billing
+
+
+def merge(crm, billing, **options):
+    sources = [MergeSource("CRM", iter(crm), "email"), MergeSource("Billing", iter(billing), "contact_email")]
+    return list(merge_sources(sources, precedence={"phone": ["Billing", "CRM"]}, **options))
+
+
+@pytest.mark.parametrize("max_in_memory_keys,partitions", [(1, 4), (50, 7), (399, 64)])
+def test_spill_join_matches_in_memory_join(tmp_path, max_in_memory_keys, partitions):
+    crm, billing = make_sources()
+    in_memory = merge(crm, billing)
+    spilled = merge(crm, billing, max_in_memory_keys=max_in_memory_keys, partitions=partitions,
+                    spill_dir=str(tmp_path))
+    assert canonical(spilled) == canonical(in_memory)
+    # The partition files are removed once the join is done
+    assert os.listdir(tmp_path) == []
+
+
+def test_join_combines_rows_by_normalized_key_with_precedence():
+    crm = [{"email": "A@x.com ", "name": "Ann", "phone": "1"}, {"email": "a@x.com", "city": "Oslo"}]
+    billing = [{"contact_email": "a@X.com", "phone": "2", "name": ""}]
+    merged = merge(crm, billing)
+    assert merged == [{"email": "A@x.com ", "name": "Ann", "phone": "2", "city": "Oslo", "contact_email": "a@X.com"}]
+
+
+def test_rows_without_a_key_are_passed_through():
+    crm, billing = make_sources(rows=10)
+    merged = merge(crm, billing, max_in_memory_keys=1)
+    assert {"email": None, "name": "no key"} in merged and {"name": "missing key"} in merged
+
+
+def write_sources(tmp_path, crm, billing):
+    crm_path = str(tmp_path / "crm.jsonl")
+    with open(crm_path, "w") as f:
+        f.writelines(json.dumps(row) + "\n" for row in crm)
+    billing_path = str(tmp_path / "billing.csv")
+    with open(billing_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["contact_email", "phone", "plan"])
+        writer.writeheader()
+        writer.writerows(billing)
+    return crm_path, billing_path
+
+
+def test_iter_source_streams_files_into_the_join(tmp_path, monkeypatch):
+    crm, billing = make_sources(rows=50)
+    crm_path, billing_path = write_sources(tmp_path, crm, billing)
+    join = {"key_field": "email", "key_normalizer": "email", "precedence": {"phone": ["Billing", "System A"]},
+            "additional_sources": [{"name": "Billing", "path": billing_path, "key_field": "contact_email"}]}
+    # Sources are read record by record, never loaded whole
+    monkeypatch.setattr(migration_engine, "load_json", lambda path: pytest.fail(f"{path} loaded whole"))
+    streamed = migration_engine.iter_source(crm_path, join, max_in_memory_keys=5, spill_dir=str(tmp_path))
+    expected = list(merge_sources(
+        [MergeSource("System A", crm, "email"), MergeSource("Billing", billing, "contact_email")],
+        precedence=join["precedence"],
+    ))
+    assert canonical(streamed) == canonical(expected)
+    batches = list(pipeline.source_chunks(crm_path, batch_size=7, join=join))
+    assert all(isinstance(batch, list) and len(batch) <= 7 for batch in batches)
+    assert canonical(record for batch in batches for record in batch) == canonical(expected)
+
+
+def test_iter_source_without_additional_sources_reads_the_source(tmp_path):
+    crm, billing = make_sources(rows=5)
+    crm_path, _ = write_sources(tmp_path, crm, billing)
+    join = {"key_field": "email", "additional_sources": []}
+    assert list(migration_engine.iter_source(crm_path, join)) == list(migration_engine.iter_source(crm_path)) == crm
+
+
+def test_join_options_override_the_plan():
+    plan = migration_plan._upgrade({"mappings": {}})
+    assert plan["join"] is None
+    plan["join"] = {"key_field": "id", "key_normalizer": "id", "precedence": {},
+                    "additional_sources": [{"name": "B", "path": "b.json", "key_field": "id"}]}
+    args = migrate.parse_args(["--precedence", "phone=B, System A"])
+    assert migrate.source_join(args, plan) == dict(plan["join"], precedence={"phone": ["B", "System A"]})
+    args = migrate.parse_args(["--merge-source", "C", "c.csv", "cid"])
+    join = migrate.source_join(args)
+    assert join["additional_sources"] == [{"name": "C", "path": "c.csv", "key_field": "cid"}]
+    assert (join["key_field"], join["key_normalizer"]) == ("email", "email")
+    assert migrate.source_join(migrate.parse_args([])) is None
+    with pytest.raises(SystemExit):
+        migrate.parse_args(["--precedence", "phone"])
@@ -0,0 +1,70 @@
+import csv
+import json
+
+import pytest
+
+import jsonl_io
+import migration_engine
+from migration_engine import OutputWriter, read_output_page, write_outputs
+from typed_table import TypedTable
+
+FIELDS = ["id", "name", "note"]
+RECORDS = [
+    {"id": i, "name": f"naïve {i}", "note": "line one\nline, two" if i % 7 == 0 else ("" if i % 5 == 0 else None)}
+    for i in range(2345)
+]
+
+
+def csv_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_index_samples_csv_offsets_every_index_rows(tmp_path):
+    writer = OutputWriter(str(tmp_path), FIELDS)
+    for start in range(0, len(RECORDS), 700):
+        writer.write(RECORDS[start:start + 700])
+    writer.close()
+    assert writer.rows == len(RECORDS)
+    # Offsets are sampled at chunk boundaries, at least INDEX_ROWS rows apart
+    assert [row for row, _ in writer.index] == [0, 1400]
+    data = open(writer.csv_path, "rb").read()
+    rows = csv_rows(writer.csv_path)
+    for row, offset in writer.index:
+        # Every sampled offset is the start of that row's CSV line
+        assert data[offset:].decode("utf-8").startswith(f"{row},naïve {row},")
+        assert rows[row + 1][0] == str(row)
+
+
+@pytest.mark.parametrize("start,count", [(0, 10), (995, 10), (1000, 1), (1990, 30), (2340, 50), (3000, 5)])
+def test_pages_match_the_written_rows(tmp_path, start, count):
+    writer = write_outputs(RECORDS, str(tmp_path))
+    page = read_output_page(writer.csv_path, FIELDS, writer.index, start, count)
+    expected = csv_rows(writer.csv_path)[1 + start:1 + start + count]
+    assert list(page.columns) == FIELDS
+    assert page.values.tolist() == expected
+
+
+def test_empty_output_pages_are_empty(tmp_path):
+    writer = write_outputs(TypedTable.from_records([], FIELDS), str(tmp_path))
+    assert writer.index == [] and writer.rows == 0
+    page = read_output_page(writer.csv_path, FIELDS, writer.index, 0, 10)
+    assert page.empty and list(page.columns) == FIELDS
+    assert json.load(open(writer.json_path)) == []
+
+
+@pytest.mark.parametrize("output_format", ["json", "jsonl", "jsonl.gz"])
+def test_streamed_json_matches_the_records(tmp_path, output_format):
+    table = TypedTable.from_records(RECORDS, FIELDS)
+    writer = write_outputs(table, str(tmp_path), output_format=output_format)
+    if output_format == "json":
+        assert json.load(open(writer.json_path)) == RECORDS
+    else:
+        with jsonl_io.open_text(writer.json_path) as f:
+            assert [json.loads(line) for line in f] == RECORDS
+
+
+def test_unknown_output_formats_are_refused(tmp_path):
+    with pytest.raises(ValueError, match="Unknown output format"):
+        OutputWriter(str(tmp_path), FIELDS, output_format="parquet")
+    assert "jsonl.xz" in migration_engine.OUTPUT_FORMATS
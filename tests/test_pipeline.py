@@ -0,0 +1,155 @@
+import json
+import random
+import threading
+import time
+
+import pytest
+
+import jsonl_io
+import migration_engine
+import pipeline
+from issue_store import IssueStore
+from transform_pool import TransformWorkerPool
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_run_pipeline_writes_results_in_batch_order(workers):
+    rng = random.Random(0)
+    written = []
+
+    def transform(batch):
+        time.sleep(rng.random() / 200)
+        return [x * 2 for x in batch]
+
+    stages = pipeline.run_pipeline(pipeline.iter_batches(range(100), 7), transform, written.extend,
+                                   workers=workers, queue_depth=2)
+    assert written == [x * 2 for x in range(100)]
+    assert set(stages) == {"read", "transform", "write"}
+
+
+def test_run_pipeline_bounds_the_batches_in_flight():
+    lock = threading.Lock()
+    state = {"read": 0, "written": 0, "peak": 0}
+
+    def batches():
+        for i in range(50):
+            with lock:
+                state["read"] += 1
+                state["peak"] = max(state["peak"], state["read"] - state["written"])
+            yield [i]
+
+    def write(result):
+        time.sleep(0.002)
+        with lock:
+            state["written"] += 1
+
+    pipeline.run_pipeline(batches(), lambda batch: batch, write, workers=2, queue_depth=2)
+    assert state["written"] == 50
+    assert state["peak"] <= 2 * 2 + 2 + 1
+
+
+@pytest.mark.parametrize("failing_stage", ["read", "transform", "write"])
+def test_run_pipeline_raises_the_first_error_without_hanging(failing_stage):
+    def batches():
+        for i in range(1000):
+            if failing_stage == "read" and i == 5:
+                raise RuntimeError("read failed")
+            yield [i]
+
+    def transform(batch):
+        if failing_stage == "transform" and batch == [5]:
+            raise RuntimeError("transform failed")
+        return batch
+
+    def write(result):
+        if failing_stage == "write" and result == [5]:
+            raise RuntimeError("write failed")
+
+    with pytest.raises(RuntimeError, match=f"{failing_stage} failed"):
+        pipeline.run_pipeline(batches(), transform, write, workers=2, queue_depth=2)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 1 << 20])
+def test_iter_json_array_across_chunk_boundaries(tmp_path, chunk_size):
+    records = [{"id": i, "tags": ["a", {"b": [1, 2]}], "text": "]" * (i % 3), "n": 10 ** i} for i in range(20)]
+    path = tmp_path / "data.json"
+    path.write_text(" \n[\n" + ",\n  ".join(json.dumps(r) for r in records) + "\n]\n")
+    assert list(jsonl_io.iter_json_array(str(path), chunk_size=chunk_size)) == records
+
+
+def test_iter_json_array_rejects_non_arrays_and_truncated_files(tmp_path):
+    empty = tmp_path / "empty.json"
+    empty.write_text("[]")
+    assert list(jsonl_io.iter_json_array(str(empty))) == []
+    not_array = tmp_path / "object.json"
+    not_array.write_text("")
+    with pytest.raises(ValueError, match="does not contain a JSON array"):
+        list(jsonl_io.iter_json_array(str(not_array)))
+    truncated = tmp_path / "truncated.json"
+    truncated.write_text('[{"a": 1}, {"a": 2}')
+    with pytest.raises(ValueError, match="unexpected end"):
+        list(jsonl_io.iter_json_array(str(truncated)))
+
+
+RECORDS = [
+    {"id": f"A{i}", "mail": f"USER{i}@X.COM" if i % 9 else None, "years": str(i) if i % 4 else "n/a"}
+    for i in range(103)
+]
+TARGET_FIELDS = ["customer_id", "email", "age"]
+TARGET_DEFAULTS = {"customer_id": None, "email": None, "age": None}
+FIELD_SCHEMAS = {
+    "customer_id": {"name": "customer_id", "data_type": "string", "required": True},
+    "email": {"name": "email", "data_type": "string", "required": True},
+    "age": {"name": "age", "data_type": "number", "required": False},
+}
+APPROVED = {"customer_id": "id", "email": "mail", "age": "years"}
+TRANSFORMATIONS = {
+    "email": {"use_transform": True, "user_code": "def transform(x):\n    return x.lower()"},
+    "age": {"use_transform": True, "primitive": {"name": "to_integer", "params": {}}},
+}
+
+
+def write_source(tmp_path, name):
+    path = str(tmp_path / name)
+    with jsonl_io.open_text(path, "w") as f:
+        if jsonl_io.is_jsonl(path):
+            f.writelines(json.dumps(record) + "\n" for record in RECORDS)
+        else:
+            json.dump(RECORDS, f)
+    return path
+
+
+def issue_rows(issues):
+    return {key: sorted(rows) for key, rows in issues.rows.items()}
+
+
+@pytest.mark.parametrize("name", ["source.json", "source.jsonl", "source.jsonl.gz"])
+@pytest.mark.parametrize("use_pool", [False, True])
+def test_streamed_migration_matches_the_in_memory_merge(tmp_path, name, use_pool):
+    path = write_source(tmp_path, name)
+    issues = IssueStore("Merged Output")
+    expected = migration_engine.merge_table(RECORDS, APPROVED, TRANSFORMATIONS, TARGET_FIELDS, TARGET_DEFAULTS,
+                                            field_schemas=FIELD_SCHEMAS, issues=issues)
+    migration_engine.write_outputs(expected, str(tmp_path / "memory"))
+
+    pool = TransformWorkerPool(workers=1) if use_pool else None
+    try:
+        result = pipeline.migrate_file(path, APPROVED, TRANSFORMATIONS, TARGET_FIELDS, TARGET_DEFAULTS,
+                                       str(tmp_path / "stream"), pool=pool, batch_size=10, field_schemas=FIELD_SCHEMAS)
+    finally:
+        if pool is not None:
+            pool.close()
+    assert result["rows"] == len(RECORDS)
+    streamed = json.load(open(tmp_path / "stream" / "normalized_output.json"))
+    assert streamed == json.load(open(tmp_path / "memory" / "normalized_output.json"))
+    assert open(tmp_path / "stream" / "normalized_output.csv").read() == open(tmp_path / "memory" / "normalized_output.csv").read()
+    assert issue_rows(result["post_issues"]) == issue_rows(issues)
+    assert result["transform_errors"] == {"age": 26}
+
+
+def test_validate_file_matches_validate_data(tmp_path):
+    path = write_source(tmp_path, "source.jsonl")
+    fields, types = ["id", "mail", "years"], {"id": "string", "mail": "email", "years": "number"}
+    streamed = pipeline.validate_file(path, fields, types, "System A", batch_size=8)
+    in_memory = migration_engine.validate_data(RECORDS, fields, types, "System A")
+    assert issue_rows(streamed) == issue_rows(in_memory) and streamed.total() > 0
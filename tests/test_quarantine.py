@@ -0,0 +1,125 @@
+import json
+
+import jsonl_io
+import migration_engine
+import pipeline
+import quarantine
+from issue_store import IssueStore
+
+FIELDS = ["id", "name", "dob"]
+SCHEMAS = {
+    "id": {"name": "id", "data_type": "number", "required": True},
+    "name": {"name": "name", "data_type": "string", "required": True},
+    "dob": {"name": "dob", "data_type": "date", "required": True, "format": "%d-%m-%Y"},
+}
+MAPPINGS = {field: field for field in FIELDS}
+TRANSFORMATIONS = {
+    "name": {"use_transform": True, "user_code": (
+        "def transform(x):\n"
+        "    if x.startswith('A'):\n"
+        "        raise ValueError('no A names')\n"
+        "    return x.upper()"
+    )},
+    "dob": {"use_transform": True, "primitive": {
+        "name": "date_format", "params": {"source_format": "%Y/%m/%d", "target_format": "%d-%m-%Y"},
+    }},
+}
+
+
+def make_data(count=10):
+    return [
+        {"id": i, "name": ("Ann" if i % 5 == 0 else "Bob"), "dob": ("not a date" if i % 4 == 0 else "2000/01/31")}
+        for i in range(1, count + 1)
+    ]
+
+
+def merge(data, failures, issues=None):
+    return migration_engine.merge_records(
+        data, MAPPINGS, TRANSFORMATIONS, FIELDS, {}, field_schemas=SCHEMAS, issues=issues, quarantine=failures,
+    )
+
+
+def test_record_counts_and_trips_the_breaker():
+    failures = quarantine.TransformQuarantine(max_error_rate=0.5, min_rows=4)
+    failures.record("name", 2, failures=[(1, "Ann", "no A names")])
+    assert not failures.is_open("name")
+    assert failures.should_trip("name", 2, 1)
+    failures.record("name", 2, failures=[(3, "Amy", "no A names")], skipped=[(4, "Abe")])
+    assert failures.is_open("name")
+    assert failures.total() == 3
+    assert failures.dead_letters[-1] == (4, "name", "Abe", quarantine.SKIPPED_ERROR)
+
+
+def test_merge_shifts_rows_and_keeps_open_breakers():
+    total = quarantine.TransformQuarantine(min_rows=1)
+    batch = total.spawn()
+    batch.record("dob", 3, failures=[(2, "x", "bad")])
+    total.merge(batch, row_offset=100)
+    assert total.dead_letters == [(102, "dob", "x", "bad")]
+    assert total.attempted == {"dob": 3}
+    assert not total.is_open("dob")
+    batch = total.spawn()
+    batch.record("dob", 1, failures=[(1, "y", "bad")])
+    total.merge(batch, row_offset=103)
+    assert total.is_open("dob")
+    assert total.spawn().is_open("dob")
+
+
+def test_add_issues_groups_by_field_and_outcome():
+    failures = quarantine.TransformQuarantine()
+    failures.record("dob", 3, failures=[(1, "x", "bad"), (3, "z", "bad")], skipped=[(4, "w")])
+    issues = IssueStore("Merged Output")
+    failures.add_issues(issues, start=1, row_offset=10)
+    assert {key: list(rows) for key, rows in issues.rows.items()} == {
+        ("dob", "Transformation failed for 'dob'"): [13],
+        ("dob", "Transformation skipped for 'dob' (circuit breaker open)"): [14],
+    }
+    assert failures.rows_by_field(rows={1: 1, 3: 2, 4: 2}) == {"dob": {1, 2}}
+
+
+def test_failed_values_are_emptied_and_reported_once():
+    data = make_data()
+    failures = quarantine.TransformQuarantine()
+    issues = IssueStore("Merged Output")
+    records = merge(data, failures, issues)
+    assert [r["name"] for r in records[:5]] == ["BOB", "BOB", "BOB", "BOB", None]
+    assert [r["dob"] for r in records[:4]] == ["31-01-2000", "31-01-2000", "31-01-2000", None]
+    assert {(row, field) for row, field, _, _ in failures.dead_letters} == {(5, "name"), (10, "name"), (4, "dob"), (8, "dob")}
+    assert {key: list(rows) for key, rows in issues.rows.items()} == {
+        ("name", "Transformation failed for 'name'"): [5, 10],
+        ("dob", "Transformation failed for 'dob'"): [4, 8],
+    }
+
+
+def test_without_quarantine_failures_are_error_markers():
+    records = migration_engine.merge_records(make_data(5), MAPPINGS, TRANSFORMATIONS, FIELDS, {})
+    assert records[4]["name"].startswith("[Transformation Error")
+
+
+def test_breaker_stops_a_failing_field():
+    data = [{"id": i, "name": "Ann", "dob": "2000/01/31"} for i in range(1, 51)]
+    failures = quarantine.TransformQuarantine(max_error_rate=0.5, min_rows=10)
+    merge(data, failures)
+    assert failures.is_open("name")
+    assert failures.failed["name"] == 10
+    assert failures.skipped["name"] == 40
+    assert failures.summary_df().iloc[0]["Breaker"].startswith("open")
+
+
+def test_streamed_dead_letters_match_a_single_merge(tmp_path):
+    data = make_data(40)
+    source = tmp_path / "data.jsonl"
+    source.write_text("".join(json.dumps(record) + "\n" for record in data), encoding="utf-8")
+    whole = quarantine.TransformQuarantine()
+    merge(data, whole)
+
+    dead_letters = str(tmp_path / quarantine.DEAD_LETTER_FILE)
+    streamed = quarantine.TransformQuarantine(path=dead_letters)
+    result = pipeline.migrate_file(
+        str(source), MAPPINGS, TRANSFORMATIONS, FIELDS, {}, output_dir=str(tmp_path / "out"), batch_size=7,
+        field_schemas=SCHEMAS, quarantine=streamed,
+    )
+    streamed.close()
+    written = [(r["row"], r["field"], r["value"], r["error"]) for r in jsonl_io.iter_jsonl(dead_letters)]
+    assert sorted(written) == sorted(whole.dead_letters)
+    assert result["post_issues"].total() == len(whole.dead_letters)
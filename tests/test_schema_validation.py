@@ -0,0 +1,82 @@
+import pytest
+
+import migration_engine
+from issue_store import IssueStore
+from schema_validation import FieldValidator, compile_validators
+from typed_table import TypedTable
+
+FIELD_SCHEMAS = {
+    "email": {"name": "email", "data_type": "string", "required": True, "format": r"[^@\s]+@[^@\s]+"},
+    "age": {"name": "age", "data_type": "number", "required": False},
+    "is_active": {"name": "is_active", "data_type": "boolean", "required": True, "default_value": "unknown"},
+    "dob": {"name": "dob", "data_type": "date", "required": False, "format": "%Y-%m-%d"},
+    "tags": {"name": "tags", "data_type": "array", "required": False},
+}
+
+
+@pytest.mark.parametrize("field,value,problem", [
+    ("email", "a@x.com", None),
+    ("email", "", "Missing required value for 'email'"),
+    ("email", None, "Missing required value for 'email'"),
+    ("email", "not an email", "Format mismatch in 'email' (expected [^@\\s]+@[^@\\s]+)"),
+    ("email", 42, "Type mismatch in 'email' (expected string)"),
+    ("age", None, None),
+    ("age", 31, None),
+    ("age", " 3.5e2 ", None),
+    ("age", True, "Type mismatch in 'age' (expected number)"),
+    ("age", "[Transformation Error: bad]", "Transformation failed for 'age'"),
+    ("is_active", "TRUE", None),
+    ("is_active", False, None),
+    ("is_active", "unknown", None),
+    ("is_active", "maybe", "Type mismatch in 'is_active' (expected boolean)"),
+    ("dob", "1990-02-28", None),
+    ("dob", "1990-02-30", "Format mismatch in 'dob' (expected %Y-%m-%d)"),
+    ("tags", ["a"], None),
+    ("tags", "a", "Type mismatch in 'tags' (expected array)"),
+])
+def test_problem_checks_the_schema_contract(field, value, problem):
+    assert FieldValidator(FIELD_SCHEMAS[field]).problem(value) == problem
+
+
+def test_check_reports_rows_once_per_problem_and_honours_skip():
+    validator = FieldValidator(FIELD_SCHEMAS["age"])
+    issues = IssueStore("Merged Output", max_examples=2)
+    values = [1, True, "1", 1.0, "x", "x", [1], [1], "y"]
+    validator.check(values, issues, row_offset=100, skip={109})
+    # 1, 1.0 and "1" pass while True does not, although they compare equal
+    assert {key: list(rows) for key, rows in issues.rows.items()} == {
+        ("age", "Type mismatch in 'age' (expected number)"): [102, 105, 106, 107, 108],
+    }
+    assert issues.examples[("age", "Type mismatch in 'age' (expected number)")] == [(102, True), (105, "x")]
+
+
+def test_compiled_validators_cover_the_requested_fields():
+    validators = compile_validators(FIELD_SCHEMAS, ["email", "extra"])
+    assert list(validators) == ["email", "extra"]
+    # Fields outside the schema are only checked for failed transformations
+    assert validators["extra"].problem(None) is None and validators["extra"].problem(3) is None
+    assert validators["extra"].problem("[Transformation Error: x]") == "Transformation failed for 'extra'"
+    assert list(compile_validators(FIELD_SCHEMAS)) == list(FIELD_SCHEMAS)
+
+
+RECORDS = [
+    {"email": f"u{i}@x.com" if i % 4 else "", "age": i if i % 3 else "[Transformation Error: n/a]",
+     "is_active": "true", "dob": None, "tags": []}
+    for i in range(30)
+]
+
+
+def issue_rows(issues):
+    return {key: list(rows) for key, rows in issues.rows.items()}
+
+
+def test_validate_output_matches_inline_validation_and_skips_cells():
+    expected = IssueStore("Merged Output")
+    for field, validator in compile_validators(FIELD_SCHEMAS).items():
+        validator.check([record[field] for record in RECORDS], expected)
+    table = TypedTable.from_records(RECORDS, list(FIELD_SCHEMAS), FIELD_SCHEMAS)
+    assert issue_rows(migration_engine.validate_output(table, FIELD_SCHEMAS)) == issue_rows(expected)
+    assert issue_rows(migration_engine.validate_output(RECORDS, FIELD_SCHEMAS)) == issue_rows(expected)
+    skipped = migration_engine.validate_output(table, FIELD_SCHEMAS, skip={"age": {1, 4}})
+    assert list(skipped.rows[("age", "Transformation failed for 'age'")]) == list(range(7, 31, 3))
+    assert migration_engine.validate_output([], FIELD_SCHEMAS).total() == 0
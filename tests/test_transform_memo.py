@@ -0,0 +1,97 @@
+import pytest
+
+import data_transformation
+import transform_memo
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    transform_memo._caches.clear()
+    yield
+    transform_memo._caches.clear()
+
+
+class Counting:
+    """A compute function that records the values it was called with."""
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    def __call__(self, values):
+        self.calls.append(list(values))
+        return [(False, "timed out") if value in self.fail else (True, f"<{value}>") for value in values]
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = transform_memo.LRUCache(max_size=2)
+    cache.put_many({"a": 1, "b": 2})
+    assert cache.get_many(["a"]) == {"a": 1}
+    cache.put_many({"c": 3})
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+    assert len(cache) == 2
+
+
+def test_transformation_caches_are_bounded(monkeypatch):
+    monkeypatch.setattr(transform_memo, "MAX_CACHES", 2)
+    first = transform_memo.get_cache({"user_code": "a"})
+    transform_memo.get_cache({"user_code": "b"})
+    assert transform_memo.get_cache({"user_code": "a"}) is first
+    transform_memo.get_cache({"user_code": "c"})
+    assert list(transform_memo._caches) == [("code", "a"), ("code", "c")]
+
+
+def test_factorize_keeps_types_apart():
+    distinct, codes = transform_memo.factorize([1, 1.5, True, "1", 1, None])
+    assert len(distinct) == 5
+    assert codes == [0, 1, 2, 3, 0, 4]
+    assert transform_memo.factorize([[1], [1]]) is None
+
+
+def test_apply_memoized_computes_each_distinct_value_once():
+    compute = Counting()
+    info = {"user_code": "x"}
+    assert transform_memo.apply_memoized(info, ["a", "b", "a"], compute) == [(True, "<a>"), (True, "<b>"), (True, "<a>")]
+    assert transform_memo.apply_memoized(info, ["b", "c"], compute) == [(True, "<b>"), (True, "<c>")]
+    assert compute.calls == [["a", "b"], ["c"]]
+    assert transform_memo.apply_memoized(info, [{"a": 1}], compute) is None
+
+
+def test_only_cacheable_outcomes_are_kept():
+    compute = Counting(fail={"slow"})
+    info = {"user_code": "x"}
+    for _ in range(2):
+        outcomes = transform_memo.apply_memoized(info, ["slow", "fast"], compute, cacheable=lambda outcome: outcome[0])
+        assert outcomes == [(False, "timed out"), (True, "<fast>")]
+    assert compute.calls == [["slow", "fast"], ["slow"]]
+
+
+def test_low_cardinality_columns_are_memoized():
+    profile = {"columns": {
+        "status": {"count": 100, "null_count": 0, "distinct_estimate": 3},
+        "email": {"count": 100, "null_count": 0, "distinct_estimate": 100},
+    }}
+    transformations = {
+        "state": {"use_transform": True, "user_code": "def transform(x):\n    return x"},
+        "mail": {"use_transform": True, "user_code": "def transform(x):\n    return x"},
+        "other": {"use_transform": False, "user_code": ""},
+    }
+    result = transform_memo.memoized_transformations(
+        transformations, {"state": "status", "mail": "email", "other": "status"}, profile,
+    )
+    assert result["state"]["memoize"] is True
+    assert "memoize" not in result["mail"] and "memoize" not in result["other"]
+    assert "memoize" not in transformations["state"]
+    assert not transform_memo.is_low_cardinality({"count": 5, "null_count": 5, "distinct_estimate": 0})
+
+
+@pytest.mark.parametrize("info", [
+    {"use_transform": True, "user_code": "def transform(x):\n    if x == 'bad':\n        raise ValueError(x)\n    return x.upper()"},
+    {"use_transform": True, "primitive": {"name": "uppercase"}},
+])
+def test_memoized_column_matches_plain_transform(info):
+    values = ["a", "b", None, "a", "bad", "b", "a"]
+    plain = data_transformation.transform_column(list(values), info)
+    memoized = data_transformation.transform_column(list(values), {**info, "memoize": True})
+    assert memoized == plain
+    assert data_transformation.transform_column(list(values), {**info, "memoize": True}) == plain
@@ -0,0 +1,57 @@
+import pytest
+
+from transform_pool import TransformWorkerPool
+
+DOUBLE = "def transform(x):\n    return int(x) * 2"
+SLEEP = "def transform(x):\n    import time\n    time.sleep(x)\n    return x"
+SPIN = "def transform(x):\n    while True:\n        pass"
+ALLOCATE = "def transform(x):\n    return len(bytearray(x * 1024 * 1024))"
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with TransformWorkerPool(workers=1, batch_size=2, timeout=2, cpu_seconds=1, memory_mb=256) as pool:
+        yield pool
+
+
+def test_errors_are_attributed_to_their_rows(pool):
+    assert pool.map(DOUBLE, [1, "x", 3, None, "5"]) == [
+        (True, 2),
+        (False, "invalid literal for int() with base 10: 'x'"),
+        (True, 6),
+        (False, "int() argument must be a string, a bytes-like object or a real number, not 'NoneType'"),
+        (True, 10),
+    ]
+
+
+def test_code_that_does_not_compile_fails_every_row(pool):
+    results = pool.map("def transform(x) return x", [1, 2])
+    assert [ok for ok, _ in results] == [False, False]
+
+
+def test_timeout_fails_only_its_batch_and_the_worker_restarts(pool):
+    results = pool.map(SLEEP, [0, 0, 30, 0])
+    assert results[:2] == [(True, 0), (True, 0)]
+    assert results[2:] == [(False, "Transformation timed out after 2s")] * 2
+    assert pool.map(DOUBLE, [4]) == [(True, 8)]
+
+
+def test_cpu_limit_kills_and_restarts_the_worker(pool):
+    results = pool.map(SPIN, [1])
+    assert results == [(False, "Transformation worker was terminated (CPU limit exceeded or it crashed)")]
+    assert pool.map(DOUBLE, [21]) == [(True, 42)]
+
+
+def test_memory_limit_fails_the_value_not_the_worker(pool):
+    assert pool.map(ALLOCATE, [1, 4096, 2]) == [(True, 1048576), (False, "memory limit exceeded"), (True, 2097152)]
+
+
+def test_map_columns_keeps_fields_and_order(pool):
+    results = pool.map_columns({"a": (DOUBLE, [1, 2, 3]), "b": (DOUBLE, ["4"])})
+    assert results == {"a": [(True, 2), (True, 4), (True, 6)], "b": [(True, 8)]}
+
+
+def test_call_runs_a_module_function(pool):
+    assert pool.call("field_paths:parse_path", "a.b[0]") == (True, ("a", "b", 0))
+    ok, error = pool.call("field_paths:parse_path", "a..b")
+    assert not ok and error.startswith("ValueError")
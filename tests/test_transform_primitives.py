@@ -0,0 +1,40 @@
+import transform_primitives
+
+
+def apply(name, values, **params):
+    return transform_primitives.apply_primitive(values, {"name": name, "params": params})
+
+
+def test_date_format_with_explicit_source_format_is_strict():
+    results, failed = apply("date_format", ["2024/01/31", "31-01-2024", None],
+                            source_format="%Y/%m/%d", target_format="%d-%m-%Y")
+    assert results == ["31-01-2024", None, None]
+    assert failed == [False, True, False]
+
+
+def test_date_format_reads_only_iso_dates_outside_the_inferred_format():
+    values = ["31/01/2024"] * 5 + ["2024-02-01", "2024-02-01T23:30:00+02:00", "2024-02-01T10:00:00Z",
+                                   "31 January 2024", "02-01-2024"]
+    results, failed = apply("date_format", values)
+    assert results[:8] == ["2024-01-31"] * 5 + ["2024-02-01"] * 3
+    assert failed == [False] * 8 + [True, True]
+
+
+def test_date_format_does_not_guess_ambiguous_dates():
+    results, failed = apply("date_format", ["2024-01-31", "2024-02-28", "03/04/2024"])
+    assert results == ["2024-01-31", "2024-02-28", None]
+    assert failed == [False, False, True]
+
+
+def test_split_name_parts():
+    names = ["Ada  King Lovelace", "Plato", None]
+    assert apply("split_name", names, part="first")[0] == ["Ada", "Plato", None]
+    assert apply("split_name", names, part="last")[0] == ["Lovelace", "Plato", None]
+    assert apply("split_name", names, part="rest")[0][:2] == ["King Lovelace", ""]
+
+
+def test_split_name_of_blank_name_is_empty_not_failed():
+    for part in ("first", "last", "rest"):
+        results, failed = apply("split_name", ["", "   "], part=part)
+        assert results == ["", ""]
+        assert failed == [False, False]
@@ -0,0 +1,39 @@
+import pytest
+
+from typed_table import TypedTable
+
+FIELD_SCHEMAS = {
+    "status": {"data_type": "string"},
+    "age": {"data_type": "number"},
+    "active": {"data_type": "boolean"},
+    "tags": {"data_type": "array"},
+    "flag": {"data_type": "string"},
+}
+
+
+def test_columns_round_trip_in_their_compact_storage():
+    records = [
+        {"status": ["new", "old", None][i % 3], "age": i if i % 5 else None, "active": i % 2 == 0,
+         "tags": [i], "flag": ["y", 1][i % 2]}
+        for i in range(100)
+    ]
+    table = TypedTable.from_records(records, list(FIELD_SCHEMAS), FIELD_SCHEMAS)
+    assert table.storage() == {"status": "category", "age": "int64", "active": "bool", "tags": "object",
+                               "flag": "category"}
+    assert table.records() == records
+    assert table.rows(98, 200) == records[98:]
+    assert table.count_values("status", lambda value: value == "new") == 34
+    frame = table.to_frame()
+    assert str(frame["age"].dtype) == "Int64" and frame["age"].isna().sum() == 20
+    assert frame["flag"].tolist()[:2] == ["y", 1]
+
+
+@pytest.mark.parametrize("values", [[1, True, 1.0, 0, False, None], [float("nan"), 1, "x"]])
+def test_equal_values_of_different_types_are_kept_apart(values):
+    records = [{"flag": value} for value in values * 20]
+    table = TypedTable.from_records(records, ["flag"], FIELD_SCHEMAS)
+    assert table.storage() == {"flag": "object"}
+    restored = [row["flag"] for row in table.records()]
+    assert [type(value) for value in restored] == [type(value) for value in values * 20]
+    frame = table.to_frame()
+    assert [type(value) for value in frame["flag"]] == [type(value) for value in values * 20]
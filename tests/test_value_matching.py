@@ -0,0 +1,52 @@
+import data_profiling
+import value_matching
+
+
+def signature(values):
+    return value_matching.signature_of(values)
+
+
+def test_jaccard_estimate():
+    a = signature(f"v{i}" for i in range(0, 1000))
+    b = signature(f"v{i}" for i in range(500, 1500))
+    # True Jaccard is 500 / 1500
+    assert abs(a.jaccard(b) - 1 / 3) < 0.12
+    assert a.jaccard(signature(f"v{i}" for i in range(1000))) == 1.0
+
+
+def test_values_are_normalized_and_blanks_ignored():
+    assert signature([" Leeds", "YORK", None, ""]).jaccard(signature(["leeds", "york "])) == 1.0
+    assert signature([None, ""]).is_empty()
+
+
+def test_update_matches_add_and_merge_is_the_union():
+    added, updated = value_matching.MinHash(), value_matching.MinHash()
+    values = [f"v{i}" for i in range(5000)]
+    for value in values:
+        added.add(value)
+    updated.update(values)
+    assert (added.digest() == updated.digest()).all()
+    union = signature(values[:2500]).merge(signature(values[2500:]))
+    assert (union.digest() == added.digest()).all()
+
+
+def test_lsh_index_finds_overlapping_columns_only():
+    cities = [f"city {i}" for i in range(300)]
+    index = value_matching.build_index([
+        ("city", signature(cities[:200])),
+        ("city", signature(cities[200:])),          # unioned with the first dataset
+        ("country", signature(f"country {i}" for i in range(300))),
+    ])
+    results = index.query(signature(cities), threshold=0.5)
+    assert [key for key, _ in results] == ["city"]
+    assert results[0][1] > 0.9
+    assert index.query(signature([])) == []
+
+
+def test_scores_from_profile_signatures():
+    reference = data_profiling.profile_records([{"status": s} for s in ("active", "inactive", "pending")])
+    source = data_profiling.profile_records([{"c_07": s, "c_08": n} for s, n in zip(["Active", "pending"] * 50, range(100))])
+    index = value_matching.build_index(value_matching.profile_signatures(reference).items())
+    scores = value_matching.value_overlap_scores(value_matching.profile_signatures(source), index, threshold=0.3)
+    assert set(scores["c_07"]) == {"status"} and scores["c_07"]["status"] > 0.4
+    assert scores["c_08"] == {}
@@ -0,0 +1,132 @@
+"""
+Per-value memoization of transformation results for low-cardinality columns.
+
+A memoized column is factorized to its distinct values, the transformation runs
+once per distinct value and the results are broadcast back by index. Results
+are also kept in a bounded LRU per transformation that lives for the whole
+process, so values already seen in an earlier batch are not transformed again;
+only the most recently used transformations keep a cache.
+
+`memoized_transformations` turns this on (a `"memoize": True` flag on the
+transformation) for fields whose source column the profile shows to have few
+distinct values. Memoizing assumes a transformation gives the same result for
+the same input, which holds for the primitives and for ordinary custom code.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+MAX_DISTINCT_RATIO = 0.3   # memoize when distinct values are at most this share of the non-null values
+CACHE_SIZE = 50_000        # results kept per transformation
+MAX_CACHES = 64            # transformations with a cache (least recently used ones are dropped)
+
+_caches = OrderedDict()
+_caches_lock = threading.Lock()
+
+
+class LRUCache:
+    """Bounded, thread-safe mapping that evicts the least recently used entries."""
+
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, keys):
+        """The cached entries among `keys`, as a dict (marked as recently used)."""
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[key] = self.entries[key]
+        return found
+
+    def put_many(self, items):
+        with self.lock:
+            for key, value in items.items():
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def transform_key(transform_info):
+    """Identity of a transformation: its primitive spec or its custom code."""
+    spec = transform_info.get("primitive")
+    if spec:
+        return "primitive", json.dumps(spec, sort_keys=True, default=str)
+    return "code", transform_info.get("user_code")
+
+
+def get_cache(transform_info):
+    """The process-wide result cache of a transformation."""
+    key = transform_key(transform_info)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = LRUCache()
+            while len(_caches) > MAX_CACHES:
+                _caches.popitem(last=False)
+        else:
+            _caches.move_to_end(key)
+    return cache
+
+
+def factorize(values):
+    """
+    (distinct keys, code per value) of a column, keyed by type too so 1, 1.0, True
+    and "1" stay apart; None when a value is unhashable (lists, dicts).
+    """
+    index = {}
+    try:
+        codes = [index.setdefault((type(value), value), len(index)) for value in values]
+    except TypeError:
+        return None
+    return list(index), codes
+
+
+def apply_memoized(transform_info, values, compute, cacheable=None):
+    """
+    Outcomes of `compute` (a function from a list of values to a list of outcomes)
+    for `values`, computed once per distinct value not already cached. Only outcomes
+    for which `cacheable` is true (all when not given) are kept for later batches.
+    Returns None when the values cannot be memoized.
+    """
+    factorized = factorize(values)
+    if factorized is None:
+        return None
+    distinct, codes = factorized
+    cache = get_cache(transform_info)
+    outcomes = cache.get_many(distinct)
+    missing = [key for key in distinct if key not in outcomes]
+    if missing:
+        computed = dict(zip(missing, compute([value for _, value in missing])))
+        cache.put_many(computed if cacheable is None else
+                       {key: outcome for key, outcome in computed.items() if cacheable(outcome)})
+        outcomes.update(computed)
+    by_code = [outcomes[key] for key in distinct]
+    return [by_code[code] for code in codes]
+
+
+def is_low_cardinality(column, max_ratio=MAX_DISTINCT_RATIO):
+    """Whether a profiled column has few distinct values relative to its non-null values."""
+    non_null = column["count"] - column["null_count"]
+    return non_null > 0 and column["distinct_estimate"] <= max_ratio * non_null
+
+
+def memoized_transformations(transformations, mappings, profile, max_ratio=MAX_DISTINCT_RATIO):
+    """
+    Copy of `transformations` with memoization turned on for the active ones whose
+    mapped source column is low-cardinality according to `profile`.
+    """
+    result = {}
+    for field, info in transformations.items():
+        column = profile["columns"].get(mappings.get(field))
+        if info.get("use_transform") and column and is_low_cardinality(column, max_ratio):
+            info = {**info, "memoize": True}
+        result[field] = info
+    return result
@@ -0,0 +1,284 @@
+"""
+Sandboxed worker pool for custom transformation code.
+
+User/LLM-generated transform(x) code runs in separate worker processes instead
+of the app process. Each worker compiles a piece of code once, then processes
+value batches with it. Every batch has a wall-clock timeout and (where the
+platform supports it) a CPU-time limit, and each worker's address space is
+capped so runaway allocations raise MemoryError; a worker that hangs or is
+killed is restarted and the rows of its batch are reported as per-row errors,
+so one pathological transform cannot freeze the merge or the Streamlit server.
+Whole jobs, such as one batch of the streaming pipeline, can be run in a
+worker under the same limits with `call`.
+
+The isolation is the separate process and these limits only. The code is
+exec'd with ordinary builtins, so it can still import modules, read files or
+open connections as the user running the app: the pool protects the app from
+slow or crashing code, not from hostile code.
+"""
+import hashlib
+import importlib
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_TIMEOUT = 10.0   # wall-clock seconds per batch
+DEFAULT_CPU_SECONDS = 10  # CPU seconds per batch
+DEFAULT_MEMORY_MB = 2048  # address space a worker may grow by after its imports
+STARTUP_TIMEOUT = 60.0   # seconds a freshly spawned worker may take to import its modules
+
+
+def _set_cpu_limit(cpu_seconds):
+    """Allow the worker `cpu_seconds` more CPU time; the kernel kills it with SIGXCPU beyond that."""
+    try:
+        import resource
+    except ImportError:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + int(cpu_seconds)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _set_memory_limit(memory_mb):
+    """Cap the worker's address space at its current size plus `memory_mb` MB; larger allocations raise MemoryError."""
+    try:
+        import resource
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (ImportError, OSError, ValueError):
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    soft = current + int(memory_mb) * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _worker_main(conn, cpu_seconds, memory_mb=DEFAULT_MEMORY_MB):
+    from data_transformation import compile_transform
+
+    if memory_mb:
+        _set_memory_limit(memory_mb)
+    conn.send("ready")
+    transforms = {}
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        kind = message[0]
+        if kind == "stop":
+            break
+        if kind == "load":
+            _, key, code = message
+            try:
+                transforms[key] = compile_transform(code)
+            except Exception as e:
+                transforms[key] = e
+            continue
+        if kind == "call":
+            _, target, args, call_cpu_seconds = message
+            if call_cpu_seconds:
+                _set_cpu_limit(call_cpu_seconds)
+            try:
+                module_name, function_name = target.split(":")
+                function = getattr(importlib.import_module(module_name), function_name)
+                result = (True, function(*args))
+            except Exception as e:
+                result = (False, f"{type(e).__name__}: {e}")
+            try:
+                conn.send(result)
+            except Exception as e:
+                conn.send((False, f"result could not be returned: {e}"))
+            continue
+        _, key, values = message
+        transform = transforms[key]
+        if cpu_seconds:
+            _set_cpu_limit(cpu_seconds)
+        results = []
+        for value in values:
+            if isinstance(transform, Exception):
+                results.append((False, str(transform)))
+                continue
+            try:
+                results.append((True, transform(value)))
+            except MemoryError:
+                results.append((False, "memory limit exceeded"))
+            except Exception as e:
+                results.append((False, str(e)))
+        try:
+            conn.send(results)
+        except Exception as e:
+            conn.send([(False, f"result could not be returned: {e}")] * len(values))
+    conn.close()
+
+
+def code_key(code):
+    return hashlib.sha1(code.encode("utf-8")).hexdigest()
+
+
+class _Worker:
+    def __init__(self, ctx, cpu_seconds, memory_mb=DEFAULT_MEMORY_MB):
+        self.ctx = ctx
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self._start()
+
+    def _start(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(target=_worker_main, args=(child_conn, self.cpu_seconds, self.memory_mb),
+                                        daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.loaded = set()
+        self.ready = False
+
+    def restart(self):
+        self.stop(force=True)
+        self._start()
+
+    def stop(self, force=False):
+        try:
+            if not force:
+                self.conn.send(("stop",))
+        except (OSError, ValueError):
+            pass
+        if force and self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+    def _wait_ready(self):
+        # Startup (spawn + imports) is not counted against the batch timeout
+        if not self.ready:
+            if not self.conn.poll(STARTUP_TIMEOUT):
+                raise OSError("worker did not start")
+            self.ready = self.conn.recv() == "ready"
+
+    def load(self, key, code):
+        # Queued in the pipe; a worker still starting up picks it up once its imports are done
+        if key not in self.loaded:
+            self.conn.send(("load", key, code))
+            self.loaded.add(key)
+
+    def run(self, key, code, values, timeout):
+        try:
+            self.load(key, code)
+            self.conn.send(("run", key, values))
+            self._wait_ready()
+            if self.conn.poll(timeout):
+                return self.conn.recv()
+            reason = f"timed out after {timeout:g}s"
+        except (EOFError, OSError):
+            reason = "worker was terminated (CPU limit exceeded or it crashed)"
+        self.restart()
+        return [(False, f"Transformation {reason}")] * len(values)
+
+    def call(self, target, args, timeout, cpu_seconds):
+        try:
+            self.conn.send(("call", target, args, cpu_seconds))
+            self._wait_ready()
+            if self.conn.poll(timeout):
+                return self.conn.recv()
+            reason = f"timed out after {timeout:g}s"
+        except (EOFError, OSError):
+            reason = "worker was terminated (CPU limit exceeded or it crashed)"
+        self.restart()
+        return False, f"Worker {reason}"
+
+
+class TransformWorkerPool:
+    """Pool of worker processes that apply transform(x) code to batches of values."""
+
+    def __init__(self, workers=None, batch_size=DEFAULT_BATCH_SIZE, timeout=DEFAULT_TIMEOUT,
+                 cpu_seconds=DEFAULT_CPU_SECONDS, memory_mb=DEFAULT_MEMORY_MB):
+        ctx = multiprocessing.get_context("spawn")
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self._workers = [_Worker(ctx, cpu_seconds, memory_mb) for _ in range(workers or min(4, os.cpu_count() or 1))]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        self._executor = ThreadPoolExecutor(max_workers=len(self._workers))
+
+    def preload(self, codes):
+        """Have every worker compile pieces of code ahead of the first batch (e.g. when a migration plan is loaded); does not wait."""
+        workers = [self._idle.get() for _ in self._workers]
+        try:
+            for worker in workers:
+                for code in codes:
+                    try:
+                        worker.load(code_key(code), code)
+                    except (EOFError, OSError):
+                        worker.restart()
+                        break
+        finally:
+            for worker in workers:
+                self._idle.put(worker)
+
+    def _run_batch(self, key, code, values):
+        worker = self._idle.get()
+        try:
+            return worker.run(key, code, values, self.timeout)
+        finally:
+            self._idle.put(worker)
+
+    def map_columns(self, jobs):
+        """
+        Apply code to several columns at once. `jobs` maps a field name to (code, values);
+        returns a dict mapping each field to a list of (ok, value_or_error_message) pairs.
+        Batches of all fields are spread over the workers and run in parallel.
+        """
+        futures = {}
+        for field, (code, values) in jobs.items():
+            key = code_key(code)
+            values = list(values)
+            futures[field] = [
+                self._executor.submit(self._run_batch, key, code, values[i:i + self.batch_size])
+                for i in range(0, len(values), self.batch_size)
+            ]
+        return {field: [r for future in batch_futures for r in future.result()] for field, batch_futures in futures.items()}
+
+    def map(self, code, values):
+        return self.map_columns({"_": (code, values)})["_"]
+
+    @property
+    def size(self):
+        return len(self._workers)
+
+    def call(self, target, *args, timeout=None, cpu_seconds=None):
+        """
+        Run a whole job, the module-level function `target` ("module:function"), in an idle
+        worker under the same time and CPU limits. Returns (ok, result_or_error_message).
+        """
+        worker = self._idle.get()
+        try:
+            return worker.call(target, args, timeout or self.timeout, cpu_seconds or self.cpu_seconds)
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for worker in self._workers:
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
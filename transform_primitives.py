@@ -0,0 +1,173 @@
+"""
+Built-in, column-vectorized transformation primitives.
+
+Each primitive works on a whole pandas Series at once (pandas datetime and
+string kernels) instead of calling user code once per value through exec.
+A primitive is described declaratively as a spec:
+
+    {"name": "date_format", "params": {"source_format": "%Y/%m/%d", "target_format": "%d-%m-%Y"}}
+
+so it can be offered in the UI, stored alongside user transformation code and
+re-applied in the merge without any free-form code.
+"""
+import pandas as pd
+
+TRUE_STRINGS = {"true", "t", "yes", "y", "1", "on", "active"}
+FALSE_STRINGS = {"false", "f", "no", "n", "0", "off", "inactive"}
+
+# Source date formats tried (in order) when the source format is not given
+COMMON_DATE_FORMATS = [
+    "%Y-%m-%d", "%Y/%m/%d", "%d-%m-%Y", "%d/%m/%Y", "%m/%d/%Y", "%m-%d-%Y",
+    "%Y%m%d", "%d.%m.%Y", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S",
+]
+
+ISO_OFFSET = r"(?<=\d)(Z|[+-]\d{2}:?\d{2})$"
+
+PRIMITIVES = {}
+
+
+def primitive(name, label, params=None):
+    """Register a column primitive under `name` with a UI label and its parameter defaults."""
+    def decorator(func):
+        PRIMITIVES[name] = {"func": func, "label": label, "params": params or {}}
+        return func
+    return decorator
+
+
+def _as_text(series):
+    return series.astype("string")
+
+
+def _parse_iso(text):
+    """ISO 8601 dates and times, read in their own local time (offsets are dropped, so mixed offsets parse)."""
+    local = text.str.replace(ISO_OFFSET, "", regex=True)
+    return pd.to_datetime(local, format="ISO8601", errors="coerce")
+
+
+@primitive("date_format", "Reformat date", {"source_format": "", "target_format": "%Y-%m-%d"})
+def date_format(series, source_format="", target_format="%Y-%m-%d"):
+    text = _as_text(series).str.strip()
+    if source_format:
+        parsed = pd.to_datetime(text, format=source_format, errors="coerce")
+        return parsed.dt.strftime(target_format).where(parsed.notna())
+    inferred = infer_date_format(text.dropna().head(200).tolist())
+    # Values the inferred format rejects are only read when they are ISO 8601, which is
+    # unambiguous; anything else (e.g. 03/04/2024 in another order) fails rather than
+    # being guessed day- or month-first
+    if inferred:
+        parsed = pd.to_datetime(text, format=inferred, errors="coerce")
+        rest = parsed.isna() & text.notna()
+        if rest.any():
+            parsed[rest] = _parse_iso(text[rest])
+    else:
+        parsed = _parse_iso(text)
+    return parsed.dt.strftime(target_format).where(parsed.notna())
+
+
+@primitive("lowercase", "Lowercase")
+def lowercase(series):
+    return _as_text(series).str.lower()
+
+
+@primitive("uppercase", "Uppercase")
+def uppercase(series):
+    return _as_text(series).str.upper()
+
+
+@primitive("title_case", "Title case")
+def title_case(series):
+    return _as_text(series).str.title()
+
+
+@primitive("normalize_whitespace", "Trim and collapse whitespace")
+def normalize_whitespace(series):
+    return _as_text(series).str.strip().str.replace(r"\s+", " ", regex=True)
+
+
+@primitive("split_name", "Split full name", {"part": "first"})
+def split_name(series, part="first"):
+    text = normalize_whitespace(series)
+    if part == "last":
+        parts = text.str.rsplit(n=1).str[-1]
+    elif part == "rest":
+        # Everything after the first name (middle and last names)
+        return text.str.split(n=1).str[1].fillna("")
+    else:
+        parts = text.str.split(n=1).str[0]
+    # A blank name has empty parts, not a failed conversion
+    return parts.mask((text == "").fillna(False), "")
+
+
+@primitive("to_number", "Convert to number")
+def to_number(series):
+    text = _as_text(series).str.replace(r"[,$\s]", "", regex=True)
+    return pd.to_numeric(text, errors="coerce")
+
+
+@primitive("to_integer", "Convert to integer")
+def to_integer(series):
+    numbers = to_number(series)
+    whole = numbers.notna() & (numbers % 1 == 0)
+    return numbers.where(whole).astype("Int64")
+
+
+@primitive("to_boolean", "Convert to boolean")
+def to_boolean(series):
+    text = _as_text(series).str.strip().str.lower()
+    result = pd.Series(pd.NA, index=series.index, dtype="boolean")
+    result[text.isin(TRUE_STRINGS).fillna(False)] = True
+    result[text.isin(FALSE_STRINGS).fillna(False)] = False
+    return result
+
+
+def infer_date_format(samples):
+    """Return the common date format that parses the most sample values, or '' if none fit."""
+    best_format, best_count = "", 0
+    for fmt in COMMON_DATE_FORMATS:
+        parsed = pd.to_datetime(pd.Series(samples, dtype="string"), format=fmt, errors="coerce")
+        count = int(parsed.notna().sum())
+        if count > best_count:
+            best_format, best_count = fmt, count
+    return best_format
+
+
+def primitive_label(spec):
+    if not spec:
+        return ""
+    return PRIMITIVES[spec["name"]]["label"]
+
+
+def apply_primitive(values, spec):
+    """
+    Apply a primitive spec to a list (or Series) of values.
+    Returns (results, failed) where results is a list of native Python values and
+    failed is a list of booleans marking non-null inputs the primitive could not convert.
+    """
+    entry = PRIMITIVES[spec["name"]]
+    params = {**entry["params"], **(spec.get("params") or {})}
+    series = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype="object")
+    result = entry["func"](series, **params)
+    failed = (result.isna() & series.notna()).tolist()
+    results = result.astype(object).where(result.notna(), None).tolist()
+    return results, failed
+
+
+def suggest_primitive(field_schema, source_samples=()):
+    """Pick a default primitive spec for a target field from its schema data_type/format."""
+    if not field_schema:
+        return None
+    dtype = field_schema.get("data_type")
+    if dtype == "date":
+        samples = [str(s) for s in source_samples if s not in (None, "")]
+        return {
+            "name": "date_format",
+            "params": {
+                "source_format": infer_date_format(samples) if samples else "",
+                "target_format": field_schema.get("format") or "%Y-%m-%d",
+            },
+        }
+    if dtype == "number":
+        return {"name": "to_number", "params": {}}
+    if dtype == "boolean":
+        return {"name": "to_boolean", "params": {}}
+    return None
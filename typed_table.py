@@ -0,0 +1,276 @@
+"""
+Compact, typed column storage for merged output.
+
+Merged rows used to be one dict per row with every target field name as a
+key. `TypedTable` instead keeps one typed column per target field, in target
+schema order, with the storage chosen from the field's schema `data_type` and
+the values it actually holds:
+
+- low-cardinality columns (e.g. `subscription_tier`, `is_active`) become
+  categorical: small integer codes plus the distinct values once,
+- other text columns become Arrow string arrays (when pyarrow is installed),
+- numbers and booleans whose values all have that type become numpy arrays
+  with a missing-value mask,
+- arrays, objects and mixed values stay Python lists.
+
+Every encoding is lossless: rows decode to exactly the values that were
+merged, so outputs are unchanged. Rows are only materialized as dicts in
+batches, for validation, writing and previews.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+CATEGORY_MAX_RATIO = 0.5   # categorical when distinct values <= this share of the rows
+DEFAULT_BATCH_SIZE = 50_000
+
+
+def _code_dtype(count):
+    for dtype in (np.int8, np.int16, np.int32):
+        if count < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class _ListColumn:
+    kind = "object"
+
+    def __init__(self, values):
+        self.values = list(values)
+
+    def take(self, start, stop):
+        return self.values[start:stop]
+
+    def to_pandas(self):
+        return pd.Series(self.values, dtype=object)
+
+    def nbytes(self):
+        return sys.getsizeof(self.values) + sum(sys.getsizeof(v) for v in self.values)
+
+
+class _CategoryColumn:
+    kind = "category"
+
+    def __init__(self, codes, categories):
+        self.codes = codes.astype(_code_dtype(len(categories)))
+        self.categories = list(categories)
+        # Code -1 (missing) indexes the trailing None
+        self.lookup = np.array(self.categories + [None], dtype=object)
+
+    def take(self, start, stop):
+        return self.lookup[self.codes[start:stop]].tolist()
+
+    def count(self, predicate):
+        """Number of rows whose value satisfies `predicate`, evaluated once per category."""
+        matching = [i for i, value in enumerate(self.categories) if predicate(value)]
+        if not matching:
+            return 0
+        counts = np.bincount(self.codes[self.codes >= 0], minlength=len(self.categories))
+        return int(counts[matching].sum())
+
+    def to_pandas(self):
+        return pd.Series(pd.Categorical.from_codes(self.codes, self.categories))
+
+    def nbytes(self):
+        return self.codes.nbytes + sum(sys.getsizeof(v) for v in self.categories)
+
+
+class _MaskedColumn:
+    kind = "numeric"
+    _PANDAS_ARRAYS = {
+        np.dtype(np.int64): "IntegerArray",
+        np.dtype(np.float64): "FloatingArray",
+        np.dtype(np.bool_): "BooleanArray",
+    }
+
+    def __init__(self, values, dtype):
+        n = len(values)
+        self.mask = np.fromiter((v is None for v in values), dtype=np.bool_, count=n)
+        fill = dtype(0)
+        self.values = np.array([fill if v is None else v for v in values], dtype=dtype)
+        self.kind = self.values.dtype.name
+
+    def take(self, start, stop):
+        values = self.values[start:stop].tolist()
+        mask = self.mask[start:stop]
+        if mask.any():
+            for i in np.flatnonzero(mask):
+                values[i] = None
+        return values
+
+    def to_pandas(self):
+        array_class = getattr(pd.arrays, self._PANDAS_ARRAYS[self.values.dtype])
+        return pd.Series(array_class(self.values, self.mask))
+
+    def nbytes(self):
+        return self.values.nbytes + self.mask.nbytes
+
+
+class _StringColumn:
+    kind = "string"
+
+    def __init__(self, values):
+        self.array = pa.array(values, type=pa.large_string())
+
+    def take(self, start, stop):
+        return self.array.slice(start, stop - start).to_pylist()
+
+    def to_pandas(self):
+        return pd.Series(pd.arrays.ArrowExtensionArray(self.array))
+
+    def nbytes(self):
+        return self.array.nbytes
+
+
+def _categorical(values, max_ratio):
+    """Categorical column of `values` when they are few enough distinct hashable values, else None."""
+    limit = max(1, int(len(values) * max_ratio))
+    codes = np.empty(len(values), dtype=np.int64)
+    index = {}
+    categories = []
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+            continue
+        # Keyed by type too, so 1, 1.0 and True stay distinct categories
+        key = (value.__class__, value)
+        code = index.get(key)
+        if code is None:
+            if len(categories) >= limit:
+                return None
+            code = index[key] = len(categories)
+            categories.append(value)
+        codes[i] = code
+    # Equal values of different types (1, 1.0, True) or NaN cannot be pandas categories
+    if len(set(categories)) < len(categories) or any(value != value for value in categories):
+        return None
+    return _CategoryColumn(codes, categories)
+
+
+def build_column(values, data_type="string", category_max_ratio=CATEGORY_MAX_RATIO):
+    """Most compact lossless storage for a column of values of a schema `data_type`."""
+    values = values if isinstance(values, list) else list(values)
+    kinds = set(map(type, values)) - {type(None)}
+    if data_type in ("array", "object") or not kinds <= {str, int, float, bool}:
+        return _ListColumn(values)
+    if data_type == "number" and kinds and kinds <= {int}:
+        try:
+            return _MaskedColumn(values, np.int64)
+        except OverflowError:
+            return _ListColumn(values)
+    if data_type == "number" and kinds and kinds <= {float}:
+        return _MaskedColumn(values, np.float64)
+    if data_type == "boolean" and kinds and kinds <= {bool}:
+        return _MaskedColumn(values, np.bool_)
+    if kinds <= {str}:
+        # Factorizing in C is exact for text; None becomes code -1
+        codes, uniques = pd.factorize(np.array(values, dtype=object))
+        if len(uniques) <= max(1, int(len(values) * category_max_ratio)):
+            return _CategoryColumn(codes, list(uniques))
+        return _StringColumn(values) if pa is not None else _ListColumn(values)
+    return _categorical(values, category_max_ratio) or _ListColumn(values)
+
+
+class TypedTable:
+    """Rows stored as typed columns in target field order."""
+
+    def __init__(self, fields, columns, length):
+        self.fields = list(fields)
+        self.columns = columns
+        self.length = length
+
+    @classmethod
+    def from_columns(cls, columns, field_schemas=None, category_max_ratio=CATEGORY_MAX_RATIO):
+        """Build from {field: list of values}; lists are released as they are encoded."""
+        field_schemas = field_schemas or {}
+        fields = list(columns)
+        length = len(columns[fields[0]]) if fields else 0
+        typed = {}
+        for field in fields:
+            data_type = field_schemas.get(field, {}).get("data_type", "string")
+            typed[field] = build_column(columns[field], data_type, category_max_ratio)
+            columns[field] = None
+        return cls(fields, typed, length)
+
+    @classmethod
+    def from_records(cls, records, fields, field_schemas=None, category_max_ratio=CATEGORY_MAX_RATIO):
+        columns = {field: [record.get(field) for record in records] for field in fields}
+        return cls.from_columns(columns, field_schemas, category_max_ratio)
+
+    def __len__(self):
+        return self.length
+
+    def rows(self, start=0, stop=None):
+        """Rows start..stop as dicts."""
+        stop = self.length if stop is None else min(stop, self.length)
+        if start >= stop:
+            return []
+        values = [self.columns[field].take(start, stop) for field in self.fields]
+        return [dict(zip(self.fields, row)) for row in zip(*values)]
+
+    def values(self, field, start=0, stop=None):
+        """Values of one column, rows start..stop."""
+        stop = self.length if stop is None else min(stop, self.length)
+        return self.columns[field].take(start, stop) if start < stop else []
+
+    def iter_batches(self, batch_size=DEFAULT_BATCH_SIZE):
+        for start in range(0, self.length, batch_size):
+            yield self.rows(start, start + batch_size)
+
+    def records(self):
+        """All rows as a list of dicts (only for consumers that need them, e.g. deduplication)."""
+        return [row for batch in self.iter_batches() for row in batch]
+
+    def count_values(self, field, predicate):
+        column = self.columns[field]
+        if isinstance(column, _CategoryColumn):
+            return column.count(predicate)
+        return sum(
+            1 for start in range(0, self.length, DEFAULT_BATCH_SIZE)
+            for value in column.take(start, start + DEFAULT_BATCH_SIZE) if predicate(value)
+        )
+
+    def to_frame(self, start=0, stop=None):
+        """pandas DataFrame (typed and categorical dtypes) of rows start..stop."""
+        stop = self.length if stop is None else min(stop, self.length)
+        if start == 0 and stop == self.length:
+            return pd.DataFrame({field: self.columns[field].to_pandas() for field in self.fields})
+        return pd.DataFrame(self.rows(start, stop), columns=self.fields)
+
+    def storage(self):
+        """Storage kind per field."""
+        return {field: self.columns[field].kind for field in self.fields}
+
+    def nbytes(self):
+        return sum(column.nbytes() for column in self.columns.values())
+
+
+class SourceProjection:
+    """Lazy view of some columns of the source records; nothing is copied until rows are read."""
+
+    def __init__(self, records, fields):
+        self.records = records
+        self.fields = list(fields)
+
+    def __len__(self):
+        return len(self.records)
+
+    def rows(self, start=0, stop=None):
+        return [{field: row.get(field) for field in self.fields} for row in self.records[start:stop]]
+
+    def head(self, n=10):
+        return pd.DataFrame(self.rows(0, n), columns=self.fields)
+
+    def to_csv(self, path, batch_size=DEFAULT_BATCH_SIZE):
+        """Write the projection to CSV in batches."""
+        with open(path, "w", newline="") as f:
+            pd.DataFrame(columns=self.fields).to_csv(f, index=False)
+            for start in range(0, len(self.records), batch_size):
+                pd.DataFrame(self.rows(start, start + batch_size), columns=self.fields).to_csv(f, index=False, header=False)
+        return path
@@ -0,0 +1,166 @@
+"""
+Content-based field matching with MinHash signatures and LSH.
+
+Each column is summarised by a MinHash signature of its distinct (normalized)
+values, so the Jaccard overlap of two columns can be estimated from their
+signatures alone. Signatures are indexed with banded locality-sensitive
+hashing: only columns sharing at least one band bucket are compared, which
+keeps matching of tables with thousands of columns sub-quadratic.
+
+This lets cryptic legacy column names (`c_07`, `fld_ad2`) be matched by what
+they contain rather than by what they are called.
+"""
+import hashlib
+from collections import defaultdict
+
+import numpy as np
+
+NUM_PERM = 128
+LSH_BANDS = 32           # 32 bands x 4 rows: candidate threshold around Jaccard 0.4
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = np.uint64((1 << 32) - 1)
+FOLD_EVERY = 4096        # buffered value hashes folded into the signature at a time
+_PERMUTATIONS = {}
+
+
+def _permutations(num_perm, seed=1):
+    key = (num_perm, seed)
+    if key not in _PERMUTATIONS:
+        rng = np.random.RandomState(seed)
+        a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        _PERMUTATIONS[key] = (a, b)
+    return _PERMUTATIONS[key]
+
+
+def normalize_value(value):
+    return str(value).strip().lower()
+
+
+def hash_value(value):
+    """32-bit hash of a normalized value."""
+    digest = hashlib.blake2b(normalize_value(value).encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big")
+
+
+class MinHash:
+    """Streaming MinHash signature; values are buffered and folded in vectorized chunks."""
+
+    def __init__(self, num_perm=NUM_PERM, signature=None):
+        self.num_perm = num_perm
+        if signature is None:
+            self.signature = np.full(num_perm, MAX_HASH, dtype=np.uint64)
+        else:
+            self.signature = np.asarray(signature, dtype=np.uint64)
+        self._buffer = []
+
+    def add(self, value):
+        self.add_hash(hash_value(value))
+
+    def update(self, values):
+        """Add many values (hashes folded in vectorized chunks)."""
+        self._buffer.extend(hash_value(value) for value in values)
+        if len(self._buffer) >= FOLD_EVERY:
+            self._fold()
+
+    def add_hash(self, h):
+        self._buffer.append(h)
+        if len(self._buffer) >= FOLD_EVERY:
+            self._fold()
+
+    def _fold(self):
+        if not self._buffer:
+            return
+        a, b = _permutations(self.num_perm)
+        hashes = np.asarray(self._buffer, dtype=np.uint64)
+        # a < 2**31 and h, b < 2**32, so a * h + b fits in uint64 before reducing mod the Mersenne prime
+        permuted = (np.outer(hashes, a) + b) % np.uint64(MERSENNE_PRIME) & MAX_HASH
+        self.signature = np.minimum(self.signature, permuted.min(axis=0))
+        self._buffer = []
+
+    def digest(self):
+        self._fold()
+        return self.signature
+
+    def is_empty(self):
+        return bool((self.digest() == MAX_HASH).all())
+
+    def jaccard(self, other):
+        return float(np.mean(self.digest() == other.digest()))
+
+    def merge(self, other):
+        """Signature of the union of both value sets."""
+        return MinHash(self.num_perm, np.minimum(self.digest(), other.digest()))
+
+    def to_list(self):
+        return [int(v) for v in self.digest()]
+
+
+def signature_of(values, num_perm=NUM_PERM):
+    minhash = MinHash(num_perm)
+    for value in values:
+        if value is not None and value != "":
+            minhash.add(value)
+    return minhash
+
+
+class LSHIndex:
+    """Banded LSH index over MinHash signatures."""
+
+    def __init__(self, num_perm=NUM_PERM, bands=LSH_BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by the number of bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [defaultdict(set) for _ in range(bands)]
+        self.signatures = {}
+
+    def _band_keys(self, minhash):
+        signature = minhash.digest()
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def insert(self, key, minhash):
+        if minhash.is_empty():
+            return
+        self.signatures[key] = minhash
+        for band, band_key in self._band_keys(minhash):
+            self.buckets[band][band_key].add(key)
+
+    def query(self, minhash, threshold=0.0):
+        """Return [(key, estimated Jaccard)] for indexed columns sharing a bucket, best first."""
+        if minhash.is_empty():
+            return []
+        candidates = set()
+        for band, band_key in self._band_keys(minhash):
+            candidates |= self.buckets[band].get(band_key, set())
+        scored = [(key, minhash.jaccard(self.signatures[key])) for key in candidates]
+        return sorted([kv for kv in scored if kv[1] >= threshold], key=lambda kv: -kv[1])
+
+
+def build_index(column_signatures, num_perm=NUM_PERM):
+    """Index (column name, MinHash) pairs; signatures of the same column from several datasets are unioned."""
+    index = LSHIndex(num_perm)
+    merged = {}
+    for name, minhash in column_signatures:
+        merged[name] = merged[name].merge(minhash) if name in merged else minhash
+    for name, minhash in merged.items():
+        index.insert(name, minhash)
+    return index
+
+
+def profile_signatures(profile):
+    """MinHash signatures stored in a data profile, as {column: MinHash}."""
+    return {
+        field: MinHash(len(column["minhash"]), column["minhash"])
+        for field, column in profile["columns"].items()
+        if column.get("minhash")
+    }
+
+
+def value_overlap_scores(source_signatures, index, threshold=0.0):
+    """For each source column, the indexed (target/reference) columns with overlapping values: {source: {target: jaccard}}."""
+    return {
+        source: dict(index.query(minhash, threshold))
+        for source, minhash in source_signatures.items()
+    }